@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
+# Ponto de entrada para uploads lentos e para o status ao vivo (/request/<código>/status/stream/):
+# cada conexão SSE parada é só uma corrotina, sem thread nem conexão de banco. Para milhares
+# delas, suba o limite de arquivos abertos (ulimit -n) e não use --limit-concurrency baixo:
+#   uvicorn config.asgi:application --workers 2 --timeout-keep-alive 30
 application = get_asgi_application()
+
+# Compila os templates de e-mail ao subir o worker, não no primeiro "Finalizar pedido"
+from siteapp.services.email_templates import precompile  # noqa: E402
+
+precompile()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 from pathlib import Path
 import os
+import time
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -27,6 +28,30 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv("EMAIL_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
+# Conexões SMTP reaproveitadas entre envios (siteapp/services/mail_pool.py)
+EMAIL_TIMEOUT = 30
+EMAIL_POOL_SIZE = 2
+EMAIL_POOL_IDLE_SECONDS = 60
+# Tamanho máximo (já em base64) dos anexos de uma única mensagem
+EMAIL_MAX_MESSAGE_MB = 25
+
+# Como os documentos vão no e-mail interno, pelo tamanho total (em MB, antes do base64):
+# até ATTACH anexa direto, até ZIP manda um .zip, até SPLIT divide em várias mensagens
+# e acima disso só manda links assinados (válidos por DOCUMENT_LINK_MAX_AGE_HOURS).
+# ATTACH e ZIP só valem se o total, já em base64 (~4/3), couber em EMAIL_MAX_MESSAGE_MB
+EMAIL_ATTACH_MAX_MB = 15
+EMAIL_ZIP_MAX_MB = 20
+EMAIL_SPLIT_MAX_MB = 100
+DOCUMENT_LINK_MAX_AGE_HOURS = 72
+SITE_URL = os.getenv("SITE_URL", "https://revisapramim.com.br")
+
+# Fila de e-mails (python manage.py send_outbox --loop)
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RETRY_MAX_SECONDS = 3600
+OUTBOX_LOCK_TIMEOUT_SECONDS = 600
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
 
@@ -34,7 +59,8 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_PASSWORD")
 SECRET_KEY = 'django-insecure-=pndc84@c98*l(qo#xpt)djmd==oi)10x()q088f8l_5!3n@_9'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# Em produção: DEBUG=0 no ambiente
+DEBUG = os.getenv("DEBUG", "1") == "1"
 
 ALLOWED_HOSTS = ["*"]
 
@@ -59,7 +85,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro, para medir a requisição inteira (ver /metrics)
+    'siteapp.middleware.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
+    # Estáticos do STATIC_ROOT (com hash, .br/.gz e cache imutável); inativo em DEBUG
+    'siteapp.middleware.static_files_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,36 +100,132 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'config.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates com o tempo de render contado nas métricas
+        'BACKEND': 'siteapp.template_backends.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
+                'django.template.context_processors.i18n',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'siteapp.context_processors.fragment_cache',
             ],
+            # Em produção cada template é compilado uma vez por processo
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
         },
     },
 ]
 
+# Trechos fixos de base/home/about ficam no cache ({% cache %}), com a chave por idioma e
+# versão do deploy: um deploy novo nunca serve HTML antigo. Sem DEPLOY_VERSION, cada
+# processo usa a hora em que subiu. Em DEBUG o tempo é 0 (sem cache) para editar à vontade.
+DEPLOY_VERSION = os.getenv("DEPLOY_VERSION") or str(int(time.time()))
+FRAGMENT_CACHE_SECONDS = 0 if DEBUG else int(os.getenv("FRAGMENT_CACHE_SECONDS", "3600"))
+
 WSGI_APPLICATION = 'config.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Perfil escolhido por DB_PROFILE:
+#   sqlite   (padrão) — arquivo local em WAL, ajustado no connection_created (siteapp/signals.py)
+#   postgres — conexões persistentes com health check, ou pool do psycopg 3 (POSTGRES_POOL=1)
+DB_PROFILE = os.getenv("DB_PROFILE", "sqlite")
+
+if DB_PROFILE == "postgres":
+    # "or" e não o default do getenv: as linhas vazias do .env.example (POSTGRES_DB=) valem ""
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("POSTGRES_DB") or "revisapramim",
+            'USER': os.getenv("POSTGRES_USER") or "revisapramim",
+            'PASSWORD': os.getenv("POSTGRES_PASSWORD", ""),
+            'HOST': os.getenv("POSTGRES_HOST") or "localhost",
+            'PORT': os.getenv("POSTGRES_PORT") or "5432",
+            'CONN_MAX_AGE': int(os.getenv("POSTGRES_CONN_MAX_AGE", "60")),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.getenv("POSTGRES_POOL") == "1":
+        # O pool substitui as conexões persistentes (o Django exige CONN_MAX_AGE = 0)
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv("POSTGRES_POOL_MIN", "2")),
+            'max_size': int(os.getenv("POSTGRES_POOL_MAX", "10")),
+            'timeout': 10,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Espera o lock de escrita em vez de falhar na hora com "database is locked"
+                'timeout': 20,
+                # Pega o lock de escrita no BEGIN: evita o deadlock de "upgrade" leitura -> escrita
+                'transaction_mode': 'IMMEDIATE',
+            },
+            # Banco de teste em arquivo (não em memória compartilhada) para os testes com threads
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
     }
+
+# PRAGMAs aplicados a cada conexão SQLite nova
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,  # ~20MB
 }
 
 
+# Cache: Redis quando REDIS_URL estiver definido (compartilhado entre workers),
+# senão memória local do processo
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Consulta de status na home: limite por IP e por código (capacidade, segundos para
+# recarregar) e cache curto do resultado
+LOOKUP_RATE_LIMITS = {
+    "ip": (10, 60),
+    "code": (5, 600),
+}
+LOOKUP_CACHE_SECONDS = 60
+# Só ligue atrás de um proxy confiável (ngrok, nginx) que sobrescreve o cabeçalho
+TRUST_X_FORWARDED_FOR = os.getenv("TRUST_X_FORWARDED_FOR", "") == "1"
+
+# Métricas por requisição (siteapp.middleware) em /metrics, formato Prometheus.
+# O coletor manda "Authorization: Bearer <METRICS_TOKEN>"; sem token, /metrics só
+# responde com DEBUG ligado (em produção dá 404).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Acima disso a requisição vai para o log "siteapp.slow_requests" com as consultas mais lentas
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -135,12 +261,64 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Fora do DEBUG: nomes com hash do conteúdo + .gz/.br gerados no collectstatic
+# (siteapp/staticfiles.py). Em DEBUG, os arquivos saem direto dos apps, sem manifesto.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+            if DEBUG
+            else "siteapp.staticfiles.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Códigos de pedido pré-gerados (python manage.py refill_public_ids); sem o pool,
+# o código é sorteado na hora e a constraint unique resolve colisões
+PUBLIC_ID_POOL_ENABLED = os.getenv("PUBLIC_ID_POOL_ENABLED", "") == "1"
+
+# Upload em partes (siteapp/services/chunked_upload.py): tamanho máximo de cada PUT.
+# Sessão não concluída em UPLOAD_SESSION_TTL_HOURS expira; o arquivo parcial é apagado
+# por python manage.py expire_upload_sessions (agendar de hora em hora)
+UPLOAD_CHUNK_MAX_MB = 8
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+
+# Pós-processamento de documentos (python manage.py process_documents --loop):
+# fotos reduzidas/recomprimidas para o e-mail e miniaturas para o admin
+DOCUMENT_IMAGE_MAX_SIDE = 2000
+DOCUMENT_IMAGE_QUALITY = 80
+DOCUMENT_THUMBNAIL_SIDE = 320
+DOCUMENT_PROCESSING_WORKERS = 2
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Arquivamento (python manage.py archive_requests): documentos de pedidos DONE sem
+# mudança há ARCHIVE_AFTER_DAYS vão para um .zip por pedido em ARCHIVE_ROOT (disco mais
+# barato, fora do backup diário do MEDIA_ROOT) e voltam sozinhos quando são abertos
+# "or": a linha vazia do .env.example (ARCHIVE_ROOT=) não pode virar o diretório atual
+ARCHIVE_ROOT = os.getenv("ARCHIVE_ROOT") or str(BASE_DIR / "cold_storage")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+
+# Status ao vivo (siteapp/services/status_events.py): tempo máximo de cada conexão SSE
+# antes de o navegador reconectar (e reler o status, inclusive de mudanças feitas em
+# outro worker)
+STATUS_STREAM_MAX_SECONDS = int(os.getenv("STATUS_STREAM_MAX_SECONDS", "300"))
+
+# Documentos só saem pela view document_download (confere o código do pedido).
+# "nginx" responde com X-Accel-Redirect para DOCUMENT_ACCEL_PREFIX (location internal
+# com alias para o MEDIA_ROOT); "apache" com X-Sendfile (mod_xsendfile). Vazio: o Django
+# transmite o arquivo (com Range): FileResponse sob WSGI; sob ASGI (uvicorn) um bloco de
+# 256KB por vez lido numa thread, o que funciona mas ocupa o worker. Em produção com ASGI,
+# prefira "nginx"/"apache".
+DOCUMENT_SENDFILE = os.getenv("DOCUMENT_SENDFILE", "")
+DOCUMENT_ACCEL_PREFIX = os.getenv("DOCUMENT_ACCEL_PREFIX", "/protected-media/")
+
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Compila os templates de e-mail ao subir o worker, não no primeiro "Finalizar pedido"
+from siteapp.services.email_templates import precompile  # noqa: E402
+
+precompile()
@@ -1,22 +1,199 @@
 from django.contrib import admin
-from .models import LattesRequest, LattesDocument
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from .models import LattesRequest, LattesDocument, OutboundEmail, DocumentBlob, normalize_search_text
+from .services.dashboard import dashboard
+from .services.document_zip import aiter_zip, documents_for, iter_zip, zip_filename
+from .services.export import CONTENT_TYPES, export_filename, export_queryset, iter_export
+
+
+class EstimatedCountPaginator(Paginator):
+    """Sem filtros e no PostgreSQL, usa a estimativa do planner em vez de COUNT(*)."""
+
+    ESTIMATE_ABOVE = 10000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        conn = connections[qs.db]
+        if conn.vendor == "postgresql" and not qs.query.where:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [qs.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > self.ESTIMATE_ABOVE:
+                return row[0]
+        return super().count
+
+
+def indexed_match(field: str, term: str, vendor: str) -> Q:
+    # PostgreSQL: trecho em qualquer posição, coberto pelo índice trigram (migração 0011).
+    # Demais bancos: prefixo como faixa (>= termo e < termo + U+FFFF), que usa o índice comum.
+    if vendor == "postgresql":
+        return Q(**{f"{field}__contains": term})
+    return Q(**{f"{field}__gte": term, f"{field}__lt": term + "\uffff"})
+
+
+class NormalizedSearchMixin:
+    """Busca nas colunas normalizadas em vez de icontains (UPPER(...) LIKE '%...%')."""
+
+    search_prefix = ""
+    # Campos do próprio modelo buscados com icontains (texto livre, sem coluna normalizada).
+    # Cada um precisa de índice trigram sobre UPPER(campo) no PostgreSQL (ver migração 0016)
+    search_contains = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+
+        p = self.search_prefix
+        vendor = connections[queryset.db].vendor
+        q = Q(**{f"{p}public_id": term.upper()})
+        # Nome em qualquer posição (sobrenome) em todos os bancos; fora do PostgreSQL isso
+        # varre a coluna, mas a coluna normalizada é curta e sem UPPER() por linha
+        q |= Q(**{f"{p}full_name_normalized__contains": normalize_search_text(term)})
+        q |= indexed_match(f"{p}email_normalized", term.lower(), vendor)
+        digits = "".join(c for c in term if c.isdigit())
+        if len(digits) >= 4:
+            q |= indexed_match(f"{p}whatsapp_digits", digits, vendor)
+        for field in self.search_contains:
+            q |= Q(**{f"{field}__icontains": term})
+        return queryset.filter(q), False
+
 
 class LattesDocumentInline(admin.TabularInline):
     model = LattesDocument
     extra = 0
-    fields = ("doc_type", "description", "file", "uploaded_at")
-    readonly_fields = ("uploaded_at",)
+    fields = ("preview", "doc_type", "description", "file", "uploaded_at")
+    readonly_fields = ("preview", "uploaded_at")
+
+    @admin.display(description="Prévia")
+    def preview(self, obj):
+        # Miniatura leve gerada pelo process_documents, em vez do arquivo original
+        if obj.thumbnail:
+            return format_html('<img src="{}" style="max-height:64px">', obj.thumbnail.url)
+        return "—"
+
+
+def _export_response(queryset, fmt: str):
+    response = StreamingHttpResponse(iter_export(export_queryset(queryset), fmt), content_type=CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{export_filename(fmt)}"'
+    return response
+
+
+@admin.action(description="Exportar selecionados (CSV)")
+def export_csv(modeladmin, request, queryset):
+    return _export_response(queryset, "csv")
+
+
+@admin.action(description="Exportar selecionados (JSONL)")
+def export_jsonl(modeladmin, request, queryset):
+    return _export_response(queryset, "jsonl")
+
+def _zip_response(request, queryset):
+    public_ids = list(queryset.values_list("public_id", flat=True)[:2])
+    documents = documents_for(queryset)
+    content = aiter_zip(documents) if isinstance(request, ASGIRequest) else iter_zip(documents)
+    response = StreamingHttpResponse(content, content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{zip_filename(public_ids)}"'
+    return response
+
+
+@admin.action(description="Baixar documentos (zip)")
+def download_documents_zip(modeladmin, request, queryset):
+    return _zip_response(request, queryset)
 
 @admin.register(LattesRequest)
-class LattesRequestAdmin(admin.ModelAdmin):
+class LattesRequestAdmin(NormalizedSearchMixin, admin.ModelAdmin):
     list_display = ("full_name", "email", "whatsapp", "status", "created_at")
     list_filter = ("status", "created_at")
+    # Só para exibir a caixa de busca; a busca real está em NormalizedSearchMixin
     search_fields = ("full_name", "email", "whatsapp")
-    readonly_fields = ("created_at", "updated_at")
+    search_help_text = "Código, nome, e-mail ou WhatsApp"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = (
+        "created_at", "updated_at", "finalized_at",
+        "archived_at", "archive_name", "archive_lock", "archive_locked_at",
+        "documents_zip",
+    )
+    actions = [export_csv, export_jsonl, download_documents_zip]
     inlines = [LattesDocumentInline]
 
+    def get_urls(self):
+        return [
+            path(
+                "painel/",
+                self.admin_site.admin_view(self.dashboard_view),
+                name="siteapp_lattesrequest_dashboard",
+            ),
+            path(
+                "<path:object_id>/documentos.zip",
+                self.admin_site.admin_view(self.documents_zip_view),
+                name="siteapp_lattesrequest_documents_zip",
+            ),
+            *super().get_urls(),
+        ]
+
+    def documents_zip_view(self, request, object_id):
+        obj = get_object_or_404(LattesRequest, pk=object_id)
+        if not self.has_view_permission(request, obj):
+            raise PermissionDenied
+        return _zip_response(request, LattesRequest.objects.filter(pk=obj.pk))
+
+    def dashboard_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        # Lê só os contadores (manage.py rebuild_dashboard), nunca COUNT nas tabelas grandes
+        context = {
+            **self.admin_site.each_context(request),
+            **dashboard(),
+            "opts": self.model._meta,
+            "title": "Painel",
+        }
+        return TemplateResponse(request, "admin/siteapp/dashboard.html", context)
+
+    @admin.display(description="Documentos")
+    def documents_zip(self, obj):
+        if not obj.pk:
+            return "—"
+        url = reverse("admin:siteapp_lattesrequest_documents_zip", args=[obj.pk])
+        return format_html('<a href="{}">Baixar todos (zip)</a>', url)
+
 @admin.register(LattesDocument)
-class LattesDocumentAdmin(admin.ModelAdmin):
+class LattesDocumentAdmin(NormalizedSearchMixin, admin.ModelAdmin):
     list_display = ("request", "doc_type", "description", "uploaded_at")
     list_filter = ("doc_type", "uploaded_at")
+    list_select_related = ("request",)
     search_fields = ("request__full_name", "description")
+    search_help_text = "Código, nome, e-mail ou WhatsApp do pedido, ou descrição do documento"
+    search_prefix = "request__"
+    search_contains = ("description",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ("request",)
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ("dedupe_key", "to_email", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("dedupe_key", "to_email")
+    readonly_fields = ("created_at", "sent_at", "locked_at", "locked_by")
+
+@admin.register(DocumentBlob)
+class DocumentBlobAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "size", "ref_count", "created_at")
+    search_fields = ("sha256",)
+    readonly_fields = ("sha256", "name", "size", "ref_count", "created_at")
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SiteappConfig(AppConfig):
     name = 'siteapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,9 @@
+from django.conf import settings
+
+
+def fragment_cache(request):
+    # Usados na chave/tempo dos {% cache %} dos templates públicos
+    return {
+        "DEPLOY_VERSION": getattr(settings, "DEPLOY_VERSION", ""),
+        "FRAGMENT_CACHE_SECONDS": getattr(settings, "FRAGMENT_CACHE_SECONDS", 0),
+    }
@@ -53,6 +53,47 @@ class LattesRequestForm(forms.ModelForm):
 
         return cleaned
 
+# Bytes iniciais que bastam para reconhecer todos os formatos aceitos
+SNIFF_BYTES = 12
+
+
+def max_file_bytes() -> int:
+    return MAX_FILE_MB * 1024 * 1024
+
+
+def sniff_document(head: bytes) -> str:
+    """"pdf", "image" ou "" pelos magic bytes: a extensão sozinha não prova nada."""
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith((b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n")):
+        return "image"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image"
+    return ""
+
+
+def read_head(f) -> bytes:
+    f.seek(0)
+    head = f.read(SNIFF_BYTES)
+    f.seek(0)
+    return head
+
+
+def validate_document_file(name: str, size: int, head: bytes | None = None):
+    """Regras de tamanho, extensão e (com ``head``) conteúdo dos documentos (upload normal e em partes)."""
+    if size > max_file_bytes():
+        raise forms.ValidationError(f"Arquivo muito grande. Máximo: {MAX_FILE_MB}MB.")
+
+    name = name.lower()
+    ext = "." + name.split(".")[-1] if "." in name else ""
+    if ext not in ALLOWED_EXTENSIONS:
+        raise forms.ValidationError("Envie apenas PDF ou imagens (JPG, PNG, WEBP).")
+
+    # Imagem com a extensão de outra (foto.png que é JPEG) passa; PDF tem que ser PDF
+    if head is not None and sniff_document(head) != ("pdf" if ext == ".pdf" else "image"):
+        raise forms.ValidationError("O conteúdo do arquivo não é um PDF ou imagem (JPG, PNG, WEBP) válido.")
+
+
 class LattesDocumentForm(forms.ModelForm):
     class Meta:
         model = LattesDocument
@@ -63,16 +104,59 @@ class LattesDocumentForm(forms.ModelForm):
         if not f:
             return f
 
-        max_bytes = MAX_FILE_MB * 1024 * 1024
-        if f.size > max_bytes:
-            raise forms.ValidationError(f"Arquivo muito grande. Máximo: {MAX_FILE_MB}MB.")
+        validate_document_file(f.name, f.size, read_head(f))
+        return f
 
-        name = f.name.lower()
-        ext = "." + name.split(".")[-1] if "." in name else ""
-        if ext not in ALLOWED_EXTENSIONS:
-            raise forms.ValidationError("Envie apenas PDF ou imagens (JPG, PNG, WEBP).")
 
-        return f
+class LattesDocumentBatchForm(forms.Form):
+    """Vários documentos num único POST: ``files[i]`` tem o tipo ``doc_type[i]``."""
+
+    MAX_FILES = 30
+
+    def clean(self):
+        cleaned = super().clean()
+        files = self.files.getlist("files")
+        doc_types = self.data.getlist("doc_type")
+        descriptions = self.data.getlist("description")
+
+        if not files:
+            raise forms.ValidationError("Selecione pelo menos um arquivo.")
+        if len(files) > self.MAX_FILES:
+            raise forms.ValidationError(f"Envie no máximo {self.MAX_FILES} arquivos por vez.")
+        if len(doc_types) != len(files):
+            raise forms.ValidationError("Informe o tipo de cada arquivo.")
+
+        valid_types = set(LattesDocument.DocType.values)
+        items = []
+        for i, (f, doc_type) in enumerate(zip(files, doc_types)):
+            description = descriptions[i].strip()[:200] if i < len(descriptions) else ""
+            try:
+                if doc_type not in valid_types:
+                    raise forms.ValidationError("Tipo de documento inválido.")
+                validate_document_file(f.name, f.size, read_head(f))
+            except forms.ValidationError as e:
+                self.add_error(None, f"{f.name}: {' '.join(e.messages)}")
+                continue
+            items.append((f, doc_type, description))
+
+        cleaned["items"] = items
+        return cleaned
+
+
+class ChunkedUploadInitForm(forms.ModelForm):
+    filename = forms.CharField(max_length=200)
+    size = forms.IntegerField(min_value=1)
+
+    class Meta:
+        model = LattesDocument
+        fields = ["doc_type", "description"]
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get("filename") and cleaned.get("size"):
+            # Falha logo no início, antes de o cliente mandar qualquer parte
+            validate_document_file(cleaned["filename"], cleaned["size"])
+        return cleaned
 
 
 class LattesRequestLookupForm(forms.Form):
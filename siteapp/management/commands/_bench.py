@@ -0,0 +1,91 @@
+"""Utilitários compartilhados pelos comandos bench_* (não é um comando)."""
+import socketserver
+import statistics
+import threading
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextmanager
+def isolated_database(verbosity: int = 0):
+    """Roda o benchmark num banco de teste descartável, nunca no banco real."""
+    setup_test_environment()
+    old_names = []
+    try:
+        for alias in connections:
+            conn = connections[alias]
+            old_names.append((conn, conn.settings_dict["NAME"]))
+            conn.creation.create_test_db(verbosity=verbosity, autoclobber=True, keepdb=False)
+        yield
+    finally:
+        for conn, name in old_names:
+            conn.creation.destroy_test_db(name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def percentiles(values: list[float]) -> dict[int, float]:
+    """p1..p99 (chave = percentil); com menos de dois valores, repete o que houver."""
+    if len(values) > 1:
+        q = statistics.quantiles(values, n=100)
+    else:
+        q = [values[0] if values else 0.0] * 99
+    return {i: q[i - 1] for i in range(1, 100)}
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self._reply("220 localhost stub")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode(errors="replace").strip().upper()
+            if cmd.startswith(("EHLO", "HELO")):
+                self._reply("250-localhost")
+                self._reply("250 SIZE 104857600")
+            elif cmd == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                with server.lock:
+                    server.messages += 1
+                self._reply("250 OK")
+            elif cmd == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP...
+                self._reply("250 OK")
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    """Servidor SMTP mínimo em 127.0.0.1 que só conta conexões e mensagens."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from siteapp.services.archive import ArchivePlan, archive_request, candidates, claim, plan, release_claim
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1024 * 1024):.1f}MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Empacota os documentos de pedidos DONE antigos num .zip por pedido no ARCHIVE_ROOT e "
+        "libera o storage quente. Pode rodar em paralelo; --dry-run só mostra o que liberaria."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Idade mínima (padrão: ARCHIVE_AFTER_DAYS).")
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument("--limit", type=int, default=None, help="Máximo de pedidos nesta execução.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def _report(self, label: str, report: ArchivePlan):
+        self.stdout.write(
+            f"{label}: {report.orders} pedidos, {report.documents} documentos, {_mb(report.archived_bytes)} "
+            f"arquivados, {_mb(report.reclaimable_bytes)} liberados do storage | Sem arquivo: {report.missing}"
+        )
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            queryset = candidates(options["days"]).order_by("updated_at")
+            if options["limit"]:
+                queryset = queryset[: options["limit"]]
+            self._report("Simulação", plan(queryset))
+            return
+
+        total = ArchivePlan()
+        remaining = options["limit"]
+        while remaining is None or remaining > 0:
+            size = options["batch_size"] if remaining is None else min(options["batch_size"], remaining)
+            batch = claim(options["days"], size)
+            if not batch:
+                break
+            for lattes_request in batch:
+                try:
+                    report = archive_request(lattes_request)
+                except Exception:
+                    release_claim(lattes_request)
+                    raise
+                if report is not None:
+                    total.add(report)
+            if remaining is not None:
+                remaining -= len(batch)
+
+        self._report("Arquivados", total)
@@ -0,0 +1,97 @@
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test import Client, override_settings
+
+from siteapp.models import LattesRequest
+
+from ._bench import isolated_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a disputa de escrita no fluxo criar -> anexar -> finalizar com vários threads. "
+        "Rode com DB_PROFILE=sqlite e DB_PROFILE=postgres para comparar os perfis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--orders", type=int, default=20, help="Pedidos por worker.")
+        parser.add_argument(
+            "--sqlite-journal",
+            default=None,
+            help="Sobrescreve o journal_mode do SQLite (ex: DELETE para comparar com o WAL).",
+        )
+
+    def _flow(self, client: Client, n: int):
+        resp = client.post(
+            "/request/",
+            {
+                "full_name": f"Cliente {n} Bench",
+                "email": f"bench{n}@example.com",
+                "email_confirm": f"bench{n}@example.com",
+                "whatsapp": "(11) 90000-0000",
+            },
+        )
+        public_id = resp["Location"].rstrip("/").split("/")[-2]
+        client.post(
+            f"/request/{public_id}/upload/",
+            {"doc_type": "OTHER", "file": SimpleUploadedFile(f"doc{n}.pdf", f"%PDF-1.4 {n}".encode())},
+        )
+        client.post(f"/request/{public_id}/finalize/")
+
+    def _worker(self, worker_id: int, orders: int, barrier, latencies: list, errors: list):
+        client = Client()
+        barrier.wait()
+        try:
+            for i in range(orders):
+                started = time.perf_counter()
+                try:
+                    self._flow(client, worker_id * 100000 + i)
+                except OperationalError as e:
+                    errors.append(str(e))
+                    continue
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+
+    def handle(self, *args, **options):
+        workers, orders = options["workers"], options["orders"]
+        pragmas = dict(getattr(settings, "SQLITE_PRAGMAS", {}))
+        if options["sqlite_journal"]:
+            pragmas["journal_mode"] = options["sqlite_journal"]
+
+        with isolated_database(), tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media,
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+            SQLITE_PRAGMAS=pragmas,
+        ):
+            connections.close_all()
+            latencies, errors = [], []
+            barrier = threading.Barrier(workers)
+            threads = [
+                threading.Thread(target=self._worker, args=(w, orders, barrier, latencies, errors))
+                for w in range(workers)
+            ]
+            started = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+            created = LattesRequest.objects.count()
+
+        vendor = connection.vendor
+        journal = pragmas.get("journal_mode") if vendor == "sqlite" else "-"
+        self.stdout.write(f"perfil={settings.DB_PROFILE} banco={vendor} journal={journal} workers={workers}")
+        self.stdout.write(f"pedidos={created} erros_de_lock={len(errors)} tempo={elapsed:.2f}s "
+                          f"vazão={len(latencies) / elapsed:.1f} pedidos/s")
+        if latencies:
+            q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [latencies[0]] * 99
+            self.stdout.write(f"latência p50={q[49] * 1000:.0f}ms p95={q[94] * 1000:.0f}ms p99={q[98] * 1000:.0f}ms")
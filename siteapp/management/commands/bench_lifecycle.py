@@ -0,0 +1,232 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import django
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from siteapp.models import OutboundEmail
+from siteapp.services.outbox import process_outbox
+
+from ._bench import isolated_database, percentiles
+
+STAGES = ("create", "upload", "finalize", "send_outbox")
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def synthetic_pdf(n: int, size: int) -> bytes:
+    head = b"%PDF-1.4\n1 0 obj << /Type /Catalog >> endobj\n% " + str(n).encode() + b"\n"
+    return head + b"0" * max(0, size - len(head) - 6) + b"\n%%EOF"
+
+
+def synthetic_image(n: int, size: int) -> tuple[str, bytes]:
+    """JPEG de verdade (com ruído, para não comprimir demais) se houver Pillow."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return f"foto{n}.jpg", b"\xff\xd8\xff\xe0" + str(n).encode().ljust(size, b"\0")
+    side = max(64, int((size / 3) ** 0.5))
+    im = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buf = BytesIO()
+    im.save(buf, "JPEG", quality=90)
+    return f"foto{n}.jpg", buf.getvalue()
+
+
+class Stage:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = []
+        self.queries = []
+        self.peak_bytes = 0
+        self.elapsed = 0.0
+
+    def run(self, fn, track_memory: bool):
+        if track_memory:
+            tracemalloc.reset_peak()
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+        self.latencies.append(elapsed)
+        self.elapsed += elapsed
+        self.queries.append(len(ctx.captured_queries))
+        if track_memory:
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+        return result
+
+    def summary(self) -> dict:
+        p = percentiles(self.latencies)
+        return {
+            "operations": len(self.latencies),
+            "seconds": round(self.elapsed, 4),
+            "throughput_per_s": round(len(self.latencies) / self.elapsed, 2) if self.elapsed else None,
+            "p50_ms": round(p[50] * 1000, 2),
+            "p95_ms": round(p[95] * 1000, 2),
+            "p99_ms": round(p[99] * 1000, 2),
+            "queries_avg": round(sum(self.queries) / len(self.queries), 2) if self.queries else 0,
+            "queries_max": max(self.queries, default=0),
+            "peak_memory_kb": round(self.peak_bytes / 1024, 1) if self.peak_bytes else None,
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark ponta a ponta: cria N pedidos pelo formulário, envia M documentos por pedido, "
+        "finaliza e esvazia a fila de e-mails (locmem). Grava o resultado em JSON para comparar commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=50)
+        parser.add_argument("--docs", type=int, default=4, help="Documentos por pedido (metade PDF, metade foto).")
+        parser.add_argument("--pdf-kb", type=int, default=200)
+        parser.add_argument("--image-kb", type=int, default=800)
+        parser.add_argument("--warmup", type=int, default=1, help="Pedidos iniciais fora da medição.")
+        parser.add_argument("--output", "-o", help="Arquivo JSON de saída.")
+        parser.add_argument("--compare", help="JSON de uma rodada anterior para comparar.")
+        parser.add_argument(
+            "--no-tracemalloc",
+            action="store_true",
+            help="Não mede memória (tracemalloc deixa tudo mais lento; use para tempos mais limpos).",
+        )
+
+    def _create(self, client: Client, n: int) -> str:
+        email = f"bench{n}@example.com"
+        resp = client.post(
+            "/request/",
+            {"full_name": f"Cliente {n} Bench", "email": email, "email_confirm": email, "whatsapp": "(11) 90000-0000"},
+        )
+        if resp.status_code != 302:
+            raise CommandError(f"Criação do pedido falhou (HTTP {resp.status_code}).")
+        return resp["Location"].rstrip("/").split("/")[-2]
+
+    def _upload(self, client: Client, public_id: str, name: str, content: bytes, doc_type: str):
+        resp = client.post(
+            f"/request/{public_id}/upload/",
+            {"doc_type": doc_type, "file": SimpleUploadedFile(name, content)},
+        )
+        if resp.status_code != 302:
+            raise CommandError(f"Upload falhou (HTTP {resp.status_code}).")
+
+    def _lifecycle(self, client: Client, n: int, files: list, stages: dict, track_memory: bool):
+        public_id = stages["create"].run(lambda: self._create(client, n), track_memory)
+        for name, content, doc_type in files:
+            stages["upload"].run(lambda: self._upload(client, public_id, name, content, doc_type), track_memory)
+        stages["finalize"].run(lambda: client.post(f"/request/{public_id}/finalize/"), track_memory)
+
+        # Para quando um lote não pega nada: e-mail que falhou fica PENDING com
+        # next_attempt_at no futuro e não seria pego de novo durante o benchmark
+        while sum(stages["send_outbox"].run(process_outbox, track_memory)):
+            pass
+        pending = OutboundEmail.objects.filter(request__public_id=public_id).exclude(status=OutboundEmail.Status.SENT)
+        if pending.exists():
+            raise CommandError(f"E-mails do pedido {public_id} não foram enviados.")
+
+    def handle(self, *args, **options):
+        orders, docs = options["orders"], options["docs"]
+        track_memory = not options["no_tracemalloc"]
+        pdf_size, image_size = options["pdf_kb"] * 1024, options["image_kb"] * 1024
+        stages = {name: Stage(name) for name in STAGES}
+
+        # Arquivos gerados antes de medir; cada pedido recebe conteúdos distintos (sem deduplicação)
+        files = []
+        for n in range(orders):
+            per_order = []
+            for d in range(docs):
+                if d % 2 == 0:
+                    per_order.append((f"doc{n}-{d}.pdf", synthetic_pdf(n * docs + d, pdf_size), "GRAD_DIPLOMA"))
+                else:
+                    name, content = synthetic_image(n * docs + d, image_size)
+                    per_order.append((name, content, "COURSES"))
+            files.append(per_order)
+
+        if track_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        with isolated_database(), tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media,
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+            ALLOWED_HOSTS=["testserver"],
+            SLOW_REQUEST_SECONDS=float("inf"),
+        ):
+            client = Client()
+            # Aquecimento (imports, templates, URLs) fora dos números
+            warmup = {name: Stage(name) for name in STAGES}
+            for n in range(options["warmup"]):
+                extra = [(f"aquecimento{n}.pdf", synthetic_pdf(-1 - n, pdf_size), "OTHER")]
+                self._lifecycle(client, orders + n, extra, warmup, False)
+
+            for n in range(orders):
+                self._lifecycle(client, n, files[n], stages, track_memory)
+            vendor = connection.vendor
+        total = time.perf_counter() - started
+        if track_memory:
+            tracemalloc.stop()
+
+        result = {
+            "meta": {
+                "commit": _git_commit(),
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": vendor,
+                "orders": orders,
+                "docs_per_order": docs,
+                "pdf_kb": options["pdf_kb"],
+                "image_kb": options["image_kb"],
+                "tracemalloc": track_memory,
+                "total_seconds": round(total, 3),
+            },
+            "stages": {name: stage.summary() for name, stage in stages.items()},
+        }
+
+        self._print(result)
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                self._print_comparison(json.load(f), result)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultado gravado em {options['output']}")
+
+    def _print(self, result: dict):
+        meta = result["meta"]
+        self.stdout.write(
+            f"commit={meta['commit'] or '-'} banco={meta['database']} pedidos={meta['orders']} "
+            f"docs/pedido={meta['docs_per_order']} total={meta['total_seconds']}s"
+        )
+        for name, s in result["stages"].items():
+            memory = f"{s['peak_memory_kb']:.0f}KB" if s["peak_memory_kb"] is not None else "-"
+            self.stdout.write(
+                f"  {name:<12} ops={s['operations']:<5} {s['throughput_per_s'] or 0:>8.1f}/s "
+                f"p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms p99={s['p99_ms']:.1f}ms "
+                f"sql={s['queries_avg']:.1f} (máx {s['queries_max']}) pico_mem={memory}"
+            )
+
+    def _print_comparison(self, before: dict, after: dict):
+        self.stdout.write(f"Comparado com {before['meta'].get('commit') or 'rodada anterior'}:")
+        for name, s in after["stages"].items():
+            old = before["stages"].get(name)
+            if not old:
+                continue
+            changes = []
+            for key in ("p50_ms", "p95_ms", "queries_avg"):
+                if old[key]:
+                    changes.append(f"{key} {(s[key] - old[key]) / old[key] * 100:+.0f}%")
+            self.stdout.write(f"  {name:<12} " + " ".join(changes))
@@ -0,0 +1,246 @@
+import asyncio
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.asgi import get_asgi_application
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.test import override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+from siteapp.models import LattesDocument, LattesRequest
+
+from ._bench import isolated_database
+
+CSRF_TOKEN = "b" * 32
+
+
+class SlowBody:
+    """Corpo enviado aos poucos, uma parte a cada ``delay`` segundos.
+
+    O ritmo começa quando o servidor lê pela primeira vez: com corpos maiores que o
+    buffer do socket o cliente não consegue se adiantar enquanto espera na fila.
+    """
+
+    def __init__(self, body: bytes, pieces: int, delay: float, t0: float):
+        size = -(-len(body) // pieces)
+        self.pieces = [body[i:i + size] for i in range(0, len(body), size)]
+        self.delay = delay
+        self.t0 = t0  # quando o cliente conectou (base da latência)
+        self.first_read = None
+
+    def wait(self, k: int) -> float:
+        now = time.perf_counter()
+        if self.first_read is None:
+            self.first_read = now
+        return max(0.0, self.first_read + (k + 1) * self.delay - now)
+
+
+class SlowWSGIInput:
+    def __init__(self, body: SlowBody):
+        self.body = body
+        self.k = 0
+        self.buffer = b""
+
+    def _fill(self):
+        if self.k < len(self.body.pieces):
+            time.sleep(self.body.wait(self.k))
+            self.buffer += self.body.pieces[self.k]
+            self.k += 1
+            return True
+        return False
+
+    def read(self, size: int = -1) -> bytes:
+        while (size < 0 or len(self.buffer) < size) and self._fill():
+            pass
+        size = len(self.buffer) if size < 0 else size
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        while b"\n" not in self.buffer and (size < 0 or len(self.buffer) < size) and self._fill():
+            pass
+        end = self.buffer.find(b"\n") + 1 or len(self.buffer)
+        if size >= 0:
+            end = min(end, size)
+        data, self.buffer = self.buffer[:end], self.buffer[end:]
+        return data
+
+
+class InFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.current -= 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula clientes lentos enviando documentos ao mesmo tempo e compara um worker ASGI "
+        "(um event loop) com um worker WSGI de N threads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=100)
+        parser.add_argument("--size-kb", type=int, default=1024)
+        parser.add_argument("--pieces", type=int, default=10, help="Em quantas partes cada corpo chega.")
+        parser.add_argument("--delay", type=float, default=0.2, help="Segundos entre as partes.")
+        parser.add_argument("--wsgi-threads", type=int, default=8)
+
+    def _body(self, n: int, size: int) -> bytes:
+        data = {
+            "csrfmiddlewaretoken": CSRF_TOKEN,
+            "doc_type": "OTHER",
+            "file": SimpleUploadedFile(f"doc{n}.pdf", b"%PDF-1.4 " + str(n).encode().ljust(size, b"0")),
+        }
+        return encode_multipart(BOUNDARY, data)
+
+    # --- ASGI ----------------------------------------------------------------------
+
+    async def _asgi_upload(self, app, path: str, body: SlowBody, size: int, inflight: InFlight) -> tuple[int, float]:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"content-type", MULTIPART_CONTENT.encode()),
+                (b"content-length", str(size).encode()),
+                (b"cookie", f"csrftoken={CSRF_TOKEN}".encode()),
+            ],
+            "client": ("127.0.0.1", 50000),
+            "server": ("localhost", 80),
+        }
+        k = 0
+        status = 0
+        done = asyncio.Event()
+
+        async def receive():
+            nonlocal k
+            if k < len(body.pieces):
+                await asyncio.sleep(body.wait(k))
+                k += 1
+                return {"type": "http.request", "body": body.pieces[k - 1], "more_body": k < len(body.pieces)}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        with inflight:
+            await app(scope, receive, send)
+        done.set()
+        return status, time.perf_counter() - body.t0
+
+    def _run_asgi(self, bodies: list[bytes], path: str, opts) -> dict:
+        app = get_asgi_application()
+        inflight = InFlight()
+
+        async def main():
+            t0 = time.perf_counter()
+            return await asyncio.gather(*(
+                self._asgi_upload(app, path, SlowBody(b, opts["pieces"], opts["delay"], t0), len(b), inflight)
+                for b in bodies
+            ))
+
+        started = time.perf_counter()
+        results = asyncio.run(main())
+        return {"results": results, "elapsed": time.perf_counter() - started, "peak": inflight.peak}
+
+    # --- WSGI ----------------------------------------------------------------------
+
+    def _wsgi_upload(self, app, path: str, body: SlowBody, size: int, inflight: InFlight) -> tuple[int, float]:
+        environ = {
+            "REQUEST_METHOD": "POST",
+            "PATH_INFO": path,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": "",
+            "CONTENT_TYPE": MULTIPART_CONTENT,
+            "CONTENT_LENGTH": str(size),
+            "HTTP_HOST": "localhost",
+            "HTTP_COOKIE": f"csrftoken={CSRF_TOKEN}",
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "REMOTE_ADDR": "127.0.0.1",
+            "wsgi.input": SlowWSGIInput(body),
+            "wsgi.url_scheme": "http",
+            "wsgi.errors": None,
+        }
+        status = []
+        try:
+            with inflight:
+                response = app(environ, lambda s, headers, exc_info=None: status.append(int(s.split()[0])))
+                for _ in response:
+                    pass
+                response.close()
+        finally:
+            connections.close_all()
+        return status[0], time.perf_counter() - body.t0
+
+    def _run_wsgi(self, bodies: list[bytes], path: str, opts) -> dict:
+        app = get_wsgi_application()
+        inflight = InFlight()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=opts["wsgi_threads"]) as pool:
+            t0 = time.perf_counter()
+            futures = [
+                pool.submit(self._wsgi_upload, app, path, SlowBody(b, opts["pieces"], opts["delay"], t0), len(b), inflight)
+                for b in bodies
+            ]
+            results = [f.result() for f in futures]
+        return {"results": results, "elapsed": time.perf_counter() - started, "peak": inflight.peak}
+
+    def _report(self, label: str, run: dict):
+        statuses = [s for s, _ in run["results"]]
+        latencies = sorted(t for _, t in run["results"])
+        q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        ok = sum(1 for s in statuses if s == 302)
+        self.stdout.write(
+            f"{label}: ok={ok}/{len(statuses)} simultâneos(pico)={run['peak']} tempo={run['elapsed']:.2f}s "
+            f"p50={q[49]:.2f}s p95={q[94]:.2f}s"
+        )
+
+    def handle(self, *args, **options):
+        size = options["size_kb"] * 1024
+        bodies = [self._body(n, size) for n in range(options["clients"])]
+        upload_time = options["pieces"] * options["delay"]
+        self.stdout.write(
+            f"clientes={options['clients']} corpo={size // 1024}KB em {options['pieces']} partes "
+            f"(~{upload_time:.1f}s por upload) threads_wsgi={options['wsgi_threads']}"
+        )
+
+        with isolated_database(), tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media, ALLOWED_HOSTS=["localhost"], DEBUG=False
+        ):
+            req = LattesRequest.objects.create(full_name="Bench Uploads", email="bench@example.com", whatsapp="0")
+            path = f"/request/{req.public_id}/upload/"
+            connections.close_all()
+
+            self._report("asgi (1 event loop)", self._run_asgi(bodies, path, options))
+            self._report(f"wsgi ({options['wsgi_threads']} threads)", self._run_wsgi(bodies, path, options))
+            saved = LattesDocument.objects.filter(request=req).count()
+
+        self.stdout.write(f"documentos gravados={saved}")
@@ -0,0 +1,67 @@
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.contrib.messages.storage.fallback import FallbackStorage
+
+from siteapp.models import LattesRequest, OutboundEmail
+from siteapp.services.outbox import process_outbox
+from siteapp.services.sendgrid_email import send_email
+from siteapp.views import finalize_request
+
+from ._bench import StubSMTPServer, isolated_database
+
+
+class Command(BaseCommand):
+    help = "Conta conexões SMTP por N pedidos finalizados: envio avulso x fila com conexão compartilhada."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100)
+
+    def _finalize_all(self, orders: int):
+        factory = RequestFactory()
+        for i in range(orders):
+            req = LattesRequest.objects.create(
+                full_name=f"Cliente {i} Teste", email=f"cliente{i}@example.com", whatsapp="(11) 90000-0000"
+            )
+            http_request = factory.post(f"/request/{req.public_id}/finalize/")
+            http_request.session = {}
+            http_request._messages = FallbackStorage(http_request)
+            async_to_sync(finalize_request)(http_request, req.public_id)
+
+    def _run(self, label: str, server: StubSMTPServer, send):
+        before = server.connections, server.messages
+        started = time.perf_counter()
+        send()
+        elapsed = time.perf_counter() - started
+        conns = server.connections - before[0]
+        msgs = server.messages - before[1]
+        self.stdout.write(f"{label:<10} mensagens={msgs:<5} conexões={conns:<5} tempo={elapsed:.3f}s")
+
+    def handle(self, *args, **options):
+        orders = options["orders"]
+        with isolated_database(), StubSMTPServer() as server:
+            with override_settings(
+                EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+                EMAIL_HOST="127.0.0.1",
+                EMAIL_PORT=server.port,
+                EMAIL_USE_TLS=False,
+                EMAIL_HOST_USER="",
+                EMAIL_HOST_PASSWORD="",
+            ):
+                self._finalize_all(orders)
+                queued = list(OutboundEmail.objects.order_by("id"))
+
+                def one_by_one():
+                    # Comportamento antigo: uma conexão nova por e-mail
+                    for m in queued:
+                        send_email(m.to_email, m.subject, m.text, html=m.html, reply_to=m.reply_to or None)
+
+                def pooled():
+                    while process_outbox() != (0, 0):
+                        pass
+
+                self.stdout.write(f"{orders} pedidos finalizados, {len(queued)} e-mails na fila")
+                self._run("avulso", server, one_by_one)
+                self._run("pool", server, pooled)
@@ -0,0 +1,88 @@
+import copy
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+
+from siteapp import views
+from siteapp.models import LattesDocument, LattesRequest
+from siteapp.services.email_templates import render_email
+
+
+def _templates(cached: bool) -> list:
+    templates = copy.deepcopy(settings.TEMPLATES)
+    loaders = settings.TEMPLATE_LOADERS
+    templates[0]["OPTIONS"]["loaders"] = [("django.template.loaders.cached.Loader", loaders)] if cached else loaders
+    return templates
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o tempo de render das páginas públicas e dos e-mails: sem cache (loaders padrão, "
+        "render_to_string) x loader em cache + fragmentos em cache + e-mails pré-compilados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=300)
+
+    def _email_context(self) -> dict:
+        pedido = LattesRequest(
+            public_id="RPM-BENCH001", full_name="Maria Bench", email="maria@example.com",
+            whatsapp="(11) 90000-0000", goal="Bolsa", notes="Observação de teste",
+        )
+        docs = [
+            LattesDocument(doc_type=t, description=f"Documento {i}")
+            for i, t in enumerate(LattesDocument.DocType.values)
+        ]
+        return {"pedido": pedido, "documentos": docs, "total_docs": len(docs)}
+
+    def _cases(self, email_render) -> dict:
+        factory = RequestFactory()
+        ctx = self._email_context()
+        home = async_to_sync(views.home)
+        return {
+            "home": lambda: home(factory.get("/")),
+            "about": lambda: views.about(factory.get("/sobre/")),
+            "email interno": lambda: email_render("emails/notificacao_interna.html", ctx),
+            "email cliente": lambda: email_render("emails/confirmacao_cliente.html", ctx),
+        }
+
+    def _measure(self, cases: dict, iterations: int) -> dict:
+        results = {}
+        for name, fn in cases.items():
+            fn()  # primeira chamada fora: import de tags, URLs etc.
+            started = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+            results[name] = (time.perf_counter() - started) / iterations
+        return results
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        runs = {}
+
+        with override_settings(TEMPLATES=_templates(cached=False), FRAGMENT_CACHE_SECONDS=0, DEBUG=False):
+            runs["sem cache"] = self._measure(self._cases(render_to_string), iterations)
+
+        # O que o Django já faz sozinho quando não há "loaders" configurados
+        with override_settings(TEMPLATES=_templates(cached=True), FRAGMENT_CACHE_SECONDS=0, DEBUG=False):
+            runs["loader"] = self._measure(self._cases(render_to_string), iterations)
+
+        with override_settings(
+            TEMPLATES=_templates(cached=True),
+            FRAGMENT_CACHE_SECONDS=3600,
+            DEPLOY_VERSION=f"bench-{time.time()}",
+            DEBUG=False,
+        ):
+            runs["+fragmentos"] = self._measure(self._cases(render_email), iterations)
+
+        self.stdout.write(f"{iterations} renders de cada (média por render)")
+        self.stdout.write(f"  {'':<14}" + "".join(f"{label:>13}" for label in runs) + "   ganho")
+        for name in runs["sem cache"]:
+            times = [r[name] * 1000 for r in runs.values()]
+            self.stdout.write(
+                f"  {name:<14}" + "".join(f"{t:>11.2f}ms" for t in times) + f"  {times[0] / times[-1]:>5.1f}x"
+            )
@@ -0,0 +1,32 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from siteapp.models import DocumentBlob, LattesDocument
+from siteapp.storage import get_document_storage, sha256_from_name
+
+
+class Command(BaseCommand):
+    help = "Move documentos antigos para o storage por conteúdo, unificando arquivos repetidos."
+
+    def handle(self, *args, **options):
+        storage = get_document_storage()
+        moved = missing = 0
+
+        for doc in LattesDocument.objects.filter(sha256="", archive_member="").iterator(chunk_size=500):
+            if not doc.file or not storage.exists(doc.file.name):
+                missing += 1
+                continue
+
+            original_name = os.path.basename(doc.file.name)
+            name = storage.adopt(doc.file.name)
+            with transaction.atomic():
+                LattesDocument.objects.filter(pk=doc.pk).update(
+                    file=name, sha256=sha256_from_name(name), original_name=original_name
+                )
+                doc.file.name, doc.sha256 = name, sha256_from_name(name)
+                DocumentBlob.add_references([doc])
+            moved += 1
+
+        self.stdout.write(f"Migrados: {moved} | Sem arquivo: {missing}")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from siteapp.services.chunked_upload import expire_sessions
+
+
+class Command(BaseCommand):
+    help = "Apaga uploads em partes abandonados (UPLOAD_SESSION_TTL_HOURS) e seus arquivos parciais."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Sessões expiradas: {expire_sessions()}")
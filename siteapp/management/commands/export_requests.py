@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from siteapp.models import LattesRequest
+from siteapp.services.export import CHUNK_SIZE, FORMATS, export_queryset, iter_export
+
+
+def _parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Data inválida (use AAAA-MM-DD): {value}")
+
+
+class Command(BaseCommand):
+    help = "Exporta os pedidos (com contagem de documentos por tipo) em CSV ou JSONL, em streaming."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--status", choices=LattesRequest.Status.values, default="")
+        parser.add_argument("--since", type=_parse_date, help="Criados a partir de (AAAA-MM-DD)")
+        parser.add_argument("--until", type=_parse_date, help="Criados até (AAAA-MM-DD, inclusive)")
+        parser.add_argument("--output", "-o", default="-", help="Arquivo de saída (padrão: stdout)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        rows = export_queryset(status=options["status"], date_from=options["since"], date_to=options["until"])
+        lines = iter_export(rows, options["format"], chunk_size=options["chunk_size"])
+
+        if options["output"] == "-":
+            out = self.stdout
+            for line in lines:
+                out.write(line, ending="")
+            return
+
+        count = -1 if options["format"] == "csv" else 0  # não conta o cabeçalho
+        with open(options["output"], "w", encoding="utf-8", newline="") as f:
+            for line in lines:
+                f.write(line)
+                count += 1
+        self.stderr.write(f"Exportados: {count} pedidos em {options['output']}")
@@ -0,0 +1,30 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from siteapp.services.document_processing import process_pending
+
+
+class Command(BaseCommand):
+    help = "Otimiza imagens e gera miniaturas dos documentos enviados, num pool de processos."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--loop", action="store_true", help="Fica rodando até ser interrompido.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Segundos entre lotes vazios.")
+
+    def handle(self, *args, **options):
+        workers = options["workers"] or getattr(settings, "DOCUMENT_PROCESSING_WORKERS", 2)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                done = process_pending(options["batch_size"], executor=executor)
+                if done:
+                    self.stdout.write(f"Processados: {done}")
+
+                if not options["loop"]:
+                    break
+                if not done:
+                    time.sleep(options["interval"])
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from siteapp.services.dashboard import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recalcula os contadores do painel do admin (DashboardCounter) e corrige diferenças."
+
+    def handle(self, *args, **options):
+        drift = rebuild()
+        for (kind, key), (before, after) in sorted(drift.items()):
+            self.stdout.write(f"{kind}:{key or '—'} {before} -> {after}")
+        self.stdout.write(f"Contadores corrigidos: {len(drift)}")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from siteapp.models import LattesRequest, ReservedPublicId, generate_public_id
+
+
+class Command(BaseCommand):
+    help = "Completa o pool de códigos de pedido pré-gerados (PUBLIC_ID_POOL_ENABLED)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", type=int, default=1000, help="Quantidade desejada no pool.")
+
+    def handle(self, *args, **options):
+        missing = options["target"] - ReservedPublicId.objects.count()
+        if missing <= 0:
+            self.stdout.write("Pool já está cheio.")
+            return
+
+        candidates = {generate_public_id() for _ in range(missing)}
+        # Uma consulta para descartar os que já viraram pedido
+        taken = set(LattesRequest.objects.filter(public_id__in=candidates).values_list("public_id", flat=True))
+        ReservedPublicId.objects.bulk_create(
+            [ReservedPublicId(public_id=c) for c in candidates - taken],
+            ignore_conflicts=True,
+            batch_size=500,
+        )
+        self.stdout.write(f"Pool: {ReservedPublicId.objects.count()} códigos.")
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from siteapp.services.mail_pool import get_pool
+from siteapp.services.metrics import serve_metrics
+from siteapp.services.outbox import process_outbox
+
+
+class Command(BaseCommand):
+    help = "Envia os e-mails pendentes da fila (OutboundEmail)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--loop", action="store_true", help="Fica rodando até ser interrompido.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Segundos entre lotes vazios.")
+        parser.add_argument(
+            "--metrics-port", type=int, default=None, help="Expõe /metrics (tempo de SMTP) nesta porta local."
+        )
+
+    def handle(self, *args, **options):
+        if options["metrics_port"]:
+            serve_metrics(options["metrics_port"])
+
+        while True:
+            sent, failed = process_outbox(options["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"Enviados: {sent} | Falhas: {failed}")
+
+            if not options["loop"]:
+                get_pool().close_all()
+                break
+            # Lote vazio: espera antes de consultar de novo
+            if not (sent or failed):
+                get_pool().close_idle()
+                time.sleep(options["interval"])
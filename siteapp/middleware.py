@@ -0,0 +1,173 @@
+import logging
+import time
+from urllib.parse import urlparse
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified
+from django.utils.decorators import sync_and_async_middleware
+
+from .services.metrics import RequestStats, current_stats, registry
+from .staticfiles import accepted_encodings, build_index
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger("siteapp.slow_requests")
+
+
+def _view_name(request) -> str:
+    if getattr(request, "is_static_file", False):
+        return "static"
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "<sem rota>"
+
+
+def _begin(request):
+    stats = RequestStats()
+    return stats, current_stats.set(stats), time.perf_counter()
+
+
+def _finish(request, response, stats: RequestStats, token, started: float):
+    current_stats.reset(token)
+    elapsed = time.perf_counter() - started
+    view = _view_name(request)
+    if view == "metrics":
+        return
+
+    status = str(response.status_code) if response is not None else "500"
+    registry.inc("requests_total", view=view, status=status)
+    registry.observe("request_duration_seconds", elapsed, view=view)
+    registry.observe("request_db_queries", stats.queries, view=view)
+    registry.observe("request_db_seconds", stats.db_seconds, view=view)
+    registry.observe("request_template_seconds", stats.template_seconds, view=view)
+    body = int(request.META.get("CONTENT_LENGTH") or 0)
+    if body:
+        registry.observe("request_body_bytes", body, view=view)
+
+    if elapsed >= getattr(settings, "SLOW_REQUEST_SECONDS", 1.0):
+        registry.inc("slow_requests_total", view=view)
+        _log_slow(request, view, status, elapsed, stats)
+
+
+def _log_slow(request, view: str, status: str, elapsed: float, stats: RequestStats):
+    lines = [
+        f"{request.method} {request.path} view={view} status={status} tempo={elapsed * 1000:.0f}ms "
+        f"sql={stats.queries} ({stats.db_seconds * 1000:.0f}ms) templates={stats.template_seconds * 1000:.0f}ms "
+        f"smtp={stats.smtp_seconds * 1000:.0f}ms"
+    ]
+    for sql, seconds in stats.slowest_queries():
+        lines.append(f"  {seconds * 1000:.1f}ms {sql[:300]}")
+    for count, sql in stats.repeated_queries():
+        lines.append(f"  repetida {count}x: {sql[:300]}")
+    slow_logger.warning("Requisição lenta: %s", "\n".join(lines))
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """Mede cada requisição (tempo, SQL, templates, upload, SMTP) para o /metrics.
+
+    Deve ser o primeiro do MIDDLEWARE, para incluir o tempo dos demais.
+    """
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            stats, token, started = _begin(request)
+            response = None
+            try:
+                response = await get_response(request)
+                return response
+            finally:
+                _finish(request, response, stats, token, started)
+
+    else:
+
+        def middleware(request):
+            stats, token, started = _begin(request)
+            response = None
+            try:
+                response = get_response(request)
+                return response
+            finally:
+                _finish(request, response, stats, token, started)
+
+    return middleware
+
+
+def _etag(entry, encoding: str | None) -> str:
+    # Cada codificação é outra representação, com ETag própria
+    return entry.headers["ETag"] if not encoding else entry.headers["ETag"][:-1] + f'-{encoding}"'
+
+
+def _serve_static(request, entry):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+
+    path, size, encoding = entry.path, entry.size, None
+    accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+    for candidate in ("br", "gzip"):
+        if candidate in accepted and candidate in entry.encodings:
+            (path, size), encoding = entry.encodings[candidate], candidate
+            break
+    etag = _etag(entry, encoding)
+
+    if_none_match = request.headers.get("If-None-Match", "")
+    if if_none_match and (if_none_match.strip() == "*" or etag in (t.strip() for t in if_none_match.split(","))):
+        response = HttpResponseNotModified()
+    elif request.method == "HEAD":
+        response = HttpResponse(content_type=entry.content_type)
+    else:
+        response = FileResponse(open(path, "rb"), content_type=entry.content_type)
+        if "Content-Disposition" in response:
+            del response["Content-Disposition"]
+
+    for name, value in entry.headers.items():
+        response[name] = value
+    response["ETag"] = etag
+    if response.status_code == 200:
+        response["Content-Length"] = str(size)
+        if encoding:
+            response["Content-Encoding"] = encoding
+    return response
+
+
+@sync_and_async_middleware
+def static_files_middleware(get_response):
+    """Serve o STATIC_ROOT direto do processo (no estilo do WhiteNoise), só com DEBUG desligado.
+
+    O índice é montado uma vez na subida: nada de stat por requisição. Arquivos com hash no
+    nome (manifesto do collectstatic) saem com cache imutável de um ano; se o cliente aceita,
+    vai a versão .br ou .gz gerada no collectstatic.
+    """
+    static_url = settings.STATIC_URL or ""
+    if settings.DEBUG or not settings.STATIC_ROOT or urlparse(static_url).netloc:
+        # Em DEBUG o runserver serve pelos finders; com CDN, nem passa por aqui
+        raise MiddlewareNotUsed
+    prefix = "/" + static_url.lstrip("/")
+    index = build_index(str(settings.STATIC_ROOT), prefix) if settings.STATIC_ROOT else {}
+    if not index:
+        logger.info("STATIC_ROOT vazio; rode collectstatic para servir os estáticos.")
+        raise MiddlewareNotUsed
+
+    def lookup(request):
+        entry = index.get(request.path_info)
+        if entry is not None:
+            request.is_static_file = True
+        return entry
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            entry = lookup(request)
+            if entry is not None:
+                return _serve_static(request, entry)
+            return await get_response(request)
+
+    else:
+
+        def middleware(request):
+            entry = lookup(request)
+            if entry is not None:
+                return _serve_static(request, entry)
+            return get_response(request)
+
+    return middleware
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:29
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteapp', '0004_outboundemail_document_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('doc_type', models.CharField(choices=[('GRAD_DIPLOMA', 'Diploma de graduação'), ('POST_CERT', 'Certificado de pós-graduação'), ('COURSES', 'Cursos/minicursos complementares'), ('LANGUAGES', 'Cursos de idiomas'), ('EVENTS', 'Participação em eventos'), ('RESEARCH_EXT', 'Projetos de pesquisa/extensão'), ('RESEARCH_GROUP', 'Grupos de pesquisa'), ('PRESENTATIONS', 'Apresentações/palestras'), ('PUBLICATIONS', 'Publicações'), ('PROFESSIONAL', 'Atuação profissional'), ('AWARDS', 'Títulos/prêmios/menções'), ('COUNCIL_REG', 'Registro no conselho'), ('OTHER', 'Outros')], max_length=30)),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('filename', models.CharField(max_length=200)),
+                ('total_size', models.PositiveBigIntegerField()),
+                ('received', models.PositiveBigIntegerField(default=0)),
+                ('storage_name', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='siteapp.lattesrequest')),
+            ],
+        ),
+    ]
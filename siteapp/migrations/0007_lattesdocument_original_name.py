@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteapp', '0006_document_sha256_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lattesdocument',
+            name='original_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteapp', '0007_lattesdocument_original_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lattesdocument',
+            name='optimized_file',
+            field=models.FileField(blank=True, upload_to='lattes_docs/variants/%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='lattesdocument',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lattesdocument',
+            name='processing_error',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='lattesdocument',
+            name='thumbnail',
+            field=models.FileField(blank=True, upload_to='lattes_docs/variants/%Y/%m/'),
+        ),
+    ]
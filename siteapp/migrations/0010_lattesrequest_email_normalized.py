@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:35
+
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+
+def populate_email_normalized(apps, schema_editor):
+    LattesRequest = apps.get_model("siteapp", "LattesRequest")
+    LattesRequest.objects.update(email_normalized=Lower(Trim("email")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteapp', '0009_reservedpublicid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lattesrequest',
+            name='email_normalized',
+            field=models.EmailField(blank=True, db_index=True, max_length=254),
+        ),
+        migrations.RunPython(populate_email_normalized, migrations.RunPython.noop),
+    ]
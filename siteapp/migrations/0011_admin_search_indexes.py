@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:37
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def _normalize(value):
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return " ".join(value.lower().split())
+
+
+def populate_search_columns(apps, schema_editor):
+    LattesRequest = apps.get_model("siteapp", "LattesRequest")
+    batch = []
+    for r in LattesRequest.objects.only("id", "full_name", "whatsapp").iterator(chunk_size=2000):
+        r.full_name_normalized = _normalize(r.full_name)
+        r.whatsapp_digits = "".join(c for c in r.whatsapp or "" if c.isdigit())
+        batch.append(r)
+        if len(batch) >= 2000:
+            LattesRequest.objects.bulk_update(batch, ["full_name_normalized", "whatsapp_digits"])
+            batch = []
+    if batch:
+        LattesRequest.objects.bulk_update(batch, ["full_name_normalized", "whatsapp_digits"])
+
+
+TRIGRAM_COLUMNS = ["full_name_normalized", "email_normalized", "whatsapp_digits"]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Só no PostgreSQL: permite busca por trecho (LIKE '%...%') sem varrer a tabela
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS siteapp_req_{column}_trgm "
+            f"ON siteapp_lattesrequest USING gin ({column} gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS siteapp_req_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteapp', '0010_lattesrequest_email_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lattesrequest',
+            name='full_name_normalized',
+            field=models.CharField(blank=True, db_index=True, max_length=120),
+        ),
+        migrations.AddField(
+            model_name='lattesrequest',
+            name='whatsapp_digits',
+            field=models.CharField(blank=True, db_index=True, max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='lattesdocument',
+            index=models.Index(fields=['request', 'uploaded_at'], name='siteapp_doc_request_uploaded'),
+        ),
+        migrations.AddIndex(
+            model_name='lattesrequest',
+            index=models.Index(fields=['status', 'created_at'], name='siteapp_req_status_created'),
+        ),
+        migrations.RunPython(populate_search_columns, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteapp', '0011_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lattesrequest',
+            name='finalized_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='lattesrequest',
+            name='status',
+            field=models.CharField(choices=[('NEW', 'New'), ('FINALIZED', 'Finalized'), ('IN_PROGRESS', 'In progress'), ('DONE', 'Done')], default='NEW', max_length=20),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteapp', '0012_lattesrequest_finalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lattesdocument',
+            name='archive_member',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='lattesrequest',
+            name='archive_lock',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='lattesrequest',
+            name='archive_locked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lattesrequest',
+            name='archive_name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='lattesrequest',
+            name='archived_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
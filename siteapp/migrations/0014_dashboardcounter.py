@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    LattesRequest = apps.get_model("siteapp", "LattesRequest")
+    LattesDocument = apps.get_model("siteapp", "LattesDocument")
+    DashboardCounter = apps.get_model("siteapp", "DashboardCounter")
+    rows = []
+    for status, n in LattesRequest.objects.order_by().values_list("status").annotate(n=Count("pk")):
+        rows.append(DashboardCounter(kind="status", key=status, value=n))
+    open_requests = LattesRequest.objects.exclude(status="DONE").order_by()
+    for deadline, n in open_requests.values_list("deadline").annotate(n=Count("pk")):
+        rows.append(DashboardCounter(kind="deadline", key=deadline.isoformat() if deadline else "", value=n))
+    for doc_type, n in LattesDocument.objects.order_by().values_list("doc_type").annotate(n=Count("pk")):
+        rows.append(DashboardCounter(kind="doc_type", key=doc_type, value=n))
+    DashboardCounter.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteapp', '0013_lattesrequest_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('status', 'Status'), ('doc_type', 'Tipo de documento'), ('deadline', 'Prazo')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=30)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'key'), name='siteapp_counter_kind_key')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteapp', '0014_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lattesdocument',
+            name='processing_lock',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='lattesdocument',
+            name='processing_locked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
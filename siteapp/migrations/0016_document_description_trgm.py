@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# Mesma expressão que o icontains gera no PostgreSQL: UPPER("description"::text) LIKE UPPER(...)
+INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS siteapp_doc_description_trgm "
+    "ON siteapp_lattesdocument USING gin ((UPPER(description::text)) gin_trgm_ops)"
+)
+
+
+def create_trigram_index(apps, schema_editor):
+    # Só no PostgreSQL (a extensão vem da 0011): busca do admin por trecho da descrição
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(INDEX_SQL)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS siteapp_doc_description_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('siteapp', '0015_lattesdocument_processing_lock'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -1,6 +1,22 @@
-from django.db import models
+import os
 import secrets
 import string
+import unicodedata
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.utils import timezone
+
+from .storage import get_document_storage, sha256_from_name
+
+
+def normalize_search_text(value: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples: "  JOÃO  da Silva" -> "joao da silva"."""
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return " ".join(value.lower().split())
 
 
 def generate_public_id() -> str:
@@ -14,14 +30,21 @@ def generate_public_id() -> str:
 class LattesRequest(models.Model):
     class Status(models.TextChoices):
         NEW = "NEW", "New"
+        # Cliente clicou em "Finalizar pedido": e-mails na fila, sem novos documentos
+        FINALIZED = "FINALIZED", "Finalized"
         IN_PROGRESS = "IN_PROGRESS", "In progress"
         DONE = "DONE", "Done"
 
     public_id = models.CharField(max_length=20, unique=True, db_index=True, blank=True)
 
     full_name = models.CharField(max_length=120)
+    # Colunas de busca do admin (prefixo com índice; trigram no PostgreSQL)
+    full_name_normalized = models.CharField(max_length=120, blank=True, db_index=True)
     email = models.EmailField()
+    # email.strip().lower(), para a consulta de status comparar por igualdade com índice
+    email_normalized = models.EmailField(blank=True, db_index=True)
     whatsapp = models.CharField(max_length=30)
+    whatsapp_digits = models.CharField(max_length=30, blank=True, db_index=True)
 
     goal = models.CharField(max_length=200, blank=True)  # ex: "Mestrado", "Concurso"
     deadline = models.DateField(null=True, blank=True)   # opcional
@@ -31,25 +54,153 @@ class LattesRequest(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    finalized_at = models.DateTimeField(null=True, blank=True)
 
-    def _ensure_public_id(self):
-        if self.public_id:
-            return
-        for _ in range(20):
-            candidate = generate_public_id()
-            if not LattesRequest.objects.filter(public_id=candidate).exists():
-                self.public_id = candidate
+    # Arquivamento (manage.py archive_requests): documentos num .zip no ARCHIVE_ROOT
+    archived_at = models.DateTimeField(null=True, blank=True)
+    archive_name = models.CharField(max_length=255, blank=True)
+    # Reserva de um pedido por um processo de arquivamento (vários podem rodar juntos)
+    archive_lock = models.CharField(max_length=32, blank=True)
+    archive_locked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Filtro por status + ordenação/hierarquia por data no admin
+            models.Index(fields=["status", "created_at"], name="siteapp_req_status_created"),
+        ]
+
+    PUBLIC_ID_ATTEMPTS = 20
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Como estava no banco: o save desconta daqui ao atualizar os contadores do painel
+        if "status" in field_names and "deadline" in field_names:
+            instance._counted = instance.counter_keys()
+        return instance
+
+    def counter_keys(self) -> list:
+        """Chaves do DashboardCounter em que este pedido é contado."""
+        keys = [(DashboardCounter.Kind.STATUS, self.status)]
+        if self.status != self.Status.DONE:
+            keys.append((DashboardCounter.Kind.DEADLINE, str(self.deadline) if self.deadline else ""))
+        return keys
+
+    def _counted_keys(self) -> list:
+        if hasattr(self, "_counted"):
+            return self._counted
+        # Carregado com .only()/.defer() sem status ou prazo
+        row = LattesRequest.objects.filter(pk=self.pk).values_list("status", "deadline").first()
+        return LattesRequest(status=row[0], deadline=row[1]).counter_keys() if row else []
+
+    def _count(self, old_keys: list):
+        new_keys = self.counter_keys()
+        DashboardCounter.apply(Counter(new_keys) - Counter(old_keys), Counter(old_keys) - Counter(new_keys))
+        self._counted = new_keys
+
+    def _insert_with_public_id(self, *args, **kwargs):
+        # Quem garante a unicidade é a constraint: tenta o INSERT e, se o código já
+        # existe, sorteia outro. O savepoint isola a falha da transação externa.
+        candidate = ReservedPublicId.take() if getattr(settings, "PUBLIC_ID_POOL_ENABLED", False) else ""
+        for _ in range(self.PUBLIC_ID_ATTEMPTS):
+            self.public_id = candidate or generate_public_id()
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                    self._count([])
                 return
+            except IntegrityError:
+                if not LattesRequest.objects.filter(public_id=self.public_id).exists():
+                    raise
+            candidate = ""
+        self.public_id = ""
         raise RuntimeError("Não foi possível gerar um código único para o pedido.")
 
     def save(self, *args, **kwargs):
-        self._ensure_public_id()
-        super().save(*args, **kwargs)
+        self.email_normalized = (self.email or "").strip().lower()
+        self.full_name_normalized = normalize_search_text(self.full_name)
+        self.whatsapp_digits = "".join(c for c in self.whatsapp or "" if c.isdigit())
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            derived = {"email": "email_normalized", "full_name": "full_name_normalized", "whatsapp": "whatsapp_digits"}
+            kwargs["update_fields"] = {*update_fields, *(derived[f] for f in update_fields if f in derived)}
+        if not self.public_id and self._state.adding:
+            self._insert_with_public_id(*args, **kwargs)
+            return
+        if update_fields is not None and not {"status", "deadline"} & set(update_fields):
+            # Status e prazo não são gravados: os contadores não mudam
+            super().save(*args, **kwargs)
+            return
+        old_keys = [] if self._state.adding else self._counted_keys()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._count(old_keys)
+
+    @property
+    def accepts_uploads(self) -> bool:
+        return self.status == self.Status.NEW
+
+    @classmethod
+    def mark_finalized(cls, pk) -> bool:
+        """NEW -> FINALIZED num UPDATE condicional. False se o pedido já tinha sido finalizado
+        (clique duplo, reenvio do navegador): só um dos POSTs ganha a transição."""
+        now = timezone.now()
+        updated = cls.objects.filter(pk=pk, status=cls.Status.NEW).update(
+            status=cls.Status.FINALIZED, finalized_at=now, updated_at=now
+        )
+        if updated:
+            # update() não passa pelo save: o prazo continua contado (os dois são "em aberto")
+            DashboardCounter.apply(
+                {(DashboardCounter.Kind.STATUS, cls.Status.FINALIZED): 1},
+                {(DashboardCounter.Kind.STATUS, cls.Status.NEW): 1},
+            )
+        return bool(updated)
+
+    @classmethod
+    def lock_open(cls, pk) -> bool:
+        """Dentro de uma transação: trava a linha do pedido se ele ainda aceita documentos.
+
+        Serializa o upload com a finalização (no SQLite o BEGIN IMMEDIATE já faz isso).
+        """
+        return bool(list(cls.objects.select_for_update().filter(pk=pk, status=cls.Status.NEW).values_list("pk")))
 
     def __str__(self) -> str:
         return f"{self.public_id} - {self.full_name} ({self.status})"
 
 
+class ReservedPublicId(models.Model):
+    """Códigos pré-gerados (manage.py refill_public_ids), usados se PUBLIC_ID_POOL_ENABLED."""
+
+    public_id = models.CharField(max_length=20, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def take(cls) -> str:
+        """Retira um código do pool numa única ida ao banco. Vazio se o pool acabou."""
+        table = connection.ops.quote_name(cls._meta.db_table)
+        if connection.features.can_return_columns_from_insert:
+            # PostgreSQL e SQLite >= 3.35 têm DELETE ... RETURNING
+            lock = " FOR UPDATE SKIP LOCKED" if connection.features.has_select_for_update_skip_locked else ""
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE id = (SELECT id FROM {table} ORDER BY id LIMIT 1{lock}) "
+                    f"RETURNING public_id"
+                )
+                row = cursor.fetchone()
+            return row[0] if row else ""
+
+        for _ in range(3):
+            row = cls.objects.order_by("id").values_list("id", "public_id").first()
+            if row is None:
+                return ""
+            if cls.objects.filter(id=row[0]).delete()[0]:
+                return row[1]
+        return ""
+
+    def __str__(self) -> str:
+        return self.public_id
+
+
 class LattesDocument(models.Model):
     class DocType(models.TextChoices):
         GRAD_DIPLOMA = "GRAD_DIPLOMA", "Diploma de graduação"
@@ -70,8 +221,285 @@ class LattesDocument(models.Model):
     doc_type = models.CharField(max_length=30, choices=DocType.choices)
     description = models.CharField(max_length=200, blank=True)
 
-    file = models.FileField(upload_to="lattes_docs/%Y/%m/")
+    file = models.FileField(upload_to="lattes_docs/%Y/%m/", storage=get_document_storage)
+    # Arquivos iguais (mesmo hash) são gravados uma vez só; ver DocumentBlob
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    # Nome do arquivo como o cliente enviou (no storage o nome é o hash)
+    original_name = models.CharField(max_length=255, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    # Preenchidos pelo worker (manage.py process_documents), nunca na requisição
+    optimized_file = models.FileField(upload_to="lattes_docs/variants/%Y/%m/", blank=True)
+    thumbnail = models.FileField(upload_to="lattes_docs/variants/%Y/%m/", blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    processing_error = models.CharField(max_length=500, blank=True)
+    # Reserva do documento por um worker (vários process_documents podem rodar juntos)
+    processing_lock = models.CharField(max_length=32, blank=True)
+    processing_locked_at = models.DateTimeField(null=True, blank=True)
+
+    # Preenchido quando o original saiu do storage quente para o .zip do pedido
+    # (LattesRequest.archive_name); ``file`` guarda o nome para onde ele volta
+    archive_member = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["request", "uploaded_at"], name="siteapp_doc_request_uploaded"),
+        ]
+
+    def store_file(self):
+        """Grava o arquivo no storage por conteúdo antes do INSERT e guarda o hash."""
+        if self.file and not self.file._committed:
+            # Arquivo trocado num documento existente (admin): vale o nome do novo
+            if not self.original_name or not self._state.adding:
+                self.original_name = os.path.basename(self.file.name)[:255]
+            self.file.save(self.file.name, self.file.file, save=False)
+        self.sha256 = sha256_from_name(self.file.name)
+
+    @property
+    def is_archived(self) -> bool:
+        return bool(self.archive_member)
+
+    @property
+    def display_name(self) -> str:
+        return self.original_name or os.path.basename(self.file.name)
+
+    @property
+    def attachment_file(self):
+        """Arquivo a enviar por e-mail: a versão otimizada, quando existe."""
+        return self.optimized_file or self.file
+
+    @property
+    def attachment_name(self) -> str:
+        if self.optimized_file:
+            return os.path.splitext(self.display_name)[0] + ".jpg"
+        return self.display_name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Como estava no banco: o save ajusta contadores e referências dos blobs a partir daqui
+        if "doc_type" in field_names and "sha256" in field_names:
+            instance._loaded = (instance.doc_type, instance.sha256)
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding:
+            old_type, old_sha = None, None
+        elif hasattr(self, "_loaded"):
+            old_type, old_sha = self._loaded
+        else:
+            row = LattesDocument.objects.filter(pk=self.pk).values_list("doc_type", "sha256").first()
+            old_type, old_sha = row or (None, None)
+        self.store_file()
+        replaced = not adding and self.sha256 != old_sha
+        # Documento arquivado que ganhou arquivo novo: a referência antiga já saiu ao ir para o .zip
+        release_old = replaced and old_sha and not self.archive_member
+        stale_variants = []
+        if replaced:
+            self.archive_member = ""
+            # Versão otimizada e miniatura eram do arquivo antigo: volta para a fila do worker
+            stale_variants = [(v.storage, v.name) for v in (self.optimized_file, self.thumbnail) if v]
+            self.optimized_file = self.thumbnail = ""
+            self.processed_at = self.processing_locked_at = None
+            self.processing_error = self.processing_lock = ""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_type != self.doc_type:
+                DashboardCounter.apply(
+                    {(DashboardCounter.Kind.DOC_TYPE, self.doc_type): 1},
+                    {(DashboardCounter.Kind.DOC_TYPE, old_type): 1} if old_type else {},
+                )
+            if release_old:
+                DocumentBlob.release_reference(old_sha)
+            if (adding or replaced) and self.sha256:
+                DocumentBlob.add_references([self])
+            for storage, name in stale_variants:
+                transaction.on_commit(lambda storage=storage, name=name: storage.delete(name))
+        self._loaded = (self.doc_type, self.sha256)
+
     def __str__(self) -> str:
         return f"{self.request.public_id} - {self.doc_type}"
+
+
+class DocumentBlob(models.Model):
+    """Um arquivo físico do storage por conteúdo e quantos LattesDocument apontam para ele."""
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def add_references(cls, docs):
+        """Soma +1 por documento em poucas queries, qualquer que seja o tamanho do lote."""
+        counts = {}
+        first = {}
+        for d in docs:
+            if d.sha256:
+                counts[d.sha256] = counts.get(d.sha256, 0) + 1
+                first.setdefault(d.sha256, d)
+        if not counts:
+            return
+
+        existing = set(cls.objects.filter(sha256__in=counts).values_list("sha256", flat=True))
+        cls.objects.bulk_create(
+            [
+                cls(sha256=sha, name=first[sha].file.name, size=first[sha].file.size)
+                for sha in counts
+                if sha not in existing
+            ],
+            ignore_conflicts=True,
+        )
+        cls.objects.filter(sha256__in=counts).update(
+            ref_count=models.F("ref_count")
+            + models.Case(
+                *[models.When(sha256=sha, then=models.Value(n)) for sha, n in counts.items()],
+                default=models.Value(0),
+            )
+        )
+
+    @classmethod
+    def release_reference(cls, sha: str):
+        cls.objects.filter(sha256=sha, ref_count__gt=0).update(ref_count=models.F("ref_count") - 1)
+        blob = cls.objects.filter(sha256=sha, ref_count=0).first()
+        if blob is None or not cls.objects.filter(pk=blob.pk, ref_count=0).delete()[0]:
+            return
+
+        def _remove_file():
+            # Outro upload com o mesmo conteúdo pode ter recriado o blob nesse meio tempo
+            if not cls.objects.filter(sha256=sha).exists():
+                get_document_storage().delete(blob.name)
+
+        transaction.on_commit(_remove_file)
+
+    @classmethod
+    def discard_unreferenced(cls, names):
+        """Apaga arquivos gravados no storage cujo documento não chegou a ser criado.
+
+        Um arquivo que já tem blob (outro documento com o mesmo conteúdo) fica.
+        """
+        for name in set(names):
+            sha = sha256_from_name(name)
+            if sha and not cls.objects.filter(sha256=sha).exists():
+                get_document_storage().delete(name)
+
+    def __str__(self) -> str:
+        return f"{self.sha256[:12]} ({self.ref_count} ref.)"
+
+
+class DashboardCounter(models.Model):
+    """Contagens do painel do admin, somadas a cada save/delete em vez de COUNT na hora.
+
+    Ajustadas na mesma transação da mudança (save dos modelos, sinais de delete e os
+    caminhos com update()/bulk_create); ``manage.py rebuild_dashboard`` recalcula tudo
+    e corrige o que tiver escapado.
+    """
+
+    class Kind(models.TextChoices):
+        STATUS = "status", "Status"
+        DOC_TYPE = "doc_type", "Tipo de documento"
+        # Pedidos ainda não concluídos por data de prazo (ISO, "" = sem prazo). A faixa
+        # ("vence esta semana") é somada na leitura, porque muda com o dia e não com o pedido.
+        DEADLINE = "deadline", "Prazo"
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    key = models.CharField(max_length=30, blank=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "key"], name="siteapp_counter_kind_key"),
+        ]
+
+    @classmethod
+    def apply(cls, added, removed=None):
+        """Soma ``added`` e subtrai ``removed`` ({(kind, key): n}) em duas queries."""
+        deltas = Counter(added)
+        deltas.subtract(removed or {})
+        deltas = {k: n for k, n in deltas.items() if n}
+        if not deltas:
+            return
+
+        cls.objects.bulk_create([cls(kind=kind, key=key) for kind, key in deltas], ignore_conflicts=True)
+        match = models.Q()
+        for kind, key in deltas:
+            match |= models.Q(kind=kind, key=key)
+        cls.objects.filter(match).update(
+            value=models.F("value")
+            + models.Case(
+                *[models.When(kind=kind, key=key, then=models.Value(n)) for (kind, key), n in deltas.items()],
+                default=models.Value(0),
+            )
+        )
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{self.key or '—'} = {self.value}"
+
+
+class UploadSession(models.Model):
+    """Upload em partes de um documento, gravado direto no arquivo final."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    request = models.ForeignKey(LattesRequest, on_delete=models.CASCADE, related_name="upload_sessions")
+    doc_type = models.CharField(max_length=30, choices=LattesDocument.DocType.choices)
+    description = models.CharField(max_length=200, blank=True)
+
+    filename = models.CharField(max_length=200)
+    total_size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # Nome no storage (ex: lattes_docs/2026/02/arquivo.pdf), reservado no início
+    storage_name = models.CharField(max_length=255)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.request.public_id} - {self.filename} ({self.received}/{self.total_size})"
+
+
+class OutboundEmail(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        SENDING = "SENDING", "Sending"
+        SENT = "SENT", "Sent"
+        FAILED = "FAILED", "Failed"
+
+    # Evita enfileirar o mesmo e-mail duas vezes (ex: "RPM-XXXX:interno")
+    dedupe_key = models.CharField(max_length=120, unique=True)
+
+    request = models.ForeignKey(
+        LattesRequest, on_delete=models.CASCADE, related_name="outbound_emails", null=True, blank=True
+    )
+    attach_documents = models.BooleanField(default=False)
+    # Vazio = todos os documentos do pedido (ver services/attachment_policy.py)
+    document_ids = models.JSONField(default=list, blank=True)
+    zip_attachments = models.BooleanField(default=False)
+    # "Parte N de M" do e-mail interno dividido; refeito se os anexos virarem links no envio
+    part_number = models.PositiveSmallIntegerField(default=1)
+    part_total = models.PositiveSmallIntegerField(default=1)
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=200)
+    text = models.TextField(blank=True)
+    html = models.TextField(blank=True)
+    reply_to = models.EmailField(blank=True)
+
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=40, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.dedupe_key} -> {self.to_email} ({self.status})"
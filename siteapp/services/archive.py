@@ -0,0 +1,278 @@
+"""Arquivamento dos documentos de pedidos concluídos em armazenamento frio.
+
+Pedidos DONE sem mudança há ``ARCHIVE_AFTER_DAYS`` têm os originais empacotados num
+.zip por pedido em ``ARCHIVE_ROOT/<ano>/<código>.zip``. Cada ``LattesDocument`` passa
+a apontar para o seu membro no .zip (``archive_member``) e solta a referência do blob:
+o arquivo quente só é apagado quando nenhum outro documento usa o mesmo conteúdo.
+
+Vários processos podem rodar juntos: cada pedido é reservado com um UPDATE condicional
+(como a fila de e-mails), e uma reserva abandonada expira depois de ``LOCK_SECONDS``.
+Ao abrir um documento arquivado (download), ``restore_document`` o devolve ao storage e
+o pedido volta a contar ``ARCHIVE_AFTER_DAYS`` a partir dali; ao ser arquivado de novo, o
+.zip é regravado com os membros que continuavam nele.
+"""
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import DocumentBlob, LattesDocument, LattesRequest
+from ..storage import get_document_storage
+from .attachment_policy import STORED_EXTENSIONS
+
+LOCK_SECONDS = 3600
+SHA_BATCH = 500
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def archive_root() -> str:
+    # Vazio não vale: um caminho relativo ao diretório atual muda entre o cron e o servidor web
+    return str(_setting("ARCHIVE_ROOT", "") or os.path.join(settings.BASE_DIR, "cold_storage"))
+
+
+def archive_path(archive_name: str) -> str:
+    return os.path.join(archive_root(), archive_name)
+
+
+def candidates(days: int | None = None):
+    days = _setting("ARCHIVE_AFTER_DAYS", 180) if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return LattesRequest.objects.filter(
+        status=LattesRequest.Status.DONE, archived_at__isnull=True, updated_at__lt=cutoff
+    )
+
+
+@dataclass
+class ArchivePlan:
+    orders: int = 0
+    documents: int = 0
+    archived_bytes: int = 0      # o que vai para os .zip (antes de comprimir)
+    reclaimable_bytes: int = 0   # o que sai de fato do storage quente
+    missing: int = 0
+    order_ids: list = field(default_factory=list)
+
+    def add(self, other: "ArchivePlan"):
+        self.orders += other.orders
+        self.documents += other.documents
+        self.archived_bytes += other.archived_bytes
+        self.reclaimable_bytes += other.reclaimable_bytes
+        self.missing += other.missing
+
+
+def plan(requests_queryset) -> ArchivePlan:
+    """Quanto seria arquivado e liberado, sem mexer em nada (base do --dry-run)."""
+    result = ArchivePlan(order_ids=list(requests_queryset.values_list("pk", flat=True)))
+    result.orders = len(result.order_ids)
+    storage = get_document_storage()
+    per_blob, blob_sizes = Counter(), {}
+
+    docs = LattesDocument.objects.filter(request_id__in=result.order_ids, archive_member="")
+    for name, sha in docs.values_list("file", "sha256").iterator(chunk_size=SHA_BATCH):
+        try:
+            size = storage.size(name)
+        except OSError:
+            result.missing += 1
+            continue
+        result.documents += 1
+        result.archived_bytes += size
+        if sha:
+            per_blob[sha] += 1
+            blob_sizes[sha] = size
+        else:
+            result.reclaimable_bytes += size
+
+    # Blob compartilhado com pedidos que ficam: o arquivo continua no disco
+    shas = list(per_blob)
+    for i in range(0, len(shas), SHA_BATCH):
+        refs = DocumentBlob.objects.filter(sha256__in=shas[i:i + SHA_BATCH]).values_list("sha256", "ref_count")
+        for sha, ref_count in refs:
+            if ref_count <= per_blob[sha]:
+                result.reclaimable_bytes += blob_sizes[sha]
+    return result
+
+
+def claim(days: int | None, limit: int) -> list[LattesRequest]:
+    """Reserva até ``limit`` pedidos; dois processos nunca pegam o mesmo."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    free = Q(archive_lock="") | Q(archive_locked_at__lt=now - timedelta(seconds=LOCK_SECONDS))
+    ids = list(candidates(days).filter(free).order_by("updated_at").values_list("id", flat=True)[:limit])
+    if not ids:
+        return []
+    candidates(days).filter(free, id__in=ids).update(archive_lock=token, archive_locked_at=now)
+    return list(LattesRequest.objects.filter(archive_lock=token).order_by("id"))
+
+
+def _member_name(doc) -> str:
+    return f"{doc.pk}{os.path.splitext(doc.file.name)[1].lower()}"
+
+
+def _carry_over(zf, previous: str, members: list[str]):
+    """Copia para o .zip novo os membros do anterior que continuam arquivados."""
+    with zipfile.ZipFile(archive_path(previous)) as old:
+        for member in members:
+            src_info = old.getinfo(member)
+            info = zipfile.ZipInfo(member, src_info.date_time)
+            info.compress_type = src_info.compress_type
+            info.file_size = src_info.file_size
+            with old.open(src_info) as src, zf.open(info, "w") as dest:
+                shutil.copyfileobj(src, dest, 1024 * 1024)
+
+
+def _write_archive(lattes_request, docs, archive_name: str, carried: list[str] = ()) -> dict:
+    """Grava o .zip (num .part ao lado, trocado no fim) e devolve {doc.pk: membro}."""
+    final = archive_path(archive_name)
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(final), prefix=f"{lattes_request.public_id}-", suffix=".part")
+    members = {}
+    try:
+        with os.fdopen(fd, "wb") as out, zipfile.ZipFile(out, "w", allowZip64=True) as zf:
+            if carried:
+                _carry_over(zf, lattes_request.archive_name, carried)
+            for doc in docs:
+                try:
+                    path = doc.file.path
+                    if not os.path.exists(path):
+                        continue
+                except ValueError:
+                    continue
+                ext = os.path.splitext(path)[1].lower()
+                compress = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                member = _member_name(doc)
+                zf.write(path, member, compress_type=compress, compresslevel=9)
+                members[doc.pk] = member
+        # Confere os CRCs antes de soltar os originais
+        with zipfile.ZipFile(tmp) as zf:
+            broken = zf.testzip()
+        if broken:
+            raise zipfile.BadZipFile(f"{broken} corrompido em {archive_name}")
+        os.replace(tmp, final)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return members
+
+
+def archive_request(lattes_request) -> ArchivePlan | None:
+    """Arquiva um pedido já reservado por ``claim``. None se a reserva foi perdida."""
+    report = plan(LattesRequest.objects.filter(pk=lattes_request.pk))
+    docs = list(lattes_request.documents.filter(archive_member="").order_by("pk"))
+    # Já arquivado antes e com documentos restaurados: o .zip novo substitui o anterior
+    carried = list(lattes_request.documents.exclude(archive_member="").values_list("archive_member", flat=True))
+    archive_name = f"{timezone.localtime(lattes_request.created_at):%Y}/{lattes_request.public_id}.zip"
+    members = _write_archive(lattes_request, docs, archive_name, carried)
+
+    storage = get_document_storage()
+    with transaction.atomic():
+        kept = LattesRequest.objects.filter(
+            pk=lattes_request.pk, archive_lock=lattes_request.archive_lock, status=LattesRequest.Status.DONE
+        ).update(archived_at=timezone.now(), archive_name=archive_name, archive_lock="", archive_locked_at=None)
+        if not kept:
+            # Reserva expirou e outro processo pegou o pedido (ele termina o serviço), ou o
+            # pedido foi reaberto enquanto o .zip era gravado: aí o .zip novo não serve a ninguém
+            if release_claim(lattes_request) and not lattes_request.archive_name:
+                transaction.on_commit(lambda: delete_archive(archive_name))
+            return None
+        for doc in docs:
+            if doc.pk not in members:
+                continue
+            if not LattesDocument.objects.filter(pk=doc.pk, archive_member="").update(archive_member=members[doc.pk]):
+                continue
+            if doc.sha256:
+                DocumentBlob.release_reference(doc.sha256)
+            else:
+                # Arquivo antigo, fora do storage por conteúdo: só este documento o usa
+                transaction.on_commit(lambda name=doc.file.name: storage.delete(name))
+    return report
+
+
+def release_claim(lattes_request) -> int:
+    return LattesRequest.objects.filter(pk=lattes_request.pk, archive_lock=lattes_request.archive_lock).update(
+        archive_lock="", archive_locked_at=None
+    )
+
+
+def _extract(archive_name: str, member: str, target: str):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".restore")
+    try:
+        with os.fdopen(fd, "wb") as out, zipfile.ZipFile(archive_path(archive_name)) as zf:
+            with zf.open(member) as src:
+                while block := src.read(1024 * 1024):
+                    out.write(block)
+        os.replace(tmp, target)
+    except KeyError:
+        os.remove(tmp)
+        raise FileNotFoundError(f"{member} não está em {archive_name}")
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def restore_document(doc) -> bool:
+    """Devolve o original ao storage quente e volta a referenciar o blob.
+
+    Levanta FileNotFoundError se o .zip (ou o membro) não existe mais.
+    """
+    member = doc.archive_member
+    if not member:
+        return False
+    archive_name = doc.request.archive_name
+    target = get_document_storage().path(doc.file.name)
+    # Se outro documento ainda usa o mesmo blob, o conteúdo já está no disco
+    if not os.path.exists(target):
+        _extract(archive_name, member, target)
+
+    with transaction.atomic():
+        restored = LattesDocument.objects.filter(pk=doc.pk, archive_member=member).update(archive_member="")
+        if restored:
+            # Sem isto o pedido continuaria "arquivado" e o documento nunca voltaria ao .zip
+            LattesRequest.objects.filter(pk=doc.request_id).update(archived_at=None, updated_at=timezone.now())
+        if restored and doc.sha256:
+            DocumentBlob.add_references([doc])
+    doc.archive_member = ""
+    if not os.path.exists(target):
+        # A última referência antiga do blob foi solta (e o arquivo apagado) enquanto extraíamos
+        _extract(archive_name, member, target)
+    return True
+
+
+@contextmanager
+def open_document(doc):
+    """(arquivo, tamanho) para leitura, do storage quente ou direto do .zip, sem restaurar."""
+    if not doc.archive_member:
+        with doc.file.open("rb") as f:
+            yield f, doc.file.size
+        return
+    try:
+        zf = zipfile.ZipFile(archive_path(doc.request.archive_name))
+    except OSError:
+        raise FileNotFoundError(doc.request.archive_name)
+    with zf:
+        try:
+            info = zf.getinfo(doc.archive_member)
+        except KeyError:
+            raise FileNotFoundError(doc.archive_member)
+        with zf.open(info) as f:
+            yield f, info.file_size
+
+
+def delete_archive(archive_name: str):
+    if archive_name:
+        try:
+            os.remove(archive_path(archive_name))
+        except FileNotFoundError:
+            pass
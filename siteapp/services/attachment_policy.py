@@ -0,0 +1,153 @@
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+from .mime_stream import encoded_size, max_message_bytes, raw_capacity
+
+ATTACH = "ATTACH"
+ZIP = "ZIP"
+SPLIT = "SPLIT"
+LINKS = "LINKS"
+
+# Já comprimidos: deflate só gasta CPU
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".zip"}
+
+LINK_SALT = "siteapp.document-link"
+
+MB = 1024 * 1024
+
+
+def _mb_setting(name: str, default: float) -> int:
+    return int(getattr(settings, name, default) * MB)
+
+
+@dataclass
+class EmailPart:
+    number: int
+    total: int
+    documents: list = field(default_factory=list)  # anexados nesta mensagem
+    linked: list = field(default_factory=list)     # grandes demais: vão como link
+    zip: bool = False
+
+
+def document_size(doc) -> int:
+    try:
+        return doc.attachment_file.size
+    except Exception:
+        return 0
+
+
+def unique_documents(docs) -> list:
+    """Remove reenvios do mesmo arquivo (mesmo sha256), mantendo o primeiro."""
+    seen = set()
+    unique = []
+    for d in docs:
+        if d.sha256:
+            if d.sha256 in seen:
+                continue
+            seen.add(d.sha256)
+        unique.append(d)
+    return unique
+
+
+def _attach_limit() -> int:
+    # Os limites são do tamanho dos arquivos; o do servidor (EMAIL_MAX_MESSAGE_MB) é da
+    # mensagem já em base64, ~4/3 maior. Vale o menor dos dois.
+    return min(_mb_setting("EMAIL_ATTACH_MAX_MB", 15), raw_capacity(max_message_bytes()))
+
+
+def choose_strategy(total_bytes: int) -> str:
+    # PDF e JPEG quase não encolhem no .zip: o tamanho codificado do .zip é o dos arquivos
+    fits = encoded_size(total_bytes) <= max_message_bytes()
+    if fits and total_bytes <= _mb_setting("EMAIL_ATTACH_MAX_MB", 15):
+        return ATTACH
+    if fits and total_bytes <= _mb_setting("EMAIL_ZIP_MAX_MB", 20):
+        return ZIP
+    if total_bytes <= _mb_setting("EMAIL_SPLIT_MAX_MB", 100):
+        return SPLIT
+    return LINKS
+
+
+def plan_internal_email(docs: list) -> tuple[str, list[EmailPart]]:
+    """Decide como os documentos vão para a equipe, só olhando o tamanho dos arquivos."""
+    docs = unique_documents(docs)
+    sizes = {d.pk: document_size(d) for d in docs}
+    strategy = choose_strategy(sum(sizes.values()))
+
+    if strategy == ATTACH:
+        return strategy, [EmailPart(1, 1, documents=list(docs))]
+    if strategy == ZIP:
+        return strategy, [EmailPart(1, 1, documents=list(docs), zip=True)]
+    if strategy == LINKS:
+        return strategy, [EmailPart(1, 1, linked=list(docs))]
+
+    # SPLIT: agrupa na ordem de envio, cada mensagem até EMAIL_ATTACH_MAX_MB (e cabendo
+    # em EMAIL_MAX_MESSAGE_MB depois do base64)
+    limit = _attach_limit()
+    groups, current, used, linked = [], [], 0, []
+    for d in docs:
+        size = sizes[d.pk]
+        if size > limit:
+            linked.append(d)
+            continue
+        if current and used + size > limit:
+            groups.append(current)
+            current, used = [], 0
+        current.append(d)
+        used += size
+    if current or not groups:
+        groups.append(current)
+
+    parts = [EmailPart(i, len(groups), documents=g) for i, g in enumerate(groups, start=1)]
+    parts[0].linked = linked
+    return strategy, parts
+
+
+def document_link_token(doc) -> str:
+    return signing.TimestampSigner(salt=LINK_SALT).sign(str(doc.pk))
+
+
+def document_id_from_token(token: str) -> int:
+    """Levanta ``signing.BadSignature`` (ou ``SignatureExpired``) se o link não vale mais."""
+    max_age = getattr(settings, "DOCUMENT_LINK_MAX_AGE_HOURS", 72) * 3600
+    return int(signing.TimestampSigner(salt=LINK_SALT).unsign(token, max_age=max_age))
+
+
+def document_link(doc) -> str:
+    base = getattr(settings, "SITE_URL", "").rstrip("/")
+    return base + reverse("document_link", args=[document_link_token(doc)])
+
+
+def build_zip(lattes_request, docs) -> str:
+    """Empacota os documentos num .zip temporário (arquivo a arquivo, sem ler tudo em memória).
+
+    Quem chama é responsável por apagar o arquivo depois do envio.
+    """
+    fd, path = tempfile.mkstemp(prefix=f"{lattes_request.public_id}-", suffix=".zip")
+    os.close(fd)
+    used_names = set()
+    try:
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+            for d in docs:
+                base = d.attachment_name
+                arcname = f"{d.doc_type}/{base}"
+                n = 1
+                while arcname in used_names:
+                    stem, ext = os.path.splitext(base)
+                    arcname = f"{d.doc_type}/{stem}-{n}{ext}"
+                    n += 1
+                used_names.add(arcname)
+
+                ext = os.path.splitext(base)[1].lower()
+                compress = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                # Arquivo sumido levanta: um .zip sem parte dos documentos não serve
+                zf.write(d.attachment_file.path, arcname=arcname, compress_type=compress)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
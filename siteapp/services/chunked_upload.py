@@ -0,0 +1,181 @@
+import os
+from datetime import timedelta
+
+from django import forms
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from ..forms import SNIFF_BYTES, read_head, validate_document_file
+from ..models import DocumentBlob, LattesDocument, LattesRequest, UploadSession
+from ..storage import get_document_storage
+
+READ_SIZE = 64 * 1024
+
+EXPIRED_MESSAGE = "Upload expirado. Envie o arquivo de novo."
+
+
+class ChunkedUploadError(Exception):
+    def __init__(self, message: str, status: int = 400, offset: int | None = None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def max_chunk_bytes() -> int:
+    return int(getattr(settings, "UPLOAD_CHUNK_MAX_MB", 8) * 1024 * 1024)
+
+
+def session_ttl() -> timedelta:
+    return timedelta(hours=getattr(settings, "UPLOAD_SESSION_TTL_HOURS", 24))
+
+
+def is_expired(session: UploadSession) -> bool:
+    return session.created_at < timezone.now() - session_ttl()
+
+
+def start_session(lattes_request, doc_type: str, description: str, filename: str, size: int) -> UploadSession:
+    # Reserva o nome final já no upload_to do LattesDocument; as partes são gravadas nele
+    name = LattesDocument._meta.get_field("file").generate_filename(None, filename)
+    storage_name = default_storage.save(name, ContentFile(b""))
+    return UploadSession.objects.create(
+        request=lattes_request,
+        doc_type=doc_type,
+        description=description,
+        filename=filename,
+        total_size=size,
+        storage_name=storage_name,
+    )
+
+
+def resume_offset(session: UploadSession) -> int:
+    """Offset de onde o cliente continua. Levanta se a sessão não aceita mais partes."""
+    if session.completed_at:
+        raise ChunkedUploadError("Upload já concluído.", status=409, offset=session.received)
+    if is_expired(session):
+        raise ChunkedUploadError(EXPIRED_MESSAGE, status=410, offset=session.received)
+    return session.received
+
+
+def write_chunk(session: UploadSession, offset: int, stream, length: int) -> int:
+    """Grava ``length`` bytes de ``stream`` na posição ``offset``. Retorna o novo offset.
+
+    Reenviar a mesma parte é seguro: ela sobrescreve os mesmos bytes.
+    """
+    resume_offset(session)
+    if offset != session.received:
+        raise ChunkedUploadError("Offset fora de ordem.", status=409, offset=session.received)
+    if length <= 0 or length > max_chunk_bytes():
+        raise ChunkedUploadError("Parte vazia ou grande demais.", status=413, offset=session.received)
+    if offset + length > session.total_size:
+        raise ChunkedUploadError("Parte passa do tamanho declarado.", status=400, offset=session.received)
+
+    path = default_storage.path(session.storage_name)
+    written = 0
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            if offset == 0 and written == 0 and len(data) >= min(SNIFF_BYTES, session.total_size):
+                # Confere os magic bytes já na primeira parte, não depois de tudo enviado
+                _check_signature(session, data[:SNIFF_BYTES])
+            f.write(data)
+            written += len(data)
+
+    if written != length:
+        # Conexão caiu no meio: o cliente retoma do último offset confirmado
+        raise ChunkedUploadError("Parte incompleta.", status=400, offset=session.received)
+
+    updated = UploadSession.objects.filter(pk=session.pk, received=offset).update(received=offset + length)
+    if not updated:
+        session.refresh_from_db(fields=["received"])
+        raise ChunkedUploadError("Offset fora de ordem.", status=409, offset=session.received)
+    session.received = offset + length
+    return session.received
+
+
+def _check_signature(session: UploadSession, head: bytes):
+    try:
+        validate_document_file(session.filename, 0, head)
+    except forms.ValidationError as e:
+        raise ChunkedUploadError(" ".join(e.messages), status=415, offset=session.received)
+
+
+def discard_session(session: UploadSession):
+    default_storage.delete(session.storage_name)
+    session.delete()
+
+
+def expire_sessions() -> int:
+    """Apaga as sessões não concluídas mais velhas que UPLOAD_SESSION_TTL_HOURS e o
+    arquivo parcial de cada uma. Retorna quantas apagou."""
+    cutoff = timezone.now() - session_ttl()
+    expired = UploadSession.objects.filter(completed_at__isnull=True, created_at__lt=cutoff)
+    removed = 0
+    for pk, storage_name in expired.values_list("pk", "storage_name").iterator():
+        # Condicional: uma sessão que começou a ser concluída agora fica
+        if UploadSession.objects.filter(pk=pk, completed_at__isnull=True).delete()[0]:
+            default_storage.delete(storage_name)
+            removed += 1
+    return removed
+
+
+CLOSED_MESSAGE = "Pedido já finalizado."
+
+
+def complete_session(session: UploadSession) -> LattesDocument:
+    if not session.request.accepts_uploads:
+        raise ChunkedUploadError(CLOSED_MESSAGE, status=409, offset=session.received)
+    if session.received != session.total_size:
+        raise ChunkedUploadError("Upload incompleto.", status=409, offset=session.received)
+    if is_expired(session):
+        raise ChunkedUploadError(EXPIRED_MESSAGE, status=410, offset=session.received)
+
+    # Reserva a sessão num UPDATE condicional: de dois "concluir" ao mesmo tempo (clique
+    # duplo, retry do cliente), só um segue e cria o documento
+    now = timezone.now()
+    if not UploadSession.objects.filter(pk=session.pk, completed_at__isnull=True).update(completed_at=now):
+        raise ChunkedUploadError("Upload já concluído.", status=409, offset=session.received)
+    session.completed_at = now
+
+    path = default_storage.path(session.storage_name)
+    try:
+        with open(path, "r+b") as f:
+            f.truncate(session.total_size)
+            head = read_head(f)
+    except BaseException:
+        # Nada mudou no arquivo: o cliente pode tentar concluir de novo
+        UploadSession.objects.filter(pk=session.pk).update(completed_at=None)
+        raise
+
+    # Mesmas regras do LattesDocumentForm, aplicadas ao arquivo já montado
+    try:
+        validate_document_file(session.filename, os.path.getsize(path), head)
+    except Exception:
+        discard_session(session)
+        raise
+
+    # Move (sem copiar) para o storage por conteúdo; se já existe igual, descarta este
+    name = get_document_storage().adopt(session.storage_name)
+
+    with transaction.atomic():
+        accepted = LattesRequest.lock_open(session.request_id)
+        if accepted:
+            doc = LattesDocument(
+                request=session.request,
+                doc_type=session.doc_type,
+                description=session.description,
+                file=name,
+                original_name=session.filename,
+            )
+            doc.save()
+    if not accepted:
+        # O arquivo já saiu da sessão para o storage por conteúdo: sem documento, apaga os dois
+        DocumentBlob.discard_unreferenced([name])
+        session.delete()
+        raise ChunkedUploadError(CLOSED_MESSAGE, status=409, offset=session.received)
+    return doc
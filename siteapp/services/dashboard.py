@@ -0,0 +1,111 @@
+"""Painel do operador: pedidos por status, documentos por tipo e prazos que vencem.
+
+Tudo vem do ``DashboardCounter`` em duas queries (uma para status e tipos, outra para as
+faixas de prazo), sem COUNT sobre ``LattesRequest``/``LattesDocument``. Os prazos são
+guardados por data; a faixa ("vence esta semana") é somada aqui, em relação a hoje.
+
+``rebuild`` recalcula os contadores com GROUP BY e corrige qualquer diferença
+(``manage.py rebuild_dashboard``, periódico).
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from ..models import DashboardCounter, LattesDocument, LattesRequest
+
+Kind = DashboardCounter.Kind
+
+# (nome, rótulo); as datas de cada faixa saem de _bucket_filters
+DEADLINE_BUCKETS = [
+    ("overdue", "Prazo vencido"),
+    ("this_week", "Vence em até 7 dias"),
+    ("next_week", "Vence em 8 a 14 dias"),
+    ("later", "Vence depois"),
+    ("none", "Sem prazo"),
+]
+
+
+def _bucket_filters(today) -> dict:
+    week, fortnight = (today + timedelta(days=6)).isoformat(), (today + timedelta(days=13)).isoformat()
+    today = today.isoformat()
+    # Datas ISO comparam como texto; "" (sem prazo) fica antes de qualquer data
+    return {
+        "overdue": Q(key__gt="", key__lt=today),
+        "this_week": Q(key__gte=today, key__lte=week),
+        "next_week": Q(key__gt=week, key__lte=fortnight),
+        "later": Q(key__gt=fortnight),
+        "none": Q(key=""),
+    }
+
+
+def dashboard(today=None) -> dict:
+    today = today or timezone.localdate()
+    values = {
+        (kind, key): value
+        for kind, key, value in DashboardCounter.objects.filter(kind__in=[Kind.STATUS, Kind.DOC_TYPE]).values_list(
+            "kind", "key", "value"
+        )
+    }
+    buckets = DashboardCounter.objects.filter(kind=Kind.DEADLINE).aggregate(
+        **{name: Sum("value", filter=q) for name, q in _bucket_filters(today).items()}
+    )
+    return {
+        "statuses": [
+            {"value": status, "label": label, "count": values.get((Kind.STATUS, status), 0)}
+            for status, label in LattesRequest.Status.choices
+        ],
+        "doc_types": [
+            {"value": doc_type, "label": label, "count": values.get((Kind.DOC_TYPE, doc_type), 0)}
+            for doc_type, label in LattesDocument.DocType.choices
+        ],
+        "deadlines": [{"value": name, "label": label, "count": buckets[name] or 0} for name, label in DEADLINE_BUCKETS],
+        "total_requests": sum(v for (kind, _), v in values.items() if kind == Kind.STATUS),
+        "total_documents": sum(v for (kind, _), v in values.items() if kind == Kind.DOC_TYPE),
+        "today": today,
+    }
+
+
+def _actual_counts() -> Counter:
+    counts = Counter()
+    for status, n in LattesRequest.objects.order_by().values_list("status").annotate(n=Count("pk")):
+        counts[(Kind.STATUS, status)] = n
+    open_requests = LattesRequest.objects.exclude(status=LattesRequest.Status.DONE).order_by()
+    for deadline, n in open_requests.values_list("deadline").annotate(n=Count("pk")):
+        counts[(Kind.DEADLINE, deadline.isoformat() if deadline else "")] = n
+    for doc_type, n in LattesDocument.objects.order_by().values_list("doc_type").annotate(n=Count("pk")):
+        counts[(Kind.DOC_TYPE, doc_type)] = n
+    return counts
+
+
+def rebuild() -> dict:
+    """Recalcula os contadores. Devolve {(kind, key): (antes, depois)} do que estava errado.
+
+    As linhas existentes ficam travadas durante o recálculo: um save concorrente espera e
+    soma por cima do valor novo. Uma chave que nasce nesse meio tempo pode sair com 1 a
+    menos, e a próxima execução corrige.
+    """
+    with transaction.atomic():
+        current = {
+            (c.kind, c.key): c for c in DashboardCounter.objects.select_for_update().order_by("kind", "key")
+        }
+        actual = _actual_counts()
+
+        drift = {}
+        for key in current.keys() | actual.keys():
+            before = current[key].value if key in current else 0
+            if before != actual[key]:
+                drift[key] = (before, actual[key])
+
+        # Faixas de prazo que já passaram (ou status sem pedidos) não precisam de linha
+        stale = [c.pk for key, c in current.items() if not actual[key]]
+        DashboardCounter.objects.filter(pk__in=stale).delete()
+        DashboardCounter.objects.bulk_create(
+            [DashboardCounter(kind=kind, key=key, value=n) for (kind, key), n in actual.items() if n],
+            update_conflicts=True,
+            unique_fields=["kind", "key"],
+            update_fields=["value"],
+        )
+    return drift
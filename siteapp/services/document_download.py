@@ -0,0 +1,181 @@
+"""Download dos documentos enviados, sem passar pelo MEDIA_URL público.
+
+ETag vem do SHA-256 do conteúdo (o mesmo do storage por conteúdo), com suporte a
+If-None-Match, If-Range e um intervalo ``Range: bytes=...`` por requisição. Com
+``DOCUMENT_SENDFILE`` configurado, a view só autoriza e o proxy da frente (nginx ou
+Apache) lê o arquivo e cuida do Range sozinho.
+
+Sob ASGI o Django junta um iterador síncrono inteiro na memória antes de mandar o
+primeiro byte (``sync_to_async(list)``); ali o arquivo vai por um gerador assíncrono
+que lê um bloco por vez numa thread.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_etags
+
+SENDFILE_MODES = ("", "nginx", "apache")
+
+# Os documentos nunca mudam (editar = enviar outro), mas continuam sendo privados
+CACHE_CONTROL = "private, max-age=3600"
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Sob ASGI cada bloco é uma ida e volta a uma thread: blocos grandes (como o COPY_BLOCK do
+# document_zip), não os 4KB do FileResponse
+ASGI_BLOCK = 256 * 1024
+
+
+class RangeFile:
+    """Janela ``[start, start + length)`` de um arquivo aberto, para o FileResponse."""
+
+    def __init__(self, f, start: int, length: int):
+        self.f = f
+        self.remaining = length
+        f.seek(start)
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def parse_range(header: str, size: int):
+    """``(início, fim)`` inclusivo; None para ignorar o cabeçalho; ``False`` se for impossível.
+
+    Vários intervalos (``bytes=0-1,5-9``) são ignorados: a resposta vai inteira, como a
+    RFC 9110 permite, e ninguém precisa de multipart/byteranges para abrir um PDF.
+    """
+    m = _RANGE_RE.match(header.replace(" ", ""))
+    if not m or m.groups() == ("", ""):
+        return None
+    first, last = m.groups()
+    if not first:
+        # Sufixo: os últimos N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        return False
+    if start > end:
+        return None
+    return start, end
+
+
+def document_etag(doc, stat) -> str:
+    # Arquivos antigos (fora do storage por conteúdo) não têm hash: tamanho + mtime
+    return f'"{doc.sha256}"' if doc.sha256 else f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
+
+def _not_modified(request, etag: str) -> bool:
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return "*" in tags or etag in tags or etag in (t.removeprefix("W/") for t in tags)
+
+
+def _sendfile_response(mode: str, doc, path: str, content_type: str) -> HttpResponse:
+    response = HttpResponse(content_type=content_type)
+    if mode == "nginx":
+        # location interna do nginx apontando para o MEDIA_ROOT
+        prefix = getattr(settings, "DOCUMENT_ACCEL_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = quote(prefix.rstrip("/") + "/" + doc.file.name)
+    else:
+        response["X-Sendfile"] = path
+    return response
+
+
+def serve_document(request, doc, as_attachment: bool = False) -> HttpResponse:
+    """Resposta para GET/HEAD de ``doc.file``. Levanta FileNotFoundError se o arquivo sumiu."""
+    path = doc.file.path
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = document_etag(doc, stat)
+    content_type = mimetypes.guess_type(doc.display_name)[0] or "application/octet-stream"
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition_header(as_attachment, doc.display_name),
+        "X-Content-Type-Options": "nosniff",
+    }
+
+    mode = getattr(settings, "DOCUMENT_SENDFILE", "")
+    if mode not in SENDFILE_MODES:
+        raise ImproperlyConfigured(f"DOCUMENT_SENDFILE deve ser um de {SENDFILE_MODES}, não {mode!r}.")
+    if _not_modified(request, etag):
+        response = HttpResponseNotModified()
+    elif mode:
+        response = _sendfile_response(mode, doc, path, content_type)
+    else:
+        response = _file_response(request, path, size, etag, content_type)
+
+    for name, value in headers.items():
+        # O FileResponse põe um Content-Disposition com o nome do blob; vale o nome original
+        if response.status_code != 304 or name in ("ETag", "Cache-Control", "Last-Modified"):
+            response[name] = value
+    return response
+
+
+def _file_response(request, path: str, size: int, etag: str, content_type: str) -> HttpResponse:
+    byte_range = None
+    range_header = request.headers.get("Range", "")
+    if_range = request.headers.get("If-Range", "")
+    # If-Range com outra versão do arquivo: manda tudo de novo
+    if range_header and (not if_range or if_range == etag):
+        byte_range = parse_range(range_header, size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    if request.method == "HEAD":
+        response = HttpResponse(content_type=content_type)
+        response["Content-Length"] = str(size)
+        return response
+
+    f = open(path, "rb")
+    if byte_range is None:
+        return _stream_file(request, f, size, content_type)
+
+    start, end = byte_range
+    response = _stream_file(request, RangeFile(f, start, end - start + 1), end - start + 1, content_type, status=206)
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+async def _aiter_file(f, block_size: int = ASGI_BLOCK):
+    read = sync_to_async(f.read, thread_sensitive=False)
+    try:
+        while chunk := await read(block_size):
+            yield chunk
+    finally:
+        f.close()
+
+
+def _stream_file(request, f, length: int, content_type: str, status: int = 200) -> HttpResponse:
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(_aiter_file(f), content_type=content_type, status=status)
+    else:
+        # FileResponse com o arquivo de verdade: o servidor WSGI pode usar sendfile()
+        response = FileResponse(f, content_type=content_type, status=status)
+    response["Content-Length"] = str(length)
+    return response
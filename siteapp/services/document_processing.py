@@ -0,0 +1,197 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import LattesDocument
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# Reserva de um worker que morreu no meio do lote expira depois disso
+LOCK_SECONDS = 600
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+# --- Roda nos processos do pool: só caminhos e números, nada de ORM -----------------
+
+def _to_rgb(im):
+    from PIL import Image
+
+    if im.mode in ("RGBA", "LA", "P"):
+        im = im.convert("RGBA")
+        background = Image.new("RGB", im.size, (255, 255, 255))
+        background.paste(im, mask=im.split()[-1])
+        return background
+    return im.convert("RGB") if im.mode != "RGB" else im
+
+
+def _save_resized(im, path: str, side: int, quality: int):
+    from PIL import Image
+
+    im = im.copy()
+    im.thumbnail((side, side), Image.LANCZOS)
+    im.save(path, "JPEG", quality=quality, optimize=True, progressive=True)
+
+
+def _pdf_first_page(src: str, out_dir: str, side: int):
+    try:
+        import fitz  # PyMuPDF, opcional
+    except ImportError:
+        fitz = None
+
+    if fitz is not None:
+        from PIL import Image
+
+        with fitz.open(src) as pdf:
+            if not pdf.page_count:
+                return None
+            pix = pdf[0].get_pixmap(dpi=72)
+            return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+    if shutil.which("pdftoppm"):
+        from PIL import Image
+
+        prefix = os.path.join(out_dir, "page")
+        subprocess.run(
+            ["pdftoppm", "-png", "-f", "1", "-l", "1", "-scale-to", str(side), "-singlefile", src, prefix],
+            check=True,
+            capture_output=True,
+            timeout=60,
+        )
+        return Image.open(prefix + ".png")
+
+    return None
+
+
+def process_file(src: str, out_dir: str, max_side: int, quality: int, thumb_side: int) -> dict:
+    """Gera a versão otimizada (imagens) e a miniatura (imagens e 1ª página de PDF)."""
+    result = {"optimized": None, "thumbnail": None, "error": ""}
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        result["error"] = "Pillow não instalado"
+        return result
+
+    os.makedirs(out_dir, exist_ok=True)
+    ext = os.path.splitext(src)[1].lower()
+    try:
+        if ext in IMAGE_EXTENSIONS:
+            with Image.open(src) as im:
+                im = _to_rgb(ImageOps.exif_transpose(im))
+                optimized = os.path.join(out_dir, "optimized.jpg")
+                _save_resized(im, optimized, max_side, quality)
+                # Só vale a pena se ficou menor que o original
+                if os.path.getsize(optimized) < os.path.getsize(src):
+                    result["optimized"] = optimized
+                thumb = os.path.join(out_dir, "thumb.jpg")
+                _save_resized(im, thumb, thumb_side, 70)
+                result["thumbnail"] = thumb
+        elif ext == ".pdf":
+            page = _pdf_first_page(src, out_dir, thumb_side)
+            if page is not None:
+                thumb = os.path.join(out_dir, "thumb.jpg")
+                _save_resized(_to_rgb(page), thumb, thumb_side, 70)
+                result["thumbnail"] = thumb
+    except Exception as e:
+        result["error"] = str(e)[:500]
+    return result
+
+
+# --- Roda no worker principal ----------------------------------------------------
+
+def claim(limit: int) -> list[LattesDocument]:
+    """Reserva até ``limit`` documentos com um UPDATE condicional; dois workers nunca pegam o mesmo."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    pending = Q(processed_at__isnull=True, archive_member="") & (
+        Q(processing_lock="") | Q(processing_locked_at__lt=now - timedelta(seconds=LOCK_SECONDS))
+    )
+    ids = list(LattesDocument.objects.filter(pending).order_by("id").values_list("id", flat=True)[:limit])
+    if not ids:
+        return []
+    LattesDocument.objects.filter(pending, id__in=ids).update(processing_lock=token, processing_locked_at=now)
+    return list(LattesDocument.objects.filter(processing_lock=token).order_by("id"))
+
+
+def _store(doc: LattesDocument, result: dict):
+    stem = os.path.splitext(doc.display_name)[0]
+    updates = {
+        "processed_at": timezone.now(),
+        "processing_error": result["error"],
+        "processing_lock": "",
+        "processing_locked_at": None,
+    }
+
+    if result["optimized"]:
+        with open(result["optimized"], "rb") as f:
+            doc.optimized_file.save(f"{stem}.jpg", File(f), save=False)
+        updates["optimized_file"] = doc.optimized_file.name
+    if result["thumbnail"]:
+        with open(result["thumbnail"], "rb") as f:
+            doc.thumbnail.save(f"{stem}-thumb.jpg", File(f), save=False)
+        updates["thumbnail"] = doc.thumbnail.name
+
+    # update() em vez de save(): não mexe no arquivo original nem nas referências do blob
+    if not LattesDocument.objects.filter(pk=doc.pk, processing_lock=doc.processing_lock).update(**updates):
+        # Reserva expirou e outro worker pegou o documento: o resultado dele é que vale
+        for variant in (doc.optimized_file, doc.thumbnail):
+            if variant.name in updates.values():
+                variant.delete(save=False)
+
+
+def process_pending(limit: int = 20, executor: ProcessPoolExecutor | None = None) -> int:
+    """Processa documentos ainda não tratados. Retorna quantos foram processados."""
+    docs = claim(limit)
+    if not docs:
+        return 0
+
+    opts = (
+        _setting("DOCUMENT_IMAGE_MAX_SIDE", 2000),
+        _setting("DOCUMENT_IMAGE_QUALITY", 80),
+        _setting("DOCUMENT_THUMBNAIL_SIDE", 320),
+    )
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=_setting("DOCUMENT_PROCESSING_WORKERS", 2))
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="rpm-docs-") as tmp:
+            futures = {}
+            for doc in docs:
+                try:
+                    src = doc.file.path
+                except Exception:
+                    src = ""
+                if not src or not os.path.exists(src):
+                    _store(doc, {"optimized": None, "thumbnail": None, "error": "Arquivo não encontrado"})
+                    continue
+                futures[executor.submit(process_file, src, os.path.join(tmp, str(doc.pk)), *opts)] = doc
+
+            for fut in as_completed(futures):
+                doc = futures[fut]
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    result = {"optimized": None, "thumbnail": None, "error": str(e)[:500]}
+                if result["error"]:
+                    logger.warning("Documento %s não processado: %s", doc.pk, result["error"])
+                _store(doc, result)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    return len(docs)
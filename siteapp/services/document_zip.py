@@ -0,0 +1,117 @@
+"""Zip com os documentos de um ou vários pedidos, gerado enquanto é enviado.
+
+Nada vai para disco nem fica acumulado: o ZipFile escreve num buffer que é esvaziado
+a cada pedaço, e o conteúdo de cada documento é copiado do storage em blocos. Em saída
+sem ``seek`` o zipfile usa data descriptors (tamanho e CRC depois do conteúdo), e
+ZIP64 quando o arquivo ou o deslocamento passam de 4 GB. Memória constante, qualquer
+que seja o tamanho total; só a lista de nomes (o diretório central) cresce por documento.
+
+Sob ASGI o Django junta um iterador síncrono inteiro antes de responder; ``aiter_zip``
+entrega o mesmo zip bloco a bloco, gerando cada um na thread de código síncrono.
+"""
+import os
+import zipfile
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from ..models import LattesDocument
+from .archive import open_document
+from .attachment_policy import STORED_EXTENSIONS
+
+COPY_BLOCK = 256 * 1024
+CHUNK_SIZE = 500
+
+# PDF costuma ter os fluxos já comprimidos; deflate nele quase não reduz
+ZIP_STORED_EXTENSIONS = STORED_EXTENSIONS | {".pdf"}
+
+
+class _Chunks:
+    """Saída do ZipFile: guarda o que foi escrito até o gerador repassar."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def documents_for(requests_queryset):
+    return (
+        LattesDocument.objects.filter(request__in=requests_queryset)
+        .select_related("request")
+        .only(
+            "file", "doc_type", "original_name", "uploaded_at", "archive_member",
+            "request__public_id", "request__archive_name",
+        )
+        .order_by("request__public_id", "doc_type", "pk")
+    )
+
+
+def _arcname(doc, used: set) -> str:
+    folder = f"{doc.request.public_id}/{doc.doc_type}"
+    stem, ext = os.path.splitext(doc.display_name.replace("/", "_"))
+    arcname, n = f"{folder}/{stem}{ext}", 1
+    while arcname in used:
+        arcname = f"{folder}/{stem}-{n}{ext}"
+        n += 1
+    used.add(arcname)
+    return arcname
+
+
+def iter_zip(documents, chunk_size: int = CHUNK_SIZE):
+    """Gera os bytes do zip; ``documents`` é um queryset (lido com iterator)."""
+    out = _Chunks()
+    with zipfile.ZipFile(out, "w", allowZip64=True) as zf:
+        used, current = set(), None
+        for doc in documents.iterator(chunk_size=chunk_size):
+            if doc.request.public_id != current:
+                # Nomes só colidem dentro da pasta do mesmo pedido
+                used, current = set(), doc.request.public_id
+            # Arquivados são lidos direto do .zip frio, sem voltar para o storage
+            with ExitStack() as stack:
+                try:
+                    src, size = stack.enter_context(open_document(doc))
+                except OSError:
+                    continue
+                info = zipfile.ZipInfo(_arcname(doc, used), timezone.localtime(doc.uploaded_at).timetuple()[:6])
+                ext = os.path.splitext(doc.display_name)[1].lower()
+                info.compress_type = zipfile.ZIP_STORED if ext in ZIP_STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+                # Com o tamanho conhecido o zipfile decide sozinho se precisa de ZIP64
+                info.file_size = size
+                with zf.open(info, "w") as dest:
+                    while block := src.read(COPY_BLOCK):
+                        dest.write(block)
+                        if out.parts:
+                            yield out.take()
+            # Data descriptor do arquivo que acabou
+            if out.parts:
+                yield out.take()
+    # Diretório central, escrito no close()
+    yield out.take()
+
+
+def zip_filename(public_ids: list[str]) -> str:
+    if len(public_ids) == 1:
+        return f"{public_ids[0]}-documentos.zip"
+    return f"documentos-{timezone.localtime():%Y%m%d-%H%M}.zip"
+
+
+async def aiter_zip(documents, chunk_size: int = CHUNK_SIZE):
+    # Sempre a mesma thread (thread_sensitive): o iterator() do queryset segue na mesma conexão
+    chunks = iter_zip(documents, chunk_size)
+    step = sync_to_async(next)
+    try:
+        while (chunk := await step(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
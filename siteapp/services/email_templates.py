@@ -0,0 +1,17 @@
+from django.template.loader import get_template
+
+EMAIL_TEMPLATES = (
+    "emails/notificacao_interna.html",
+    "emails/confirmacao_cliente.html",
+)
+
+
+def render_email(name: str, context: dict) -> str:
+    """Como ``render_to_string``; fora do DEBUG o cached loader guarda o template compilado."""
+    return get_template(name).render(context)
+
+
+def precompile():
+    # Aquece o cached loader (settings.TEMPLATES); em DEBUG não há cache e isto só valida a sintaxe
+    for name in EMAIL_TEMPLATES:
+        get_template(name)
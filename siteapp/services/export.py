@@ -0,0 +1,96 @@
+import csv
+import json
+from datetime import date, datetime, time
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from ..models import LattesDocument, LattesRequest
+
+FORMATS = ("csv", "jsonl")
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+BASE_FIELDS = (
+    "public_id", "full_name", "email", "whatsapp", "goal", "deadline", "status", "created_at", "updated_at",
+    "finalized_at",
+)
+
+
+def doc_type_column(doc_type: str) -> str:
+    return f"docs_{doc_type.lower()}"
+
+
+def columns() -> list[str]:
+    return [*BASE_FIELDS, "docs_total", *(doc_type_column(t) for t in LattesDocument.DocType.values)]
+
+
+def _day_bound(value, end: bool = False):
+    # Datas sem hora viram o início (ou o fim) do dia no fuso do projeto
+    if isinstance(value, datetime):
+        return value
+    dt = datetime.combine(value, time.max if end else time.min)
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+
+def export_queryset(queryset=None, status: str = "", date_from: date | None = None, date_to: date | None = None):
+    """Pedidos com contagem de documentos (total e por tipo), tudo agregado numa só consulta."""
+    qs = LattesRequest.objects.all() if queryset is None else queryset
+    if status:
+        qs = qs.filter(status=status)
+    if date_from:
+        qs = qs.filter(created_at__gte=_day_bound(date_from))
+    if date_to:
+        qs = qs.filter(created_at__lte=_day_bound(date_to, end=True))
+
+    per_type = {
+        doc_type_column(t): Count("documents", filter=Q(documents__doc_type=t))
+        for t in LattesDocument.DocType.values
+    }
+    return (
+        qs.order_by()
+        .values(*BASE_FIELDS)
+        .annotate(docs_total=Count("documents"), **per_type)
+        .order_by("created_at", "id")
+    )
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """Buffer de mentira para o csv.writer: devolve a linha em vez de acumular."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, chunk_size: int = CHUNK_SIZE):
+    cols = columns()
+    writer = csv.writer(_Echo())
+    yield "\ufeff" + writer.writerow(cols)  # BOM: o Excel abre os acentos direito
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield writer.writerow([_plain(row[c]) for c in cols])
+
+
+def iter_jsonl(rows, chunk_size: int = CHUNK_SIZE):
+    cols = columns()
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield json.dumps({c: _plain(row[c]) for c in cols}, ensure_ascii=False) + "\n"
+
+
+def iter_export(rows, fmt: str, chunk_size: int = CHUNK_SIZE):
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato inválido: {fmt}")
+    return iter_csv(rows, chunk_size) if fmt == "csv" else iter_jsonl(rows, chunk_size)
+
+
+def export_filename(fmt: str) -> str:
+    return f"pedidos-{timezone.localdate():%Y%m%d}.{fmt}"
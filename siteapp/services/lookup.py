@@ -0,0 +1,133 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import LattesRequest
+
+# (capacidade, segundos para encher o balde de novo)
+DEFAULT_RATE_LIMITS = {
+    "ip": (10, 60),
+    "code": (5, 600),
+}
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+class TokenBucket:
+    """Balde de fichas guardado no cache do Django (compartilhado entre workers se for Redis).
+
+    Leitura e gravação não são atômicas; sob corrida o limite pode deixar passar uma
+    ou outra tentativa a mais, o que é aceitável para conter força bruta.
+    """
+
+    def __init__(self, key: str, capacity: int, refill_seconds: float):
+        self.key = f"ratelimit:{key}"
+        self.capacity = capacity
+        self.rate = capacity / refill_seconds
+        self.refill_seconds = refill_seconds
+
+    def _take(self, state, tokens: float) -> tuple[bool, tuple]:
+        now = time.time()
+        tokens_left, last = state if state is not None else (self.capacity, now)
+        tokens_left = min(self.capacity, tokens_left + (now - last) * self.rate)
+        allowed = tokens_left >= tokens
+        if allowed:
+            tokens_left -= tokens
+        return allowed, (tokens_left, now)
+
+    def consume(self, tokens: float = 1) -> bool:
+        allowed, state = self._take(cache.get(self.key), tokens)
+        cache.set(self.key, state, timeout=int(self.refill_seconds) + 1)
+        return allowed
+
+    async def aconsume(self, tokens: float = 1) -> bool:
+        allowed, state = self._take(await cache.aget(self.key), tokens)
+        await cache.aset(self.key, state, timeout=int(self.refill_seconds) + 1)
+        return allowed
+
+
+def client_ip(request) -> str:
+    if _setting("TRUST_X_FORWARDED_FOR", False):
+        forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _buckets(request, public_id: str) -> tuple[TokenBucket, TokenBucket]:
+    limits = _setting("LOOKUP_RATE_LIMITS", DEFAULT_RATE_LIMITS)
+    return (
+        TokenBucket(f"lookup:ip:{client_ip(request)}", *limits["ip"]),
+        TokenBucket(f"lookup:code:{public_id}", *limits["code"]),
+    )
+
+
+def lookup_allowed(request, public_id: str) -> bool:
+    ip_bucket, code_bucket = _buckets(request, public_id)
+    ip_ok = ip_bucket.consume()
+    code_ok = code_bucket.consume()
+    return ip_ok and code_ok
+
+
+async def alookup_allowed(request, public_id: str) -> bool:
+    ip_bucket, code_bucket = _buckets(request, public_id)
+    ip_ok = await ip_bucket.aconsume()
+    code_ok = await code_bucket.aconsume()
+    return ip_ok and code_ok
+
+
+def _cache_key(public_id: str) -> str:
+    return f"lookup:result:{public_id}"
+
+
+def invalidate_lookup(public_id: str):
+    if public_id:
+        cache.delete(_cache_key(public_id))
+
+
+def _lookup_queryset(public_id: str):
+    return LattesRequest.objects.filter(public_id=public_id).only("public_id", "full_name", "email_normalized", "status")
+
+
+def _lookup_result(lattes_request: LattesRequest, documents_count: int) -> dict:
+    return {
+        "public_id": lattes_request.public_id,
+        "full_name": lattes_request.full_name,
+        "email_normalized": lattes_request.email_normalized,
+        "status": lattes_request.status,
+        "status_display": lattes_request.get_status_display(),
+        "documents_count": documents_count,
+    }
+
+
+def _matches(cached: dict, email: str) -> dict | None:
+    return cached if cached["email_normalized"] == (email or "").strip().lower() else None
+
+
+def find_request(public_id: str, email: str) -> dict | None:
+    """Resultado da consulta de status (dict pronto para o template), com cache curto."""
+    key = _cache_key(public_id)
+    cached = cache.get(key)
+    if cached is None:
+        lattes_request = _lookup_queryset(public_id).first()
+        if lattes_request is None:
+            return None
+        cached = _lookup_result(lattes_request, lattes_request.documents.count())
+        cache.set(key, cached, timeout=_setting("LOOKUP_CACHE_SECONDS", 60))
+    return _matches(cached, email)
+
+
+async def afind_request(public_id: str, email: str) -> dict | None:
+    """Versão assíncrona de ``find_request`` (ORM e cache assíncronos)."""
+    key = _cache_key(public_id)
+    cached = await cache.aget(key)
+    if cached is None:
+        lattes_request = await _lookup_queryset(public_id).afirst()
+        if lattes_request is None:
+            return None
+        cached = _lookup_result(lattes_request, await lattes_request.documents.acount())
+        await cache.aset(key, cached, timeout=_setting("LOOKUP_CACHE_SECONDS", 60))
+    return _matches(cached, email)
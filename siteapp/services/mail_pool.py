@@ -0,0 +1,134 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .sendgrid_email import SendGridError, send_on_connection
+
+
+class SMTPConnectionPool:
+    """Mantém algumas conexões SMTP abertas para não refazer o handshake TLS a cada e-mail.
+
+    Conexões paradas há mais de ``idle_timeout`` segundos são fechadas; uma conexão
+    que deu erro não volta para o pool.
+    """
+
+    def __init__(self, size: int = 2, idle_timeout: float = 60.0, backend: str | None = None):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.backend = backend
+        self._idle = []  # [(conexão, momento em que foi devolvida)]
+        self._lock = threading.Lock()
+
+    def _new_connection(self):
+        return get_connection(self.backend)
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        smtp = getattr(conn, "connection", None)
+        if smtp is None:
+            # Fechada ou backend sem socket (locmem, console, file): open() resolve
+            return True
+        try:
+            return smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _take_idle(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, since = self._idle.pop()
+                if now - since <= self.idle_timeout:
+                    return conn
+                conn.close()
+        return None
+
+    def acquire(self):
+        conn = self._take_idle()
+        if conn is None:
+            conn = self._new_connection()
+        elif not self._is_alive(conn):
+            # O servidor derrubou a conexão ociosa: reabre no mesmo backend
+            conn.close()
+        conn.open()
+        return conn
+
+    def release(self, conn, broken: bool = False):
+        with self._lock:
+            if not broken and len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, broken=True)
+            raise
+        self.release(conn)
+
+    def close_idle(self) -> int:
+        """Fecha as conexões que passaram do tempo ocioso. Retorna quantas fechou."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [c for c, since in self._idle if now - since > self.idle_timeout]
+            self._idle = [(c, since) for c, since in self._idle if now - since <= self.idle_timeout]
+        for conn in expired:
+            conn.close()
+        return len(expired)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SMTPConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPConnectionPool(
+                size=getattr(settings, "EMAIL_POOL_SIZE", 2),
+                idle_timeout=getattr(settings, "EMAIL_POOL_IDLE_SECONDS", 60),
+            )
+        return _pool
+
+
+@receiver(setting_changed)
+def _reset_pool(setting, **kwargs):
+    # Testes/benchmarks que trocam o backend não podem reaproveitar conexões antigas
+    global _pool
+    if setting.startswith("EMAIL_"):
+        with _pool_lock:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = None
+
+
+def send_messages(messages: list, pool: SMTPConnectionPool | None = None) -> int:
+    """Envia vários EmailMessage pela mesma conexão SMTP. Retorna quantos foram enviados."""
+    if not messages:
+        return 0
+    pool = pool or get_pool()
+    sent = 0
+    try:
+        with pool.connection() as conn:
+            for msg in messages:
+                send_on_connection(msg, conn)
+                sent += 1
+    except Exception as e:
+        raise SendGridError(f"Email falhou após {sent} envio(s): {e}")
+    return sent
@@ -0,0 +1,208 @@
+"""Métricas em memória do processo, no formato texto do Prometheus.
+
+Cada processo (worker do gunicorn/uvicorn, send_outbox...) tem os seus números; o
+Prometheus coleta de cada um e soma. Nada aqui faz I/O: só contadores sob um lock.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "siteapp"
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = tuple(1024 * 2 ** i for i in range(0, 16, 2))  # 1 KB .. 1 GB
+
+# Consultas guardadas por requisição para o log de lentas (o resto só conta)
+MAX_RECORDED_QUERIES = 200
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}        # nome -> (tipo, ajuda, buckets)
+        self._series = {}      # (nome, labels) -> Histogram | float
+
+    def histogram(self, name: str, help_text: str, buckets=TIME_BUCKETS):
+        self._meta[name] = ("histogram", help_text, buckets)
+
+    def counter(self, name: str, help_text: str):
+        self._meta[name] = ("counter", help_text, None)
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Histogram(self._meta[name][2])
+            series.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            series = sorted(
+                ((name, labels, value if isinstance(value, (int, float)) else _copy(value))
+                 for (name, labels), value in self._series.items()),
+                key=lambda s: (s[0], s[1]),
+            )
+
+        lines = []
+        current = None
+        for name, labels, value in series:
+            kind, help_text, _ = self._meta[name]
+            full = f"{PREFIX}_{name}"
+            if name != current:
+                lines.append(f"# HELP {full} {help_text}")
+                lines.append(f"# TYPE {full} {kind}")
+                current = name
+            if kind == "counter":
+                lines.append(f"{full}{_labels(labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip((*value.buckets, "+Inf"), value.counts):
+                cumulative += count
+                lines.append(f"{full}_bucket{_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{full}_sum{_labels(labels)} {_number(value.sum)}")
+            lines.append(f"{full}_count{_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _copy(h: Histogram) -> Histogram:
+    c = Histogram(h.buckets)
+    c.counts, c.sum, c.count = list(h.counts), h.sum, h.count
+    return c
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels: tuple, **extra) -> str:
+    items = [*labels, *((k, v if isinstance(v, str) else _number(v)) for k, v in extra.items())]
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Expõe as métricas de um processo sem HTTP próprio (ex: send_outbox) numa thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+registry = Registry()
+registry.counter("requests_total", "Requisições por view e status HTTP.")
+registry.histogram("request_duration_seconds", "Tempo total da requisição.")
+registry.histogram("request_db_queries", "Consultas SQL por requisição.", COUNT_BUCKETS)
+registry.histogram("request_db_seconds", "Tempo em SQL por requisição.")
+registry.histogram("request_template_seconds", "Tempo renderizando templates por requisição.")
+registry.histogram("request_body_bytes", "Tamanho do corpo enviado (uploads).", BYTES_BUCKETS)
+registry.histogram("smtp_send_seconds", "Tempo de envio de cada e-mail por SMTP.")
+registry.counter("slow_requests_total", "Requisições acima de SLOW_REQUEST_SECONDS.")
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "template_seconds", "smtp_seconds", "recorded")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.smtp_seconds = 0.0
+        self.recorded = []  # (sql, segundos), até MAX_RECORDED_QUERIES
+
+    def slowest_queries(self, n: int = 5) -> list:
+        return sorted(self.recorded, key=lambda q: q[1], reverse=True)[:n]
+
+    def repeated_queries(self, n: int = 3) -> list:
+        # Mesmo SQL repetido muitas vezes costuma ser N+1
+        counts = {}
+        for sql, _ in self.recorded:
+            counts[sql] = counts.get(sql, 0) + 1
+        return sorted(((c, sql) for sql, c in counts.items() if c > 1), reverse=True)[:n]
+
+
+# Propaga para o sync_to_async das views assíncronas junto com o contexto
+current_stats: ContextVar[RequestStats | None] = ContextVar("siteapp_request_stats", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """``execute_wrapper`` instalado em toda conexão (ver signals.py); fora de requisição só repassa."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if len(stats.recorded) < MAX_RECORDED_QUERIES:
+            stats.recorded.append((sql, elapsed))
+
+
+@contextmanager
+def timed_template():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_stats.get()
+        if stats is not None:
+            stats.template_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def timed_smtp():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe("smtp_send_seconds", elapsed)
+        stats = current_stats.get()
+        if stats is not None:
+            stats.smtp_seconds += elapsed
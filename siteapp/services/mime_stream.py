@@ -0,0 +1,182 @@
+import base64
+import mimetypes
+import os
+import re
+import smtplib
+from dataclasses import dataclass
+from email.mime.base import MIMEBase
+from email.utils import make_msgid
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.core.mail.message import sanitize_address
+
+# 57 bytes viram exatamente uma linha base64 de 76 caracteres
+CHUNK_SIZE = 57 * 1024
+
+_SKIP_TOP_HEADERS = {b"content-type", b"content-transfer-encoding", b"mime-version"}
+_BODY_HEADERS = {b"content-type", b"content-transfer-encoding"}
+
+
+class AttachmentBudgetExceeded(Exception):
+    pass
+
+
+@dataclass
+class FileAttachment:
+    """Anexo lido do disco só no momento do envio, em blocos."""
+
+    path: str
+    filename: str
+    mime_type: str = ""
+
+    def __post_init__(self):
+        if not self.mime_type:
+            self.mime_type = mimetypes.guess_type(self.filename)[0] or "application/octet-stream"
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    @property
+    def encoded_size(self) -> int:
+        return encoded_size(self.size)
+
+    def iter_base64(self, chunk_size: int = CHUNK_SIZE):
+        with open(self.path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield base64.encodebytes(chunk).replace(b"\n", b"\r\n")
+
+
+def encoded_size(raw_bytes: int) -> int:
+    # base64 (4/3) + CRLF a cada 76 caracteres
+    b64 = (raw_bytes + 2) // 3 * 4
+    return b64 + (b64 // 76 + 1) * 2
+
+
+def raw_capacity(encoded_bytes: int) -> int:
+    """Quantos bytes de arquivo cabem em ``encoded_bytes`` depois do base64."""
+    # Cada linha de 76 caracteres + CRLF carrega 57 bytes
+    return max(0, (encoded_bytes - 2) // 78 * 57)
+
+
+def max_message_bytes() -> int:
+    return int(getattr(settings, "EMAIL_MAX_MESSAGE_MB", 20) * 1024 * 1024)
+
+
+def check_budget(attachments: list[FileAttachment], budget: int | None = None) -> int:
+    """Soma o tamanho já codificado dos anexos e barra antes de ler qualquer byte."""
+    budget = max_message_bytes() if budget is None else budget
+    total = sum(a.encoded_size for a in attachments)
+    if total > budget:
+        raise AttachmentBudgetExceeded(
+            f"Anexos somam {total // (1024 * 1024)}MB codificados; limite por mensagem: {budget // (1024 * 1024)}MB."
+        )
+    return total
+
+
+def _split_headers(raw: bytes) -> tuple[list[bytes], bytes]:
+    head, _, body = raw.partition(b"\r\n\r\n")
+    # Cabeçalhos dobrados continuam na linha seguinte começando com espaço/tab
+    headers = re.split(rb"\r\n(?![ \t])", head)
+    return headers, body
+
+
+def _header_name(header: bytes) -> bytes:
+    return header.split(b":", 1)[0].strip().lower()
+
+
+def _attachment_headers(att: FileAttachment) -> bytes:
+    maintype, _, subtype = att.mime_type.partition("/")
+    part = MIMEBase(maintype, subtype or "octet-stream")
+    del part["MIME-Version"]
+    part.add_header("Content-Disposition", "attachment", filename=att.filename)
+    part["Content-Transfer-Encoding"] = "base64"
+    return part.as_bytes(policy=part.policy.clone(linesep="\r\n"))
+
+
+def iter_mime_message(msg: EmailMessage, attachments: list[FileAttachment], chunk_size: int = CHUNK_SIZE):
+    """Gera a mensagem MIME (multipart/mixed) em blocos de linhas completas.
+
+    O corpo vem do próprio ``EmailMessage``; os anexos são lidos e codificados em
+    base64 aos poucos, então a memória usada não depende do tamanho dos arquivos.
+    """
+    raw = msg.message().as_bytes(linesep="\r\n")
+    if not attachments:
+        yield raw + b"\r\n"
+        return
+
+    headers, body = _split_headers(raw)
+    boundary = "=_rpm_" + make_msgid(domain="boundary").strip("<>").replace("@", ".")
+
+    top = [h for h in headers if _header_name(h) not in _SKIP_TOP_HEADERS]
+    top.append(f'Content-Type: multipart/mixed; boundary="{boundary}"'.encode())
+    top.append(b"MIME-Version: 1.0")
+    yield b"\r\n".join(top) + b"\r\n\r\n"
+
+    body_headers = [h for h in headers if _header_name(h) in _BODY_HEADERS]
+    yield f"--{boundary}\r\n".encode() + b"\r\n".join(body_headers) + b"\r\n\r\n" + body + b"\r\n"
+
+    for att in attachments:
+        yield f"--{boundary}\r\n".encode() + _attachment_headers(att)
+        yield from att.iter_base64(chunk_size)
+
+    yield f"--{boundary}--\r\n".encode()
+
+
+def _dot_stuff(chunk: bytes) -> bytes:
+    # Os blocos sempre terminam em fim de linha, então ^ é início de linha de verdade
+    return re.sub(rb"(?m)^\.", b"..", chunk)
+
+
+def stream_via_smtp(smtp: smtplib.SMTP, msg: EmailMessage, attachments: list[FileAttachment]) -> None:
+    """Fala o protocolo SMTP direto, mandando o DATA em blocos em vez de um único bytes."""
+    encoding = msg.encoding or settings.DEFAULT_CHARSET
+    from_email = sanitize_address(msg.from_email, encoding)
+    recipients = [sanitize_address(addr, encoding) for addr in msg.recipients()]
+
+    smtp.ehlo_or_helo_if_needed()
+    code, resp = smtp.mail(from_email)
+    if code != 250:
+        smtp.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, from_email)
+    for rcpt in recipients:
+        code, resp = smtp.rcpt(rcpt)
+        if code not in (250, 251):
+            smtp.rset()
+            raise smtplib.SMTPRecipientsRefused({rcpt: (code, resp)})
+
+    code, resp = smtp.docmd("DATA")
+    if code != 354:
+        smtp.rset()
+        raise smtplib.SMTPDataError(code, resp)
+
+    try:
+        for chunk in iter_mime_message(msg, attachments):
+            smtp.send(_dot_stuff(chunk))
+    except BaseException:
+        # O servidor continua esperando o corpo: qualquer comando seguinte (MAIL FROM da
+        # próxima mensagem do lote) viraria texto do DATA. Fecha o socket; a próxima
+        # mensagem vê o socket fechado e reconecta antes de começar (send_on_connection).
+        smtp.close()
+        raise
+    smtp.send(b".\r\n")
+
+    code, resp = smtp.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, resp)
+
+
+def send_streaming(msg: EmailMessage, attachments: list[FileAttachment], connection) -> None:
+    check_budget(attachments)
+
+    smtp = getattr(connection, "connection", None)
+    if isinstance(smtp, smtplib.SMTP):
+        stream_via_smtp(smtp, msg, attachments)
+        return
+
+    # Backends de dev/teste (locmem, file, console) recebem o EmailMessage completo
+    for att in attachments:
+        with open(att.path, "rb") as f:
+            msg.attach(att.filename, f.read(), att.mime_type)
+    connection.send_messages([msg])
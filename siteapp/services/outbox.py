@@ -0,0 +1,210 @@
+import logging
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import OutboundEmail
+from .attachment_policy import LINKS, EmailPart, build_zip, document_link, unique_documents
+from .email_templates import render_email
+from .mail_pool import get_pool
+from .mime_stream import FileAttachment, max_message_bytes
+from .sendgrid_email import send_email
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_email(
+    dedupe_key: str,
+    to_email: str,
+    subject: str,
+    text: str,
+    html: str | None = None,
+    reply_to: str | None = None,
+    request=None,
+    attach_documents: bool = False,
+    document_ids: list[int] | None = None,
+    zip_attachments: bool = False,
+    part: tuple[int, int] = (1, 1),
+) -> OutboundEmail:
+    """Grava o e-mail na fila. Chamar de novo com a mesma chave não duplica o envio."""
+    obj, _ = OutboundEmail.objects.get_or_create(
+        dedupe_key=dedupe_key,
+        defaults={
+            "to_email": to_email,
+            "subject": subject,
+            "text": text,
+            "html": html or "",
+            "reply_to": reply_to or "",
+            "request": request,
+            "attach_documents": attach_documents,
+            "document_ids": document_ids or [],
+            "zip_attachments": zip_attachments,
+            "part_number": part[0],
+            "part_total": part[1],
+        },
+    )
+    return obj
+
+
+def _pending_q(now):
+    stale = now - timedelta(seconds=_setting("OUTBOX_LOCK_TIMEOUT_SECONDS", 600))
+    return (
+        Q(status=OutboundEmail.Status.PENDING, next_attempt_at__lte=now)
+        # Worker que morreu no meio do envio: libera a mensagem depois do timeout
+        | Q(status=OutboundEmail.Status.SENDING, locked_at__lt=stale)
+    )
+
+
+def claim_batch(batch_size: int) -> list[OutboundEmail]:
+    """Reserva um lote com um UPDATE condicional; dois workers nunca pegam a mesma mensagem."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    ids = list(
+        OutboundEmail.objects.filter(_pending_q(now))
+        .order_by("next_attempt_at")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+
+    OutboundEmail.objects.filter(_pending_q(now), id__in=ids).update(
+        status=OutboundEmail.Status.SENDING,
+        locked_at=now,
+        locked_by=token,
+        attempts=F("attempts") + 1,
+    )
+    return list(
+        OutboundEmail.objects.filter(locked_by=token, status=OutboundEmail.Status.SENDING)
+        .select_related("request")
+        .order_by("id")
+    )
+
+
+def _documents_for(msg: OutboundEmail):
+    docs = msg.request.documents.order_by("uploaded_at")
+    if msg.document_ids:
+        docs = docs.filter(pk__in=msg.document_ids)
+    return docs
+
+
+def _document_attachments(docs) -> list[FileAttachment] | None:
+    """Monta os anexos sem ler os arquivos. None se não cabem todos no limite da mensagem.
+
+    Arquivo sumido ou ilegível levanta OSError: o e-mail não sai com parte dos documentos.
+    """
+    budget = max_message_bytes()
+    used = 0
+    attachments = []
+    for d in docs:
+        att = FileAttachment(path=d.attachment_file.path, filename=d.attachment_name)
+        used += att.encoded_size
+        if used > budget:
+            return None
+        attachments.append(att)
+    return attachments
+
+
+def _links_html(msg: OutboundEmail, docs) -> str:
+    """O e-mail interno refeito no plano LINKS: nenhum anexo, um link assinado por documento."""
+    lattes_request = msg.request
+    for d in docs:
+        d.download_url = document_link(d)
+    # Mantém o "parte N de M" da divisão original
+    part = EmailPart(msg.part_number, msg.part_total, linked=list(docs))
+    ctx = {
+        "pedido": lattes_request,
+        "documentos": part.linked,
+        "total_docs": lattes_request.documents.count(),
+        "parte": part,
+        "estrategia": LINKS,
+    }
+    return render_email("emails/notificacao_interna.html", ctx)
+
+
+def _backoff(attempts: int) -> timedelta:
+    base = _setting("OUTBOX_RETRY_BASE_SECONDS", 30)
+    cap = _setting("OUTBOX_RETRY_MAX_SECONDS", 3600)
+    return timedelta(seconds=min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def deliver(msg: OutboundEmail, connection=None) -> bool:
+    zip_path = None
+    try:
+        # Dentro do try: um documento que sumiu do disco vira tentativa com falha (e backoff),
+        # não uma exceção que derruba o send_outbox --loop com a mensagem presa em SENDING
+        attachments = None
+        html = msg.html
+        if msg.attach_documents and msg.request_id:
+            docs = unique_documents(_documents_for(msg))
+            if msg.zip_attachments and docs:
+                zip_path = build_zip(msg.request, docs)
+                zip_att = FileAttachment(path=zip_path, filename=f"{msg.request.public_id}-documentos.zip")
+                if zip_att.encoded_size <= max_message_bytes():
+                    attachments = [zip_att]
+            if attachments is None and docs:
+                attachments = _document_attachments(docs)
+                if attachments is None:
+                    # Nunca um e-mail com parte dos arquivos: todos vão como link
+                    logger.warning("Anexos de %s passam do limite por mensagem: enviando links", msg.dedupe_key)
+                    html = _links_html(msg, docs)
+                attachments = attachments or None
+
+        send_email(
+            to_email=msg.to_email,
+            subject=msg.subject,
+            text=msg.text,
+            html=html or None,
+            reply_to=msg.reply_to or None,
+            file_attachments=attachments,
+            connection=connection,
+        )
+    except Exception as e:
+        max_attempts = _setting("OUTBOX_MAX_ATTEMPTS", 8)
+        failed = msg.attempts >= max_attempts
+        OutboundEmail.objects.filter(pk=msg.pk, locked_by=msg.locked_by).update(
+            status=OutboundEmail.Status.FAILED if failed else OutboundEmail.Status.PENDING,
+            next_attempt_at=timezone.now() + _backoff(msg.attempts),
+            last_error=str(e)[:2000],
+            locked_at=None,
+            locked_by="",
+        )
+        logger.warning("Falha ao enviar %s (tentativa %s): %s", msg.dedupe_key, msg.attempts, e)
+        return False
+    finally:
+        if zip_path:
+            os.remove(zip_path)
+
+    OutboundEmail.objects.filter(pk=msg.pk, locked_by=msg.locked_by).update(
+        status=OutboundEmail.Status.SENT,
+        sent_at=timezone.now(),
+        last_error="",
+        locked_at=None,
+        locked_by="",
+    )
+    return True
+
+
+def process_outbox(batch_size: int | None = None) -> tuple[int, int]:
+    """Envia um lote da fila. Retorna (enviados, falhas)."""
+    batch_size = batch_size or _setting("OUTBOX_BATCH_SIZE", 20)
+    sent = failed = 0
+    batch = claim_batch(batch_size)
+    if not batch:
+        return sent, failed
+
+    # O lote inteiro sai pela mesma conexão SMTP do pool
+    with get_pool().connection() as conn:
+        for msg in batch:
+            if deliver(msg, connection=conn):
+                sent += 1
+            else:
+                failed += 1
+    return sent, failed
@@ -1,7 +1,11 @@
 import mimetypes
 import os
+import smtplib
 
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
+
+from .metrics import timed_smtp
+from .mime_stream import FileAttachment, send_streaming
 
 
 class SendGridError(Exception):
@@ -17,14 +21,14 @@ def file_to_sendgrid_attachment(file_path: str, filename: str):
     return (filename, content, mime_type)
 
 
-def send_email(
+def build_email(
     to_email: str,
     subject: str,
     text: str,
     html: str | None = None,
     reply_to: str | None = None,
     attachments: list | None = None,
-):
+) -> EmailMessage:
     from_email = os.getenv("DEFAULT_FROM_EMAIL")
 
     msg = EmailMessage(
@@ -43,7 +47,52 @@ def send_email(
         for filename, content, mime_type in attachments:
             msg.attach(filename, content, mime_type)
 
+    return msg
+
+
+def _deliver(msg: EmailMessage, connection, file_attachments: list[FileAttachment] | None):
+    if file_attachments:
+        send_streaming(msg, file_attachments, connection)
+    else:
+        connection.send_messages([msg])
+
+
+def send_on_connection(msg: EmailMessage, connection, file_attachments: list[FileAttachment] | None = None) -> None:
+    """Envia usando uma conexão já aberta, sem reenviar se ela cair no meio.
+
+    Uma queda depois do DATA aceito não diz se o servidor entregou: repetir aqui pode
+    duplicar o e-mail. Quem repete é a fila (outbox), com backoff.
+    """
+    with timed_smtp():
+        smtp = getattr(connection, "connection", None)
+        if isinstance(smtp, smtplib.SMTP) and smtp.sock is None:
+            # Uma falha anterior do lote fechou o socket: reabre antes de começar esta mensagem
+            connection.close()
+        connection.open()
+        _deliver(msg, connection, file_attachments)
+
+
+def send_email(
+    to_email: str,
+    subject: str,
+    text: str,
+    html: str | None = None,
+    reply_to: str | None = None,
+    attachments: list | None = None,
+    connection=None,
+    file_attachments: list[FileAttachment] | None = None,
+):
+    """``attachments`` são tuplas já em memória; ``file_attachments`` são lidos do disco em blocos."""
+    msg = build_email(to_email, subject, text, html=html, reply_to=reply_to, attachments=attachments)
+
     try:
-        msg.send()
+        if connection is not None:
+            send_on_connection(msg, connection, file_attachments)
+        elif file_attachments:
+            with get_connection() as conn:
+                send_on_connection(msg, conn, file_attachments)
+        else:
+            with timed_smtp():
+                msg.send()
     except Exception as e:
         raise SendGridError(f"Email falhou: {e}")
@@ -0,0 +1,125 @@
+"""Status do pedido ao vivo por Server-Sent Events.
+
+Um único ``StatusNotifier`` por processo guarda, para cada ``public_id``, as filas das
+conexões abertas. Quem muda o status (save do modelo, finalização) publica depois do
+commit e o notifier repassa para as filas; nenhuma conexão consulta o banco enquanto
+espera. Cada conexão é só uma corrotina e uma fila no event loop, então um worker ASGI
+segura milhares delas paradas.
+
+O notifier é por processo: com vários workers, uma mudança feita em outro processo só
+chega quando a conexão é refeita (``STATUS_STREAM_MAX_SECONDS``), e a reconexão do
+EventSource já começa pelo status atual.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+
+from ..models import LattesRequest
+
+TOKEN_SALT = "siteapp.status-stream"
+
+HEARTBEAT_SECONDS = 20
+RETRY_MS = 10_000
+
+# Depois disso não há mais mudanças a esperar
+FINAL_STATUSES = {LattesRequest.Status.DONE}
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def status_token(public_id: str) -> str:
+    return signing.Signer(salt=TOKEN_SALT).signature(public_id)
+
+
+def valid_token(public_id: str, token: str) -> bool:
+    return constant_time_compare(token or "", status_token(public_id))
+
+
+def status_stream_url(public_id: str) -> str:
+    return f"{reverse('status_stream', args=[public_id])}?token={status_token(public_id)}"
+
+
+class StatusNotifier:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # public_id -> {fila: event loop dela}
+
+    def subscribe(self, public_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(public_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, public_id: str, queue: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(public_id, {})
+            queues.pop(queue, None)
+            if not queues:
+                self._subscribers.pop(public_id, None)
+
+    def publish(self, public_id: str, status: str):
+        """Pode ser chamado de qualquer thread (views síncronas, admin, sync_to_async)."""
+        with self._lock:
+            targets = list(self._subscribers.get(public_id, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, status)
+            except RuntimeError:
+                # Loop já encerrado (worker saindo)
+                self.unsubscribe(public_id, queue)
+
+    def connections(self) -> int:
+        with self._lock:
+            return sum(len(q) for q in self._subscribers.values())
+
+
+notifier = StatusNotifier()
+
+
+def status_changed(public_id: str, status: str):
+    # Só depois do commit: quem reconectar e ler o banco tem que ver o mesmo status
+    transaction.on_commit(lambda: notifier.publish(public_id, status))
+
+
+def format_event(status: str) -> str:
+    data = {"status": status, "status_display": LattesRequest.Status(status).label}
+    return f"event: status\ndata: {json.dumps(data)}\n\n"
+
+
+def first_event(status: str) -> str:
+    # "retry": quanto o EventSource espera para reconectar quando a conexão fecha
+    return f"retry: {RETRY_MS}\n\n" + format_event(status)
+
+
+async def event_stream(public_id: str, status: str):
+    """Gerador assíncrono do corpo SSE: status atual, mudanças e comentários de keep-alive."""
+    yield first_event(status)
+    if status in FINAL_STATUSES:
+        return
+
+    queue = notifier.subscribe(public_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _setting("STATUS_STREAM_MAX_SECONDS", 300)
+    try:
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                new_status = await asyncio.wait_for(queue.get(), min(HEARTBEAT_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                # Comentário SSE: mantém proxies e o navegador com a conexão viva
+                yield ": ping\n\n"
+                continue
+            if new_status != status:
+                status = new_status
+                yield format_event(status)
+            if status in FINAL_STATUSES:
+                return
+    finally:
+        notifier.unsubscribe(public_id, queue)
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DashboardCounter, DocumentBlob, LattesDocument, LattesRequest
+from .services.archive import delete_archive
+from .services.lookup import invalidate_lookup
+from .services.metrics import record_query
+from .services.status_events import status_changed
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    # WAL deixa leituras rodarem durante escritas; NORMAL é seguro com WAL e bem mais rápido
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    # Mesmo efeito de "with connection.execute_wrapper(...)", mas para a vida toda da conexão
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(post_save, sender=LattesRequest)
+def invalidate_request_lookup(sender, instance, **kwargs):
+    # Status (ou outro dado exibido) mudou: a próxima consulta lê do banco
+    invalidate_lookup(instance.public_id)
+
+
+@receiver(post_save, sender=LattesRequest)
+def push_request_status(sender, instance, created, **kwargs):
+    # Conexões abertas em /status/stream/ recebem o novo status (repetido é ignorado lá)
+    if not created:
+        status_changed(instance.public_id, instance.status)
+
+
+@receiver(post_save, sender=LattesDocument)
+@receiver(post_delete, sender=LattesDocument)
+def invalidate_document_lookup(sender, instance, **kwargs):
+    # Só se o pedido já estiver carregado; num delete em cascata não vale uma query por documento
+    lattes_request = instance._state.fields_cache.get("request")
+    if lattes_request is not None:
+        invalidate_lookup(lattes_request.public_id)
+
+
+@receiver(post_delete, sender=LattesDocument)
+def release_document_blob(sender, instance, **kwargs):
+    # Também dispara nos deletes em cascata (ex: apagar o LattesRequest inteiro).
+    # Documento arquivado já soltou a referência ao ir para o .zip.
+    if instance.sha256 and not instance.archive_member:
+        DocumentBlob.release_reference(instance.sha256)
+
+
+@receiver(post_delete, sender=LattesDocument)
+def delete_document_variants(sender, instance, **kwargs):
+    # Versão otimizada e miniatura são exclusivas de cada documento
+    for variant in (instance.optimized_file, instance.thumbnail):
+        if variant:
+            variant.delete(save=False)
+
+
+@receiver(post_delete, sender=LattesRequest)
+def delete_request_archive(sender, instance, **kwargs):
+    if instance.archive_name:
+        transaction.on_commit(lambda: delete_archive(instance.archive_name))
+
+
+@receiver(post_delete, sender=LattesRequest)
+def uncount_request(sender, instance, **kwargs):
+    # Roda dentro da transação do delete (também no delete em lote do admin)
+    DashboardCounter.apply({}, instance._counted_keys())
+
+
+@receiver(post_delete, sender=LattesDocument)
+def uncount_document(sender, instance, **kwargs):
+    doc_type = instance._loaded[0] if hasattr(instance, "_loaded") else instance.doc_type
+    DashboardCounter.apply({}, {(DashboardCounter.Kind.DOC_TYPE, doc_type): 1})
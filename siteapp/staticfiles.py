@@ -0,0 +1,121 @@
+"""Estáticos de produção: nomes com hash, versões .gz/.br geradas no collectstatic e
+um índice em memória para o ``static_files_middleware`` servir sem tocar no disco à toa."""
+import gzip
+import json
+import mimetypes
+import os
+from dataclasses import dataclass, field
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.utils.http import http_date
+
+try:
+    import brotli  # opcional: sem ele só há .gz
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css", ".js", ".mjs", ".map", ".json", ".svg", ".html", ".txt", ".xml", ".ico", ".ttf", ".otf", ".eot",
+}
+MIN_COMPRESS_SIZE = 512
+# Só guarda a versão comprimida se economizar pelo menos 5%
+MAX_COMPRESSED_RATIO = 0.95
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+SHORT_CACHE = "public, max-age=60"
+
+
+def compress_file(path: str) -> list[str]:
+    """Grava ``path.gz`` (e ``path.br`` se houver brotli) ao lado do arquivo; devolve os gerados."""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    candidates = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        candidates.append((".br", lambda d: brotli.compress(d, quality=11)))
+
+    written = []
+    for suffix, compress in candidates:
+        target = path + suffix
+        compressed = compress(data)
+        if len(compressed) <= len(data) * MAX_COMPRESSED_RATIO:
+            with open(target, "wb") as f:
+                f.write(compressed)
+            written.append(target)
+        elif os.path.exists(target):
+            os.remove(target)  # sobra de um collectstatic anterior
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage que também pré-comprime os arquivos de texto."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = self.path(name)
+            if os.path.exists(path) and os.path.getsize(path) >= MIN_COMPRESS_SIZE:
+                compress_file(path)
+
+
+@dataclass
+class StaticFile:
+    path: str
+    size: int
+    content_type: str
+    headers: dict
+    encodings: dict = field(default_factory=dict)  # "br"/"gzip" -> (caminho, tamanho)
+
+
+def _content_type(path: str) -> str:
+    content_type, _ = mimetypes.guess_type(path)
+    content_type = content_type or "application/octet-stream"
+    if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def build_index(root: str, url_prefix: str, manifest_name: str = "staticfiles.json") -> dict[str, StaticFile]:
+    """Varre o STATIC_ROOT uma vez (na subida do processo) e monta URL -> arquivo."""
+    hashed = set()
+    manifest = os.path.join(root, manifest_name)
+    if os.path.exists(manifest):
+        with open(manifest, encoding="utf-8") as f:
+            hashed = set(json.load(f).get("paths", {}).values())
+
+    index = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith((".gz", ".br")) or filename == manifest_name:
+                continue
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, root).replace(os.sep, "/")
+            stat = os.stat(path)
+            headers = {
+                "Cache-Control": IMMUTABLE_CACHE if name in hashed else SHORT_CACHE,
+                "ETag": f'"{stat.st_size:x}-{int(stat.st_mtime):x}"',
+                "Last-Modified": http_date(stat.st_mtime),
+            }
+            entry = StaticFile(path, stat.st_size, _content_type(path), headers)
+            for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                if os.path.exists(path + suffix):
+                    entry.encodings[encoding] = (path + suffix, os.path.getsize(path + suffix))
+            if entry.encodings:
+                entry.headers["Vary"] = "Accept-Encoding"
+            index[url_prefix + name] = entry
+    return index
+
+
+def accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+BLOB_PREFIX = "lattes_docs/blobs"
+
+_BLOB_NAME_RE = re.compile(r"(?:^|/)([0-9a-f]{64})(?:\.[^/]*)?$")
+
+
+def blob_name(digest: str, ext: str) -> str:
+    # Dois níveis de pasta (ab/cd/) para não acumular milhares de arquivos num diretório só
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+def sha256_from_name(name: str) -> str:
+    """Hash embutido no nome do blob; vazio para arquivos antigos fora do storage por conteúdo."""
+    m = _BLOB_NAME_RE.search(name or "")
+    return m.group(1) if m and name.startswith(BLOB_PREFIX) else ""
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Guarda cada conteúdo distinto uma única vez, pelo SHA-256.
+
+    O nome pedido (``lattes_docs/%Y/%m/arquivo.pdf``) só serve para a extensão; o
+    hash é calculado enquanto o arquivo é gravado, sem ler o upload duas vezes.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Mesmo nome = mesmo conteúdo, então não há colisão a evitar
+        return name
+
+    def _tmp_dir(self) -> str:
+        path = self.path(f"{BLOB_PREFIX}/tmp")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _commit(self, tmp_path: str, digest: str, ext: str) -> str:
+        name = blob_name(digest, ext)
+        full = self.path(name)
+        if os.path.exists(full):
+            os.remove(tmp_path)
+            return name
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        os.replace(tmp_path, full)
+        if self.file_permissions_mode is not None:
+            os.chmod(full, self.file_permissions_mode)
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1]
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir())
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if hasattr(content, "seek"):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return self._commit(tmp_path, digest.hexdigest(), ext)
+
+    def adopt(self, name: str) -> str:
+        """Move um arquivo que já está no MEDIA_ROOT para o storage por conteúdo (sem copiar)."""
+        src = self.path(name)
+        digest = hashlib.sha256()
+        with open(src, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+        return self._commit(src, digest.hexdigest(), os.path.splitext(name)[1])
+
+
+# Sem location/base_url explícitos: segue MEDIA_ROOT/MEDIA_URL (inclusive em override_settings)
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    return document_storage
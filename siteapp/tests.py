@@ -1,3 +1,1558 @@
-from django.test import TestCase
+import os
+import random
+import shutil
+import smtplib
+import tempfile
+import threading
+import time
+import tracemalloc
+import asyncio
+import copy
+import gzip
+import json
+import zipfile
+import unittest
+from io import BytesIO, StringIO
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.template.loaders.filesystem import Loader as FilesystemLoader
+from django.templatetags.static import static
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    DashboardCounter, DocumentBlob, LattesDocument, LattesRequest, OutboundEmail, ReservedPublicId, UploadSession,
+)
+from .services import attachment_policy
+from .services import chunked_upload
+from .services import archive as archive_service
+from .services.dashboard import dashboard, rebuild as rebuild_dashboard
+from .services import document_download
+from .services import document_processing
+from .services import document_zip
+from .services.document_processing import process_pending
+from . import staticfiles as static_pipeline
+from .management.commands._bench import StubSMTPServer
+from .services import email_templates
+from .services.document_zip import documents_for, iter_zip
+from .services.export import export_queryset, iter_export
+from .services.metrics import registry as metrics_registry
+from .services.mail_pool import SMTPConnectionPool, send_messages
+from .services.mime_stream import (
+    AttachmentBudgetExceeded, FileAttachment, check_budget, iter_mime_message, stream_via_smtp,
+)
+from .services.outbox import process_outbox
+from .services.status_events import notifier as status_notifier, status_stream_url, status_token
+from .services.sendgrid_email import build_email, send_on_connection
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp(prefix="claraluz-test-media-")
+
+
+def make_request(**kwargs) -> LattesRequest:
+    data = {"full_name": "Maria Silva", "email": "maria@example.com", "whatsapp": "(11) 99999-0000"}
+    data.update(kwargs)
+    return LattesRequest.objects.create(**data)
+
+
+def make_document(lattes_request, name="diploma.pdf", content=b"%PDF-1.4 teste", **kwargs) -> LattesDocument:
+    return LattesDocument.objects.create(
+        request=lattes_request,
+        doc_type=kwargs.pop("doc_type", LattesDocument.DocType.GRAD_DIPLOMA),
+        file=SimpleUploadedFile(name, content),
+        **kwargs,
+    )
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+)
+class OutboxTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.req = make_request()
+        make_document(self.req)
+
+    def finalize(self):
+        return self.client.post(reverse("finalize_request", args=[self.req.public_id]))
+
+    def test_finalize_only_enqueues(self):
+        resp = self.finalize()
+        self.assertRedirects(resp, f"{reverse('thank_you')}?code={self.req.public_id}")
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.Status.PENDING).count(), 2)
+
+    def test_worker_sends_once_with_attachments(self):
+        self.finalize()
+        self.finalize()
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+        self.assertEqual(process_outbox(), (2, 0))
+        self.assertEqual(process_outbox(), (0, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+        internal = next(m for m in mail.outbox if "Novo pedido" in m.subject)
+        self.assertEqual(len(internal.attachments), 1)
+
+    def test_failure_retries_with_backoff(self):
+        self.finalize()
+        with mock.patch("siteapp.services.outbox.send_email", side_effect=RuntimeError("smtp fora")), \
+                self.assertLogs("siteapp.services.outbox", "WARNING"):
+            self.assertEqual(process_outbox(), (0, 2))
+
+        msg = OutboundEmail.objects.first()
+        self.assertEqual(msg.status, OutboundEmail.Status.PENDING)
+        self.assertEqual(msg.attempts, 1)
+        self.assertGreater(msg.next_attempt_at, timezone.now())
+
+        # Ainda dentro do backoff: nada é reenviado
+        self.assertEqual(process_outbox(), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(process_outbox(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_missing_attachment_is_a_failed_attempt(self):
+        self.finalize()
+        os.remove(self.req.documents.get().file.path)
+        OutboundEmail.objects.filter(dedupe_key__endswith=":interno").update(zip_attachments=True)
+        with self.assertLogs("siteapp.services.outbox", "WARNING"):
+            self.assertEqual(process_outbox(), (1, 1))
+
+        internal = OutboundEmail.objects.get(dedupe_key__endswith=":interno")
+        self.assertEqual(internal.status, OutboundEmail.Status.PENDING)
+        self.assertEqual(internal.locked_by, "")
+        self.assertGreater(internal.next_attempt_at, timezone.now())
+        self.assertIn("No such file", internal.last_error)
+        # Só o e-mail do cliente (sem anexos) saiu; o .zip incompleto foi apagado
+        self.assertEqual([m.subject for m in mail.outbox], [f"Pedido confirmado — {self.req.public_id}"])
+        self.assertFalse([f for f in os.listdir(tempfile.gettempdir()) if f.startswith(self.req.public_id)])
+
+        OutboundEmail.objects.filter(pk=internal.pk).update(
+            zip_attachments=False, next_attempt_at=timezone.now() - timedelta(seconds=1)
+        )
+        with self.assertLogs("siteapp.services.outbox", "WARNING"):
+            self.assertEqual(process_outbox(), (0, 1))
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=1)
+    def test_gives_up_after_max_attempts(self):
+        self.finalize()
+        with mock.patch("siteapp.services.outbox.send_email", side_effect=RuntimeError("smtp fora")), \
+                self.assertLogs("siteapp.services.outbox", "WARNING"):
+            process_outbox()
+        self.assertEqual(OutboundEmail.objects.filter(status=OutboundEmail.Status.FAILED).count(), 2)
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class ConnectionPoolTests(TestCase):
+    def test_send_messages_shares_one_connection(self):
+        pool = SMTPConnectionPool(size=1)
+        msgs = [build_email(f"c{i}@example.com", "Assunto", "Corpo") for i in range(5)]
+        with mock.patch.object(pool, "_new_connection", wraps=pool._new_connection) as new_conn:
+            self.assertEqual(send_messages(msgs, pool=pool), 5)
+            self.assertEqual(send_messages(msgs[:1], pool=pool), 1)
+        self.assertEqual(new_conn.call_count, 1)
+        self.assertEqual(len(mail.outbox), 6)
+
+    def test_idle_connections_are_closed(self):
+        pool = SMTPConnectionPool(size=2, idle_timeout=-1)
+        with pool.connection():
+            pass
+        self.assertEqual(pool.close_idle(), 1)
+        self.assertEqual(pool._idle, [])
+
+    def test_broken_connection_is_not_reused(self):
+        pool = SMTPConnectionPool(size=2)
+        with self.assertRaises(RuntimeError):
+            with pool.connection():
+                raise RuntimeError("caiu")
+        self.assertEqual(pool._idle, [])
+
+
+class StreamingAttachmentTests(TestCase):
+    FILE_SIZE = 1024 * 1024
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.mkdtemp(prefix="claraluz-test-att-")
+        cls.paths = []
+        for i in range(12):
+            path = os.path.join(cls.tmpdir, f"doc{i}.pdf")
+            with open(path, "wb") as f:
+                f.write(os.urandom(cls.FILE_SIZE))
+            cls.paths.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir, ignore_errors=True)
+        super().tearDownClass()
+
+    def _peak_streaming(self, count: int) -> int:
+        msg = build_email("ops@example.com", "Pedido", "Corpo", html="<p>Pedido</p>")
+        attachments = [FileAttachment(p, os.path.basename(p)) for p in self.paths[:count]]
+        tracemalloc.start()
+        try:
+            total = 0
+            for chunk in iter_mime_message(msg, attachments):
+                total += len(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(total, count * self.FILE_SIZE)
+        return peak
+
+    def test_peak_memory_does_not_grow_with_document_count(self):
+        few = self._peak_streaming(2)
+        many = self._peak_streaming(12)
+        # Bem abaixo de um único arquivo, e sem crescer com a quantidade de anexos
+        self.assertLess(many, self.FILE_SIZE // 2)
+        self.assertLess(many, few * 1.5 + 64 * 1024)
+
+    def test_budget_is_checked_before_reading(self):
+        attachments = [FileAttachment(p, os.path.basename(p)) for p in self.paths[:3]]
+        with self.assertRaises(AttachmentBudgetExceeded):
+            check_budget(attachments, budget=2 * self.FILE_SIZE)
+        self.assertGreater(check_budget(attachments, budget=10 * self.FILE_SIZE), 3 * self.FILE_SIZE)
+
+    def test_failure_inside_data_does_not_poison_the_connection(self):
+        with StubSMTPServer() as server, override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=server.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_TIMEOUT=5,
+        ):
+            conn = SMTPConnectionPool(size=1).acquire()
+            missing = FileAttachment(os.path.join(self.tmpdir, "sumiu.pdf"), "sumiu.pdf")
+            with self.assertRaises(FileNotFoundError):
+                stream_via_smtp(conn.connection, build_email("a@example.com", "Um", "Corpo"), [missing])
+            # A próxima mensagem do lote reconecta em vez de cair no DATA aberto
+            started = time.monotonic()
+            send_on_connection(build_email("b@example.com", "Dois", "Corpo"), conn, [])
+            conn.close()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(server.connections, 2)
+
+    def test_disconnect_during_send_is_not_resent(self):
+        # A queda pode ter sido depois do DATA aceito: reenviar duplicaria o e-mail
+        conn = mock.Mock(connection=None)
+        conn.send_messages.side_effect = smtplib.SMTPServerDisconnected("caiu")
+        with self.assertRaises(smtplib.SMTPServerDisconnected):
+            send_on_connection(build_email("a@example.com", "Um", "Corpo"), conn)
+        conn.send_messages.assert_called_once()
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    # Limites em KB para os testes: anexo até 10KB, zip até 20KB, divisão até 40KB
+    EMAIL_ATTACH_MAX_MB=10 / 1024,
+    EMAIL_ZIP_MAX_MB=20 / 1024,
+    EMAIL_SPLIT_MAX_MB=40 / 1024,
+)
+class AttachmentPolicyTests(TestCase):
+    def setUp(self):
+        self.req = make_request()
+
+    def add_docs(self, *sizes_kb):
+        for i, kb in enumerate(sizes_kb):
+            make_document(self.req, name=f"doc{i}.pdf", content=bytes([65 + i]) * kb * 1024)
+        return list(self.req.documents.order_by("uploaded_at"))
+
+    def finalize_and_send(self):
+        self.client.post(reverse("finalize_request", args=[self.req.public_id]))
+        while process_outbox() != (0, 0):
+            pass
+        return [m for m in mail.outbox if "Novo pedido" in m.subject]
+
+    def test_strategy_thresholds(self):
+        kb = 1024
+        self.assertEqual(attachment_policy.choose_strategy(5 * kb), attachment_policy.ATTACH)
+        self.assertEqual(attachment_policy.choose_strategy(15 * kb), attachment_policy.ZIP)
+        self.assertEqual(attachment_policy.choose_strategy(30 * kb), attachment_policy.SPLIT)
+        self.assertEqual(attachment_policy.choose_strategy(50 * kb), attachment_policy.LINKS)
+
+    @override_settings(EMAIL_MAX_MESSAGE_MB=25 / 1024)
+    def test_thresholds_use_encoded_size(self):
+        # 19KB de PDF cabem no limite do zip, mas em base64 passam dos 25KB da mensagem
+        self.assertEqual(attachment_policy.choose_strategy(19 * 1024), attachment_policy.SPLIT)
+        self.assertEqual(attachment_policy.choose_strategy(9 * 1024), attachment_policy.ATTACH)
+        docs = self.add_docs(17, 2)
+        _, parts = attachment_policy.plan_internal_email(docs)
+        self.assertTrue(all(attachment_policy.encoded_size(sum(d.file.size for d in p.documents)) <= 25 * 1024
+                            for p in parts))
+
+    def test_attachments_over_the_limit_become_links(self):
+        self.add_docs(4, 4)
+        self.client.post(reverse("finalize_request", args=[self.req.public_id]))
+        # O limite mudou (ou o arquivo foi trocado) entre a fila e o envio
+        with override_settings(EMAIL_MAX_MESSAGE_MB=6 / 1024), self.assertLogs("siteapp.services.outbox", "WARNING"):
+            while process_outbox() != (0, 0):
+                pass
+        internal = next(m for m in mail.outbox if "Novo pedido" in m.subject)
+        self.assertEqual(internal.attachments, [])
+        html = internal.body
+        self.assertEqual(html.count("Baixar arquivo"), 2)
+        self.assertIn("use os links acima", html)
+
+    def test_zip_strategy_sends_single_archive(self):
+        self.add_docs(8, 7)
+        emails = self.finalize_and_send()
+        self.assertEqual(len(emails), 1)
+        self.assertEqual([a[0] for a in emails[0].attachments], [f"{self.req.public_id}-documentos.zip"])
+
+    def test_split_strategy_numbers_the_parts(self):
+        self.add_docs(8, 8, 8, 12)
+        emails = self.finalize_and_send()
+        self.assertEqual(len(emails), 3)
+        self.assertTrue(all("/3)" in m.subject for m in emails))
+        self.assertEqual(sum(len(m.attachments) for m in emails), 3)
+        # O arquivo de 12KB passa do limite por mensagem e vai como link
+        self.assertIn("Baixar arquivo", emails[0].body)
+
+    def test_split_parts_keep_their_numbering_as_links(self):
+        self.add_docs(8, 8, 8, 12)
+        self.client.post(reverse("finalize_request", args=[self.req.public_id]))
+        with override_settings(EMAIL_MAX_MESSAGE_MB=6 / 1024), self.assertLogs("siteapp.services.outbox", "WARNING"):
+            while process_outbox() != (0, 0):
+                pass
+        internal = sorted((m for m in mail.outbox if "Novo pedido" in m.subject), key=lambda m: m.subject)
+        self.assertEqual(len(internal), 3)
+        for number, m in enumerate(internal, start=1):
+            self.assertEqual(m.attachments, [])
+            self.assertIn(f"Parte {number} de 3", m.body)
+            self.assertIn(f"Baixar arquivo (parte {number}/3)", m.body)
+
+    def test_links_strategy_and_download_view(self):
+        docs = self.add_docs(30, 20)
+        emails = self.finalize_and_send()
+        self.assertEqual(len(emails), 1)
+        self.assertEqual(emails[0].attachments, [])
+
+        token = attachment_policy.document_link_token(docs[0])
+        resp = self.client.get(reverse("document_link", args=[token]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b"".join(resp.streaming_content), b"A" * 30 * 1024)
+
+        self.assertEqual(self.client.get(reverse("document_link", args=[token + "x"])).status_code, 404)
+        with override_settings(DOCUMENT_LINK_MAX_AGE_HOURS=-1):
+            self.assertEqual(self.client.get(reverse("document_link", args=[token])).status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.req = make_request()
+        self.init_url = reverse("chunked_upload_init", args=[self.req.public_id])
+
+    def init(self, filename="diploma.pdf", size=10):
+        return self.client.post(self.init_url, {"doc_type": "GRAD_DIPLOMA", "filename": filename, "size": size})
+
+    def put(self, upload_id, offset, data):
+        url = reverse("chunked_upload_chunk", args=[self.req.public_id, upload_id])
+        return self.client.put(url, data, content_type="application/octet-stream", HTTP_UPLOAD_OFFSET=str(offset))
+
+    def complete(self, upload_id):
+        return self.client.post(reverse("chunked_upload_complete", args=[self.req.public_id, upload_id]))
+
+    def test_resumable_upload_lands_in_final_location(self):
+        content = b"%PDF-1.4 " + b"a" * 91
+        upload_id = self.init(size=len(content)).json()["upload_id"]
+
+        self.assertEqual(self.put(upload_id, 0, content[:40]).json()["offset"], 40)
+        # Parte repetida/fora de ordem: servidor informa de onde continuar
+        resp = self.put(upload_id, 0, content[:40])
+        self.assertEqual((resp.status_code, resp.json()["offset"]), (409, 40))
+
+        status = self.client.get(reverse("chunked_upload_chunk", args=[self.req.public_id, upload_id]))
+        self.assertEqual(status.json()["offset"], 40)
+        self.assertEqual(self.put(upload_id, 40, content[40:]).json()["offset"], len(content))
+
+        self.assertEqual(self.complete(upload_id).status_code, 201)
+        doc = self.req.documents.get()
+        session = UploadSession.objects.get(pk=upload_id)
+        # O arquivo montado foi movido (não copiado) para o storage por conteúdo
+        self.assertTrue(doc.file.name.startswith("lattes_docs/blobs/"))
+        self.assertFalse(os.path.exists(os.path.join(TEST_MEDIA_ROOT, session.storage_name)))
+        with doc.file.open("rb") as f:
+            self.assertEqual(f.read(), content)
+
+        self.assertEqual(self.complete(upload_id).status_code, 409)
+        status = self.client.get(reverse("chunked_upload_chunk", args=[self.req.public_id, upload_id]))
+        self.assertEqual(status.status_code, 409)
+
+    def test_rejects_bad_extension_and_size_up_front(self):
+        self.assertEqual(self.init(filename="virus.exe").status_code, 400)
+        self.assertEqual(self.init(size=100 * 1024 * 1024).status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_incomplete_upload_cannot_complete(self):
+        upload_id = self.init(size=10).json()["upload_id"]
+        self.put(upload_id, 0, b"12345")
+        self.assertEqual(self.complete(upload_id).status_code, 409)
+        self.assertFalse(self.req.documents.exists())
+
+    def test_concurrent_completes_create_one_document(self):
+        content = b"%PDF-1.4 " + b"b" * 20
+        upload_id = self.init(size=len(content)).json()["upload_id"]
+        self.put(upload_id, 0, content)
+        # Duas requisições leram a sessão antes de qualquer uma concluir
+        first, second = UploadSession.objects.get(pk=upload_id), UploadSession.objects.get(pk=upload_id)
+        chunked_upload.complete_session(first)
+        with self.assertRaises(chunked_upload.ChunkedUploadError) as ctx:
+            chunked_upload.complete_session(second)
+        self.assertEqual(ctx.exception.status, 409)
+        self.assertEqual(self.req.documents.count(), 1)
+
+    def test_abandoned_sessions_expire(self):
+        upload_id = self.init(size=10).json()["upload_id"]
+        self.put(upload_id, 0, b"%PDF-")
+        session = UploadSession.objects.get(pk=upload_id)
+        partial = os.path.join(TEST_MEDIA_ROOT, session.storage_name)
+        UploadSession.objects.filter(pk=upload_id).update(created_at=timezone.now() - timedelta(hours=25))
+
+        self.assertEqual(self.put(upload_id, 5, b"12345").status_code, 410)
+        # O GET de retomada também avisa: o navegador esquece a sessão guardada
+        status = self.client.get(reverse("chunked_upload_chunk", args=[self.req.public_id, upload_id]))
+        self.assertEqual((status.status_code, status.json()["offset"]), (410, 5))
+        out = StringIO()
+        call_command("expire_upload_sessions", stdout=out)
+        self.assertIn("Sessões expiradas: 1", out.getvalue())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(partial))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class BatchUploadTests(TestCase):
+    def setUp(self):
+        self.req = make_request()
+        self.url = reverse("upload_docs_batch", args=[self.req.public_id])
+
+    def post(self, files, doc_types):
+        return self.client.post(self.url, {"files": files, "doc_type": doc_types})
+
+    def test_many_files_in_one_request(self):
+        files = [SimpleUploadedFile(f"cert{i}.pdf", f"%PDF-1.4 cert {i}".encode()) for i in range(15)]
+        doc_types = ["EVENTS", "COURSES", "PUBLICATIONS"] * 5
+        # Pedido, trava do pedido aberto, um INSERT em lote dos documentos, blobs (SELECT +
+        # INSERT + UPDATE), contadores do painel (INSERT + UPDATE), contagem final, além de
+        # SAVEPOINT/RELEASE da transação
+        with self.assertNumQueries(11):
+            resp = self.post(files, doc_types)
+        self.assertEqual(resp.status_code, 201)
+        data = resp.json()
+        self.assertEqual(data["total"], 15)
+        self.assertEqual([d["doc_type"] for d in data["created"]], doc_types)
+        self.assertEqual(self.req.documents.filter(doc_type="EVENTS").count(), 5)
+
+    def test_one_invalid_file_rejects_the_batch(self):
+        files = [SimpleUploadedFile("ok.pdf", b"%PDF"), SimpleUploadedFile("virus.exe", b"MZ")]
+        resp = self.post(files, ["EVENTS", "EVENTS"])
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("virus.exe", resp.json()["errors"][0])
+        self.assertFalse(self.req.documents.exists())
+
+    def test_each_file_needs_a_type(self):
+        resp = self.post([SimpleUploadedFile("ok.pdf", b"%PDF")], [])
+        self.assertEqual(resp.status_code, 400)
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+)
+class ContentAddressedStorageTests(TestCase):
+    def test_same_content_is_stored_once_and_released_on_delete(self):
+        content = b"%PDF-1.4 diploma repetido"
+        req = make_request()
+        other = make_request(email="joao@example.com")
+        d1 = make_document(req, name="diploma.pdf", content=content)
+        d2 = make_document(req, name="diploma (1).pdf", content=content)
+        d3 = make_document(other, name="copia.pdf", content=content)
+
+        self.assertEqual(d1.file.name, d2.file.name)
+        self.assertEqual(d1.sha256, d3.sha256)
+        blob = DocumentBlob.objects.get(sha256=d1.sha256)
+        self.assertEqual(blob.ref_count, 3)
+        path = d1.file.path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            req.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(os.path.exists(path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(DocumentBlob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_replacing_the_file_moves_the_reference(self):
+        req = make_request()
+        doc = make_document(req, name="antigo.pdf", content=b"%PDF-1.4 antigo")
+        other = make_document(req, name="outro.pdf", content=b"%PDF-1.4 novo")
+        old_sha, old_path = doc.sha256, doc.file.path
+
+        doc = LattesDocument.objects.get(pk=doc.pk)
+        doc.file = SimpleUploadedFile("novo.pdf", b"%PDF-1.4 novo")
+        with self.captureOnCommitCallbacks(execute=True):
+            doc.save()
+        self.assertEqual(doc.original_name, "novo.pdf")
+        self.assertFalse(DocumentBlob.objects.filter(sha256=old_sha).exists())
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(DocumentBlob.objects.get(sha256=other.sha256).ref_count, 2)
+
+        # Apagar o outro documento não pode levar o arquivo ainda usado por este
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertTrue(os.path.exists(doc.file.path))
+
+    def test_finalize_skips_duplicate_attachments(self):
+        req = make_request()
+        make_document(req, name="a.pdf", content=b"%PDF igual")
+        make_document(req, name="b.pdf", content=b"%PDF igual")
+        make_document(req, name="c.pdf", content=b"%PDF outro")
+        self.client.post(reverse("finalize_request", args=[req.public_id]))
+        process_outbox()
+        internal = next(m for m in mail.outbox if "Novo pedido" in m.subject)
+        self.assertEqual([a[0] for a in internal.attachments], ["a.pdf", "c.pdf"])
+
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+@unittest.skipIf(Image is None, "Pillow não instalado")
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    DOCUMENT_IMAGE_MAX_SIDE=400,
+    DOCUMENT_THUMBNAIL_SIDE=64,
+)
+class DocumentProcessingTests(TestCase):
+    def photo(self, size=(1600, 1200)) -> bytes:
+        buf = BytesIO()
+        Image.effect_noise(size, 60).convert("RGB").save(buf, "PNG")
+        return buf.getvalue()
+
+    def test_images_are_downscaled_and_used_in_email(self):
+        req = make_request()
+        doc = make_document(req, name="foto certificado.png", content=self.photo())
+        self.assertIsNone(doc.processed_at)
+
+        self.assertEqual(process_pending(), 1)
+        doc.refresh_from_db()
+        self.assertIsNotNone(doc.processed_at)
+        self.assertLess(doc.optimized_file.size, doc.file.size)
+        with Image.open(doc.optimized_file.path) as im:
+            self.assertLessEqual(max(im.size), 400)
+        with Image.open(doc.thumbnail.path) as im:
+            self.assertLessEqual(max(im.size), 64)
+
+        self.client.post(reverse("finalize_request", args=[req.public_id]))
+        process_outbox()
+        internal = next(m for m in mail.outbox if "Novo pedido" in m.subject)
+        self.assertEqual([a[0] for a in internal.attachments], ["foto certificado.jpg"])
+
+        self.assertEqual(process_pending(), 0)
+
+    def test_replacing_the_file_reprocesses_the_document(self):
+        req = make_request()
+        doc = make_document(req, name="vermelho.png", content=self.photo())
+        process_pending()
+        doc.refresh_from_db()
+        old_variants = [doc.optimized_file.path, doc.thumbnail.path]
+
+        doc.file = SimpleUploadedFile("azul.png", self.photo(size=(1500, 1000)))
+        with self.captureOnCommitCallbacks(execute=True):
+            doc.save()
+        doc.refresh_from_db()
+        self.assertIsNone(doc.processed_at)
+        self.assertFalse(doc.optimized_file)
+        self.assertEqual(doc.attachment_file.name, doc.file.name)
+        self.assertFalse(any(os.path.exists(p) for p in old_variants))
+
+        self.assertEqual(process_pending(), 1)
+        doc.refresh_from_db()
+        self.assertEqual(doc.attachment_name, "azul.jpg")
+        with Image.open(doc.optimized_file.path) as im:
+            self.assertEqual(im.size, (400, 267))
+
+    def test_unreadable_files_are_marked_and_skipped(self):
+        req = make_request()
+        make_document(req, name="quebrada.jpg", content=b"nao e imagem")
+        with self.assertLogs("siteapp.services.document_processing", "WARNING"):
+            process_pending()
+        doc = req.documents.get()
+        self.assertTrue(doc.processing_error)
+        self.assertFalse(doc.optimized_file)
+
+
+    def test_workers_do_not_share_documents(self):
+        req = make_request()
+        for i in range(3):
+            make_document(req, name=f"d{i}.pdf", content=f"%PDF-1.4 {i}".encode())
+        first = document_processing.claim(2)
+        second = document_processing.claim(2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual([d.pk for d in second], [req.documents.order_by("-id").first().pk])
+        self.assertEqual(document_processing.claim(2), [])
+
+        # Worker que morreu: a reserva expira e o documento volta para a fila
+        LattesDocument.objects.filter(pk=first[0].pk).update(
+            processing_locked_at=timezone.now() - timedelta(seconds=document_processing.LOCK_SECONDS + 1)
+        )
+        again = document_processing.claim(2)
+        self.assertEqual([d.pk for d in again], [first[0].pk])
+        # O primeiro worker perdeu a reserva: o resultado dele não é gravado
+        document_processing._store(first[0], {"optimized": None, "thumbnail": None, "error": ""})
+        self.assertIsNone(LattesDocument.objects.get(pk=first[0].pk).processed_at)
+
+
+class PublicIdAllocationTests(TestCase):
+    def test_new_request_needs_no_existence_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            req = make_request()
+        # Contadores do painel ficam de fora: só interessa a tabela de pedidos
+        sql = [q["sql"].split()[0].upper() for q in ctx.captured_queries if "siteapp_lattesrequest" in q["sql"]]
+        self.assertNotIn("SELECT", sql)
+        self.assertEqual(sql.count("INSERT"), 1)
+        self.assertTrue(req.public_id.startswith("RPM-"))
+
+    def test_collision_is_retried_inside_a_savepoint(self):
+        existing = make_request()
+        codes = iter([existing.public_id, "RPM-NOVO2345"])
+        with mock.patch("siteapp.models.generate_public_id", side_effect=lambda: next(codes)):
+            req = make_request(email="outro@example.com")
+        self.assertEqual(req.public_id, "RPM-NOVO2345")
+        self.assertEqual(LattesRequest.objects.count(), 2)
+
+    def test_gives_up_when_every_code_is_taken(self):
+        existing = make_request()
+        with mock.patch("siteapp.models.generate_public_id", return_value=existing.public_id):
+            with self.assertRaises(RuntimeError):
+                make_request(email="outro@example.com")
+
+    @override_settings(PUBLIC_ID_POOL_ENABLED=True)
+    def test_reserved_pool_is_used_first(self):
+        ReservedPublicId.objects.create(public_id="RPM-POOL2345")
+        self.assertEqual(make_request().public_id, "RPM-POOL2345")
+        self.assertFalse(ReservedPublicId.objects.exists())
+        # Pool vazio: volta a sortear na hora
+        self.assertTrue(make_request(email="b@example.com").public_id.startswith("RPM-"))
+
+
+class PublicIdConcurrencyTests(TransactionTestCase):
+    """Vários threads criando pedidos ao mesmo tempo, sorteando num espaço pequeno para forçar colisões."""
+
+    THREADS = 6
+    PER_THREAD = 4
+    CODES = [f"RPM-T{n:03d}" for n in range(30)]
+
+    def test_concurrent_creation_yields_unique_codes(self):
+        rng = random.Random(9)
+        lock = threading.Lock()
+        draws = []
+
+        def small_space_id():
+            # 30 códigos para 24 pedidos: no fim quase todo sorteio já está em uso
+            with lock:
+                code = rng.choice(self.CODES)
+                draws.append(code)
+            return code
+
+        errors = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker(t):
+            try:
+                barrier.wait()
+                for i in range(self.PER_THREAD):
+                    for _ in range(50):
+                        try:
+                            make_request(email=f"t{t}-{i}@example.com")
+                            break
+                        except RuntimeError:
+                            continue
+            except Exception as e:  # pragma: no cover - reportado abaixo
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        with mock.patch("siteapp.models.generate_public_id", side_effect=small_space_id):
+            threads = [threading.Thread(target=worker, args=(t,)) for t in range(self.THREADS)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(errors, [])
+        codes = list(LattesRequest.objects.values_list("public_id", flat=True))
+        self.assertEqual(len(codes), self.THREADS * self.PER_THREAD)
+        self.assertEqual(len(set(codes)), len(codes))
+        # Cada sorteio além de um por pedido foi um INSERT recusado pela constraint e refeito
+        retries = len(draws) - len(codes)
+        self.assertGreaterEqual(retries, 5)
+
+
+class StatusLookupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.req = make_request(email="Maria.Silva@Example.com")
+
+    def lookup(self, public_id=None, email="maria.silva@example.com", ip="10.0.0.1"):
+        return self.client.post(
+            reverse("home"),
+            {"form_name": "lookup", "public_id": public_id or self.req.public_id, "email": email},
+            REMOTE_ADDR=ip,
+        )
+
+    def test_match_is_case_insensitive_and_cached(self):
+        resp = self.lookup(public_id=self.req.public_id.lower(), email=" MARIA.SILVA@example.com ")
+        self.assertEqual(resp.context["lookup_result"]["public_id"], self.req.public_id)
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(self.lookup().context["lookup_result"])
+
+    def test_wrong_email_is_not_found(self):
+        self.lookup()
+        resp = self.lookup(email="outra@example.com")
+        self.assertIsNone(resp.context["lookup_result"])
+        self.assertTrue(resp.context["lookup_error"])
+
+    def test_status_change_invalidates_cache(self):
+        self.assertEqual(self.lookup().context["lookup_result"]["status"], "NEW")
+        self.req.status = LattesRequest.Status.IN_PROGRESS
+        self.req.save()
+        self.assertEqual(self.lookup().context["lookup_result"]["status"], "IN_PROGRESS")
+
+    @override_settings(LOOKUP_RATE_LIMITS={"ip": (3, 60), "code": (100, 60)})
+    def test_rate_limited_per_ip(self):
+        for _ in range(3):
+            self.assertEqual(self.lookup().status_code, 200)
+        self.assertEqual(self.lookup().status_code, 429)
+        self.assertEqual(self.lookup(ip="10.0.0.2").status_code, 200)
+
+    @override_settings(LOOKUP_RATE_LIMITS={"ip": (100, 60), "code": (2, 600)})
+    def test_rate_limited_per_code(self):
+        for i in range(2):
+            self.lookup(email=f"chute{i}@example.com", ip=f"10.0.1.{i}")
+        self.assertEqual(self.lookup(ip="10.0.2.1").status_code, 429)
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.req = make_request()
+
+    async def test_upload_and_finalize_through_async_client(self):
+        url = reverse("upload_docs", args=[self.req.public_id])
+        resp = await self.async_client.post(
+            url, {"doc_type": "OTHER", "file": SimpleUploadedFile("a.pdf", b"%PDF-1.4 async")}
+        )
+        self.assertEqual(resp.status_code, 302)
+        resp = await self.async_client.get(url)
+        self.assertEqual(len(resp.context["documents"]), 1)
+
+        resp = await self.async_client.post(reverse("finalize_request", args=[self.req.public_id]))
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(await OutboundEmail.objects.filter(request=self.req).acount(), 2)
+
+    async def test_lookup_and_missing_request(self):
+        resp = await self.async_client.post(
+            reverse("home"), {"form_name": "lookup", "public_id": self.req.public_id, "email": self.req.email}
+        )
+        self.assertEqual(resp.context["lookup_result"]["documents_count"], 0)
+        resp = await self.async_client.get(reverse("upload_docs", args=["NAOEXISTE"]))
+        self.assertEqual(resp.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        admin_user = get_user_model().objects.create_superuser("admin", "admin@example.com", "senha-forte-123")
+        self.client.force_login(admin_user)
+
+    def create_orders(self, n: int):
+        for i in range(n):
+            req = make_request(full_name=f"Cliente Número {i}", email=f"c{i}@example.com", whatsapp=f"(11) 9{i:04d}-0000")
+            make_document(req, name=f"d{i}.pdf", content=f"%PDF {i}".encode())
+
+    def changelist_queries(self, model: str, params=None) -> int:
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse(f"admin:siteapp_{model}_changelist"), params or {})
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_document_changelist_has_no_n_plus_one(self):
+        self.create_orders(3)
+        few = self.changelist_queries("lattesdocument")
+        self.create_orders(20)
+        self.assertEqual(self.changelist_queries("lattesdocument"), few)
+
+    def test_request_changelist_query_count_is_constant(self):
+        self.create_orders(3)
+        few = self.changelist_queries("lattesrequest", {"status__exact": "NEW"})
+        self.create_orders(20)
+        self.assertEqual(self.changelist_queries("lattesrequest", {"status__exact": "NEW"}), few)
+
+    def test_search_uses_normalized_columns(self):
+        self.create_orders(3)
+        url = reverse("admin:siteapp_lattesrequest_changelist")
+
+        def found(term):
+            return [r.full_name for r in self.client.get(url, {"q": term}).context["cl"].result_list]
+
+        self.assertEqual(found("CLIENTE NUMERO 1"), ["Cliente Número 1"])
+        self.assertEqual(found("c2@EXAMPLE"), ["Cliente Número 2"])
+        self.assertEqual(found("11 90000"), ["Cliente Número 0"])
+        public_id = LattesRequest.objects.get(email="c1@example.com").public_id
+        self.assertEqual(found(public_id.lower()), ["Cliente Número 1"])
+        # Sobrenome (meio do nome) também no SQLite
+        self.assertEqual(found("numero 2"), ["Cliente Número 2"])
+
+    def test_document_search_includes_description(self):
+        self.create_orders(2)
+        LattesDocument.objects.filter(request__email="c1@example.com").update(description="Certificado de inglês")
+        resp = self.client.get(reverse("admin:siteapp_lattesdocument_changelist"), {"q": "inglês"})
+        self.assertEqual([d.request.email for d in resp.context["cl"].result_list], ["c1@example.com"])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ExportTests(TestCase):
+    def setUp(self):
+        self.req = make_request(full_name="José Ávila")
+        make_document(self.req, name="a.pdf", content=b"%PDF a")
+        make_document(self.req, name="b.pdf", content=b"%PDF b", doc_type=LattesDocument.DocType.COURSES)
+        make_document(self.req, name="c.pdf", content=b"%PDF c", doc_type=LattesDocument.DocType.COURSES)
+        self.done = make_request(email="outro@example.com", status=LattesRequest.Status.DONE)
+
+    def test_counts_are_aggregated_in_a_single_query(self):
+        for i in range(5):
+            make_document(make_request(email=f"x{i}@example.com"), name=f"x{i}.pdf", content=f"%PDF x{i}".encode())
+        with self.assertNumQueries(1):
+            lines = list(iter_export(export_queryset(), "jsonl", chunk_size=2))
+        rows = {r["public_id"]: r for r in map(json.loads, lines)}
+        self.assertEqual(len(rows), 7)
+        row = rows[self.req.public_id]
+        self.assertEqual((row["docs_total"], row["docs_grad_diploma"], row["docs_courses"]), (3, 1, 2))
+        self.assertEqual(row["full_name"], "José Ávila")
+        self.assertEqual(rows[self.done.public_id]["docs_total"], 0)
+
+    def test_command_filters_by_status_and_date(self):
+        out = StringIO()
+        call_command("export_requests", "--status", "DONE", stdout=out)
+        lines = out.getvalue().lstrip("\ufeff").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("public_id,full_name"))
+        self.assertIn(self.done.public_id, lines[1])
+
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        out = StringIO()
+        call_command("export_requests", "--format", "jsonl", "--since", tomorrow, stdout=out)
+        self.assertEqual(out.getvalue(), "")
+
+    def test_admin_action_streams_selected_rows(self):
+        admin_user = get_user_model().objects.create_superuser("admin", "admin@example.com", "senha-forte-123")
+        self.client.force_login(admin_user)
+        resp = self.client.post(
+            reverse("admin:siteapp_lattesrequest_changelist"),
+            {"action": "export_csv", "_selected_action": [self.req.pk]},
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        body = b"".join(resp.streaming_content).decode("utf-8")
+        self.assertIn(self.req.public_id, body)
+        self.assertNotIn(self.done.public_id, body)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, METRICS_TOKEN="segredo")
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        self.req = make_request()
+
+    def scrape(self) -> str:
+        resp = self.client.get(reverse("metrics"), headers={"Authorization": "Bearer segredo"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return resp.content.decode()
+
+    def test_records_duration_queries_templates_and_upload_size_per_view(self):
+        self.client.post(
+            reverse("upload_docs", args=[self.req.public_id]),
+            {"doc_type": "OTHER", "file": SimpleUploadedFile("a.pdf", b"%PDF-1.4 metrics")},
+        )
+        self.client.get(reverse("upload_docs", args=[self.req.public_id]))
+
+        text = self.scrape()
+        self.assertIn('siteapp_requests_total{status="302",view="upload_docs"} 1', text)
+        self.assertIn('siteapp_requests_total{status="200",view="upload_docs"} 1', text)
+        self.assertIn('siteapp_request_duration_seconds_count{view="upload_docs"} 2', text)
+        self.assertIn('siteapp_request_template_seconds_count{view="upload_docs"} 2', text)
+        self.assertIn('siteapp_request_body_bytes_count{view="upload_docs"} 1', text)
+        queries = next(line for line in text.splitlines() if line.startswith("siteapp_request_db_queries_sum"))
+        self.assertGreater(float(queries.split()[-1]), 0)
+        self.assertNotIn('view="metrics"', text)
+
+    @override_settings(SLOW_REQUEST_SECONDS=0)
+    def test_slow_requests_are_logged_with_queries(self):
+        with self.assertLogs("siteapp.slow_requests", "WARNING") as logs:
+            self.client.get(reverse("upload_docs", args=[self.req.public_id]))
+        self.assertIn("view=upload_docs", logs.output[0])
+        self.assertIn("siteapp_lattesrequest", logs.output[0])
+        self.assertIn('siteapp_slow_requests_total{view="upload_docs"} 1', self.scrape())
+
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+        self.scrape()
+
+    @override_settings(METRICS_TOKEN="")
+    def test_hidden_without_token_outside_debug(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+
+
+class TemplateCachingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(FRAGMENT_CACHE_SECONDS=60, DEPLOY_VERSION="v1")
+    def test_static_fragments_are_cached_per_deploy_version(self):
+        key = make_template_fragment_key("about_content", ["pt-br", "v1"])
+        self.assertIsNone(cache.get(key))
+        first = self.client.get(reverse("about")).content
+        self.assertIsNotNone(cache.get(key))
+        self.assertEqual(self.client.get(reverse("about")).content, first)
+
+        with override_settings(DEPLOY_VERSION="v2"):
+            self.client.get(reverse("about"))
+        self.assertIsNotNone(cache.get(make_template_fragment_key("about_content", ["pt-br", "v2"])))
+
+    @override_settings(FRAGMENT_CACHE_SECONDS=60)
+    def test_lookup_section_is_not_cached(self):
+        req = make_request()
+        self.client.get(reverse("home"))
+        resp = self.client.post(
+            reverse("home"), {"form_name": "lookup", "public_id": req.public_id, "email": req.email}
+        )
+        self.assertContains(resp, req.public_id)
+        self.assertContains(resp, "csrfmiddlewaretoken")
+
+    def test_email_templates_are_compiled_once(self):
+        templates = copy.deepcopy(settings.TEMPLATES)
+        templates[0]["OPTIONS"]["loaders"] = [("django.template.loaders.cached.Loader", settings.TEMPLATE_LOADERS)]
+        ctx = {"pedido": LattesRequest(public_id="RPM-TESTE001"), "documentos": [], "total_docs": 0}
+        with override_settings(TEMPLATES=templates):
+            email_templates.precompile()
+            with mock.patch.object(FilesystemLoader, "get_contents") as read:
+                for _ in range(3):
+                    html = email_templates.render_email("emails/confirmacao_cliente.html", ctx)
+        self.assertIn("RPM-TESTE001", html)
+        read.assert_not_called()
+
+
+class StaticPipelineTests(TestCase):
+    CSS = "body { background: url('../img/logo.png'); }\n" + ".bloco { margin: 0; padding: 0; }\n" * 40
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp(prefix="claraluz-static-src-")
+        self.root = tempfile.mkdtemp(prefix="claraluz-static-root-")
+        self.addCleanup(shutil.rmtree, self.source, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        os.makedirs(os.path.join(self.source, "css"))
+        with open(os.path.join(self.source, "css", "site.css"), "w") as f:
+            f.write(self.CSS)
+
+        overrides = override_settings(
+            DEBUG=False,
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[self.source],
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "siteapp.staticfiles.CompressedManifestStaticFilesStorage"},
+            },
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        call_command("collectstatic", interactive=False, verbosity=0, ignore_patterns=["admin"])
+
+    def test_collectstatic_hashes_and_precompresses(self):
+        url = static("css/site.css")
+        self.assertRegex(url, r"/static/css/site\.[0-9a-f]{12}\.css$")
+        hashed_path = os.path.join(self.root, url.removeprefix("/static/"))
+        self.assertTrue(os.path.exists(hashed_path + ".gz"))
+        # Imagem já comprimida não ganha .gz
+        self.assertFalse(os.path.exists(os.path.join(self.root, "img", "logo.png.gz")))
+        with open(hashed_path) as f:
+            self.assertRegex(f.read(), r"logo\.[0-9a-f]{12}\.png")
+
+    def test_serves_precompressed_with_immutable_cache(self):
+        client = self.client_class()
+        url = static("css/site.css")
+
+        resp = client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertEqual(resp["Cache-Control"], static_pipeline.IMMUTABLE_CACHE)
+        self.assertEqual(resp["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(b"".join(resp.streaming_content)).decode().count(".bloco"), 40)
+
+        plain = client.get(url)
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertEqual(int(plain["Content-Length"]), len(b"".join(plain.streaming_content)))
+        self.assertNotEqual(plain["ETag"], resp["ETag"])
+        self.assertEqual(client.get(url, headers={"If-None-Match": plain["ETag"]}).status_code, 304)
+
+        # Sem hash no nome: cache curto
+        self.assertEqual(client.get("/static/css/site.css")["Cache-Control"], static_pipeline.SHORT_CACHE)
+
+
+@override_settings(
+    MEDIA_ROOT=TEST_MEDIA_ROOT,
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+)
+class FinalizeStateTests(TestCase):
+    def setUp(self):
+        self.req = make_request()
+        make_document(self.req)
+        self.finalize_url = reverse("finalize_request", args=[self.req.public_id])
+        self.thank_you = f"{reverse('thank_you')}?code={self.req.public_id}"
+
+    def test_repeated_finalize_is_a_cheap_no_op(self):
+        self.assertRedirects(self.client.post(self.finalize_url), self.thank_you)
+        self.req.refresh_from_db()
+        self.assertEqual(self.req.status, LattesRequest.Status.FINALIZED)
+        self.assertIsNotNone(self.req.finalized_at)
+
+        # Só busca o pedido (+ sessão/mensagens); nada de documentos nem fila
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(self.finalize_url)
+        self.assertRedirects(resp, self.thank_you)
+        self.assertFalse([q for q in ctx.captured_queries if "outboundemail" in q["sql"] or "lattesdocument" in q["sql"]])
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+    def test_transition_only_from_new(self):
+        self.assertTrue(LattesRequest.mark_finalized(self.req.pk))
+        self.assertFalse(LattesRequest.mark_finalized(self.req.pk))
+        LattesRequest.objects.filter(pk=self.req.pk).update(status=LattesRequest.Status.DONE)
+        self.assertFalse(LattesRequest.mark_finalized(self.req.pk))
+
+    def test_uploads_are_locked_after_finalize(self):
+        self.client.post(self.finalize_url)
+        upload_url = reverse("upload_docs", args=[self.req.public_id])
+
+        self.assertRedirects(self.client.get(upload_url), self.thank_you)
+        resp = self.client.post(upload_url, {"doc_type": "OTHER", "file": SimpleUploadedFile("b.pdf", b"%PDF b")})
+        self.assertRedirects(resp, self.thank_you)
+
+        batch = self.client.post(
+            reverse("upload_docs_batch", args=[self.req.public_id]),
+            {"files": [SimpleUploadedFile("c.pdf", b"%PDF c")], "doc_type": ["OTHER"], "description": [""]},
+        )
+        self.assertEqual(batch.status_code, 409)
+        chunked = self.client.post(
+            reverse("chunked_upload_init", args=[self.req.public_id]),
+            {"doc_type": "OTHER", "filename": "d.pdf", "size": 10},
+        )
+        self.assertEqual(chunked.status_code, 409)
+        self.assertEqual(self.req.documents.count(), 1)
+
+    def test_finalize_during_upload_leaves_no_orphan_files(self):
+        blobs = os.path.join(TEST_MEDIA_ROOT, "lattes_docs", "blobs")
+        existing = self.req.documents.get()
+        before = {os.path.join(d, f) for d, _, files in os.walk(blobs) for f in files}
+
+        content = b"%PDF-1.4 parcial"
+        upload_id = self.client.post(
+            reverse("chunked_upload_init", args=[self.req.public_id]),
+            {"doc_type": "OTHER", "filename": "d.pdf", "size": len(content)},
+        ).json()["upload_id"]
+        self.client.put(
+            reverse("chunked_upload_chunk", args=[self.req.public_id, upload_id]),
+            content,
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET="0",
+        )
+
+        # O pedido foi finalizado depois da checagem inicial, enquanto o arquivo subia
+        with mock.patch.object(LattesRequest, "lock_open", return_value=False):
+            self.client.post(
+                reverse("upload_docs", args=[self.req.public_id]),
+                {"doc_type": "OTHER", "file": SimpleUploadedFile("b.pdf", b"%PDF orfao b")},
+            )
+            batch = self.client.post(
+                reverse("upload_docs_batch", args=[self.req.public_id]),
+                {
+                    "files": [SimpleUploadedFile("c.pdf", b"%PDF orfao c"), SimpleUploadedFile("e.pdf", b"%PDF-1.4 teste")],
+                    "doc_type": ["OTHER", "OTHER"],
+                    "description": ["", ""],
+                },
+            )
+            chunked = self.client.post(reverse("chunked_upload_complete", args=[self.req.public_id, upload_id]))
+
+        self.assertEqual((batch.status_code, chunked.status_code), (409, 409))
+        self.assertEqual(self.req.documents.count(), 1)
+        self.assertFalse(UploadSession.objects.exists())
+        after = {os.path.join(d, f) for d, _, files in os.walk(blobs) for f in files}
+        self.assertEqual(after, before)
+        # Mesmo conteúdo de um documento que já existe: o arquivo dele fica
+        self.assertTrue(existing.file.storage.exists(existing.file.name))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class DocumentDownloadTests(TestCase):
+    content = b"%PDF-1.4 " + bytes(range(256)) * 8
+
+    def setUp(self):
+        self.req = make_request()
+        self.doc = make_document(self.req, name="Diploma Final.pdf", content=self.content)
+        self.url = reverse("document_download", args=[self.req.public_id, self.doc.pk])
+
+    def test_full_download_with_hash_etag(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b"".join(resp.streaming_content), self.content)
+        self.assertEqual(resp["ETag"], f'"{self.doc.sha256}"')
+        self.assertEqual(resp["Accept-Ranges"], "bytes")
+        self.assertEqual(resp["Content-Type"], "application/pdf")
+        self.assertIn('filename="Diploma Final.pdf"', resp["Content-Disposition"])
+        self.assertTrue(resp["Content-Disposition"].startswith("inline"))
+
+    def test_other_request_code_gets_404(self):
+        other = make_request(email="outra@example.com")
+        resp = self.client.get(reverse("document_download", args=[other.public_id, self.doc.pk]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_if_none_match(self):
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.doc.sha256}"')
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+
+    def test_ranges(self):
+        resp = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b"".join(resp.streaming_content), self.content[10:20])
+        self.assertEqual(resp["Content-Range"], f"bytes 10-19/{len(self.content)}")
+        self.assertEqual(resp["Content-Length"], "10")
+
+        resp = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(resp.streaming_content), self.content[-5:])
+
+        resp = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.content)}-")
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp["Content-Range"], f"bytes */{len(self.content)}")
+
+        # If-Range de outra versão: arquivo inteiro
+        resp = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"outra"')
+        self.assertEqual(resp.status_code, 200)
+
+    async def test_asgi_reads_the_file_block_by_block(self):
+        content = os.urandom(600 * 1024)
+        doc = await sync_to_async(make_document)(self.req, name="grande.pdf", content=content)
+        url = reverse("document_download", args=[self.req.public_id, doc.pk])
+
+        resp = await self.async_client.get(url)
+        self.assertTrue(resp.is_async)
+        self.assertEqual(resp["Content-Length"], str(len(content)))
+        stream = aiter(resp.streaming_content)
+        first = await anext(stream)
+        # Blocos grandes: cada um é uma ida à thread
+        self.assertEqual(len(first), document_download.ASGI_BLOCK)
+        self.assertEqual(first + b"".join([chunk async for chunk in stream]), content)
+
+        resp = await self.async_client.get(url, headers={"Range": "bytes=100-9099"})
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b"".join([chunk async for chunk in resp.streaming_content]), content[100:9100])
+
+    @override_settings(DOCUMENT_SENDFILE="nginx", DOCUMENT_ACCEL_PREFIX="/protected-media/")
+    def test_accel_redirect(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["X-Accel-Redirect"], "/protected-media/" + self.doc.file.name)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(resp["ETag"], f'"{self.doc.sha256}"')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+class UploadHandlerTests(TestCase):
+    def setUp(self):
+        self.req = make_request()
+        self.tmp = tempfile.mkdtemp(prefix="claraluz-test-upload-")
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+
+    def post(self, name, files, **data):
+        with override_settings(FILE_UPLOAD_TEMP_DIR=self.tmp):
+            return self.client.post(reverse(name, args=[self.req.public_id]), {**data, **files})
+
+    def test_oversized_file_is_cut_off_while_streaming(self):
+        with mock.patch("siteapp.forms.MAX_FILE_MB", 1), mock.patch(
+            "siteapp.upload_handlers.DocumentUploadHandler.handle_raw_input", return_value=None
+        ):
+            # Content-Length não ajuda aqui: a contagem de bytes é que corta
+            resp = self.post(
+                "upload_docs",
+                {"file": SimpleUploadedFile("grande.pdf", b"%PDF-1.4 " + b"0" * (2 * 1024 * 1024))},
+                doc_type="OTHER",
+            )
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("grande.pdf: Arquivo muito grande", resp.content.decode())
+        self.assertFalse(self.req.documents.exists())
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_content_length_over_limit(self):
+        with mock.patch("siteapp.forms.MAX_FILE_MB", 1), mock.patch(
+            "siteapp.upload_handlers.DocumentUploadHandler.receive_data_chunk"
+        ) as receive:
+            resp = self.post(
+                "upload_docs",
+                {"file": SimpleUploadedFile("grande.pdf", b"%PDF-1.4 " + b"0" * (3 * 1024 * 1024))},
+                doc_type="OTHER",
+            )
+        # Recusado pelo cabeçalho, sem ler nenhum byte do arquivo
+        receive.assert_not_called()
+        self.assertIn("grande.pdf: Arquivo muito grande", resp.content.decode())
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_renamed_executable_is_rejected_by_magic_bytes(self):
+        resp = self.post(
+            "upload_docs_batch",
+            {"files": [SimpleUploadedFile("ok.pdf", b"%PDF-1.4 ok"), SimpleUploadedFile("setup.pdf", b"MZ\x90\x00" * 100)]},
+            doc_type=["OTHER", "OTHER"],
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(len(resp.json()["errors"]), 1)
+        self.assertIn("setup.pdf: O conteúdo do arquivo", resp.json()["errors"][0])
+        self.assertFalse(self.req.documents.exists())
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_images_pass_with_any_image_extension(self):
+        png = b"\x89PNG\r\n\x1a\n" + b"\0" * 32
+        resp = self.post("upload_docs_batch", {"files": [SimpleUploadedFile("foto.jpg", png)]}, doc_type=["OTHER"])
+        self.assertEqual(resp.status_code, 201)
+
+    def test_chunked_first_part_is_sniffed(self):
+        init = self.client.post(
+            reverse("chunked_upload_init", args=[self.req.public_id]),
+            {"doc_type": "OTHER", "filename": "doc.pdf", "size": 100},
+        )
+        url = reverse("chunked_upload_chunk", args=[self.req.public_id, init.json()["upload_id"]])
+        resp = self.client.put(url, b"\x7fELF" + b"\0" * 46, content_type="application/octet-stream", HTTP_UPLOAD_OFFSET="0")
+        self.assertEqual((resp.status_code, resp.json()["offset"]), (415, 0))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class DocumentZipTests(TestCase):
+    def setUp(self):
+        self.req = make_request()
+        make_document(self.req, name="diploma.pdf", content=b"%PDF diploma")
+        make_document(self.req, name="diploma.pdf", content=b"%PDF outro diploma")
+        make_document(self.req, name="certificado.txt", content=b"texto " * 500, doc_type=LattesDocument.DocType.COURSES)
+        self.other = make_request(email="outra@example.com")
+        make_document(self.other, name="foto.jpg", content=b"\xff\xd8\xff" + b"1" * 100)
+        self.client.force_login(
+            get_user_model().objects.create_superuser("admin", "admin@example.com", "senha-forte-123")
+        )
+
+    def open_zip(self, resp) -> zipfile.ZipFile:
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        return zipfile.ZipFile(BytesIO(b"".join(resp.streaming_content)))
+
+    def test_action_streams_folders_per_order_and_type(self):
+        resp = self.client.post(
+            reverse("admin:siteapp_lattesrequest_changelist"),
+            {"action": "download_documents_zip", "_selected_action": [self.req.pk, self.other.pk]},
+        )
+        zf = self.open_zip(resp)
+        self.assertIsNone(zf.testzip())
+        names = sorted(zf.namelist())
+        self.assertEqual(names, sorted([
+            f"{self.req.public_id}/COURSES/certificado.txt",
+            f"{self.req.public_id}/GRAD_DIPLOMA/diploma.pdf",
+            f"{self.req.public_id}/GRAD_DIPLOMA/diploma-1.pdf",
+            f"{self.other.public_id}/GRAD_DIPLOMA/foto.jpg",
+        ]))
+        self.assertEqual(zf.getinfo(f"{self.other.public_id}/GRAD_DIPLOMA/foto.jpg").compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(zf.getinfo(f"{self.req.public_id}/COURSES/certificado.txt").compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(zf.read(f"{self.req.public_id}/COURSES/certificado.txt"), b"texto " * 500)
+
+    def test_single_order_view(self):
+        url = reverse("admin:siteapp_lattesrequest_documents_zip", args=[self.req.pk])
+        resp = self.client.get(url)
+        self.assertIn(f'filename="{self.req.public_id}-documentos.zip"', resp["Content-Disposition"])
+        self.assertEqual(len(self.open_zip(resp).namelist()), 3)
+        change = self.client.get(reverse("admin:siteapp_lattesrequest_change", args=[self.req.pk]))
+        self.assertContains(change, url)
+
+    async def test_asgi_streams_while_the_zip_is_generated(self):
+        produced, original = [], document_zip.iter_zip
+
+        def counting(*args, **kwargs):
+            for chunk in original(*args, **kwargs):
+                produced.append(len(chunk))
+                yield chunk
+
+        await self.async_client.aforce_login(await get_user_model().objects.aget(username="admin"))
+        url = reverse("admin:siteapp_lattesrequest_documents_zip", args=[self.req.pk])
+        with mock.patch.object(document_zip, "iter_zip", counting):
+            resp = await self.async_client.get(url)
+            self.assertTrue(resp.is_async)
+            stream = aiter(resp.streaming_content)
+            first = await anext(stream)
+            # Só o primeiro bloco foi gerado até aqui: o resto vem sob demanda
+            self.assertEqual(len(produced), 1)
+            body = first + b"".join([chunk async for chunk in stream])
+        self.assertGreater(len(produced), 1)
+        self.assertEqual(len(zipfile.ZipFile(BytesIO(body)).namelist()), 3)
+
+
+class StatusStreamTests(TestCase):
+    def setUp(self):
+        self.req = make_request()
+        self.url = status_stream_url(self.req.public_id)
+
+    def test_token_is_required(self):
+        base = reverse("status_stream", args=[self.req.public_id])
+        self.assertEqual(self.client.get(base).status_code, 404)
+        self.assertEqual(self.client.get(base + "?token=errado").status_code, 404)
+        other = make_request(email="outra@example.com")
+        wrong = f"{reverse('status_stream', args=[other.public_id])}?token={status_token(self.req.public_id)}"
+        self.assertEqual(self.client.get(wrong).status_code, 404)
+
+    def test_wsgi_sends_current_status_and_closes(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        body = b"".join(resp.streaming_content).decode()
+        self.assertTrue(body.startswith("retry: "))
+        self.assertIn('"status": "NEW"', body)
+
+    def test_saving_a_request_publishes_after_commit(self):
+        with mock.patch.object(status_notifier, "publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.req.status = LattesRequest.Status.IN_PROGRESS
+                self.req.save()
+        publish.assert_called_once_with(self.req.public_id, LattesRequest.Status.IN_PROGRESS)
+
+    async def test_asgi_stream_pushes_changes(self):
+        resp = await self.async_client.get(self.url)
+        stream = aiter(resp.streaming_content)
+        self.assertIn(b'"status": "NEW"', await anext(stream))
+
+        pending = asyncio.ensure_future(anext(stream))
+        for _ in range(100):
+            if status_notifier.connections():
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(status_notifier.connections(), 1)
+
+        # De outra thread, como faz o post_save numa view síncrona
+        threading.Thread(
+            target=status_notifier.publish, args=(self.req.public_id, LattesRequest.Status.DONE)
+        ).start()
+        self.assertIn(b'"status": "DONE"', await asyncio.wait_for(pending, 2))
+
+        # Status final: o servidor encerra e libera a inscrição
+        with self.assertRaises(StopAsyncIteration):
+            await anext(stream)
+        self.assertEqual(status_notifier.connections(), 0)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.cold = tempfile.mkdtemp(prefix="claraluz-test-cold-")
+        self.addCleanup(shutil.rmtree, self.cold, True)
+        settings_override = override_settings(ARCHIVE_ROOT=self.cold, ARCHIVE_AFTER_DAYS=90)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.old = make_request(status=LattesRequest.Status.DONE)
+        self.own = make_document(self.old, name="diploma.pdf", content=b"%PDF-1.4 so deste pedido " * 100)
+        self.shared = make_document(self.old, name="rg.jpg", content=b"\xff\xd8\xff compartilhado")
+        active = make_request(email="ativo@example.com")
+        make_document(active, name="rg.jpg", content=b"\xff\xd8\xff compartilhado")
+        make_request(email="recente@example.com", status=LattesRequest.Status.DONE)
+        LattesRequest.objects.filter(pk__in=[self.old.pk, active.pk]).update(
+            updated_at=timezone.now() - timedelta(days=200)
+        )
+
+    def archive(self, *args) -> str:
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("archive_requests", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_reports_only_bytes_that_leave_hot_storage(self):
+        output = self.archive("--dry-run")
+        self.assertIn("Simulação: 1 pedidos, 2 documentos", output)
+        report = archive_service.plan(archive_service.candidates())
+        # O blob compartilhado com o pedido ativo continua no disco
+        self.assertEqual(report.reclaimable_bytes, self.own.file.size)
+        self.assertEqual(report.archived_bytes, self.own.file.size + self.shared.file.size)
+        self.assertFalse(LattesDocument.objects.exclude(archive_member="").exists())
+
+    def test_archive_and_restore_on_access(self):
+        own_path, shared_path = self.own.file.path, self.shared.file.path
+        self.assertIn("Arquivados: 1 pedidos, 2 documentos", self.archive())
+
+        self.old.refresh_from_db()
+        self.assertIsNotNone(self.old.archived_at)
+        self.assertEqual(self.old.archive_lock, "")
+        self.assertTrue(os.path.exists(archive_service.archive_path(self.old.archive_name)))
+        self.assertFalse(os.path.exists(own_path))
+        self.assertTrue(os.path.exists(shared_path))
+        self.assertFalse(DocumentBlob.objects.filter(sha256=self.own.sha256).exists())
+        self.assertEqual(DocumentBlob.objects.get(sha256=self.shared.sha256).ref_count, 1)
+        # Segunda execução não tem o que fazer
+        self.assertIn("Arquivados: 0 pedidos", self.archive())
+
+        # O zip do admin lê direto do arquivo frio
+        zf = zipfile.ZipFile(BytesIO(b"".join(iter_zip(documents_for(LattesRequest.objects.filter(pk=self.old.pk))))))
+        self.assertEqual(zf.read(f"{self.old.public_id}/GRAD_DIPLOMA/diploma.pdf"), b"%PDF-1.4 so deste pedido " * 100)
+        self.assertFalse(os.path.exists(own_path))
+
+        resp = self.client.get(reverse("document_download", args=[self.old.public_id, self.own.pk]))
+        self.assertEqual(b"".join(resp.streaming_content), b"%PDF-1.4 so deste pedido " * 100)
+        self.own.refresh_from_db()
+        self.assertEqual(self.own.archive_member, "")
+        self.assertEqual(DocumentBlob.objects.get(sha256=self.own.sha256).ref_count, 1)
+
+    def test_empty_archive_root_falls_back_to_the_default(self):
+        with override_settings(ARCHIVE_ROOT=""):
+            self.assertEqual(
+                archive_service.archive_path("2024/X.zip"), os.path.join(settings.BASE_DIR, "cold_storage", "2024/X.zip")
+            )
+
+    def test_claims_do_not_overlap(self):
+        first = archive_service.claim(None, 10)
+        self.assertEqual([r.pk for r in first], [self.old.pk])
+        self.assertEqual(archive_service.claim(None, 10), [])
+        # Reserva abandonada (processo morreu) volta a ficar disponível
+        LattesRequest.objects.filter(pk=self.old.pk).update(archive_locked_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(len(archive_service.claim(None, 10)), 1)
+        self.assertIsNone(archive_service.archive_request(first[0]))
+
+    def test_restored_document_is_archived_again(self):
+        self.archive()
+        own_path = self.own.file.path
+        self.client.get(reverse("document_download", args=[self.old.public_id, self.own.pk]))
+        self.old.refresh_from_db()
+        self.assertIsNone(self.old.archived_at)
+        # Acabou de ser aberto: conta ARCHIVE_AFTER_DAYS de novo
+        self.assertIn("Arquivados: 0 pedidos", self.archive())
+
+        LattesRequest.objects.filter(pk=self.old.pk).update(updated_at=timezone.now() - timedelta(days=200))
+        self.assertIn("Arquivados: 1 pedidos, 1 documentos", self.archive())
+        self.assertFalse(os.path.exists(own_path))
+        self.own.refresh_from_db()
+        self.shared.refresh_from_db()
+        self.assertNotEqual(self.own.archive_member, "")
+        # O membro que continuava arquivado passou para o .zip regravado
+        self.old.refresh_from_db()
+        with zipfile.ZipFile(archive_service.archive_path(self.old.archive_name)) as zf:
+            self.assertEqual(sorted(zf.namelist()), sorted([self.own.archive_member, self.shared.archive_member]))
+            self.assertEqual(zf.read(self.shared.archive_member), b"\xff\xd8\xff compartilhado")
+
+    def test_reopened_request_is_not_archived(self):
+        (claimed,) = archive_service.claim(None, 10)
+        LattesRequest.objects.filter(pk=self.old.pk).update(status=LattesRequest.Status.IN_PROGRESS)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(archive_service.archive_request(claimed))
+        self.old.refresh_from_db()
+        self.assertIsNone(self.old.archived_at)
+        self.assertEqual(self.old.archive_lock, "")
+        self.assertFalse(LattesDocument.objects.exclude(archive_member="").exists())
+        # O .zip gravado antes de conferir o status foi apagado
+        archive_name = f"{timezone.localtime(self.old.created_at):%Y}/{self.old.public_id}.zip"
+        self.assertFalse(os.path.exists(archive_service.archive_path(archive_name)))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.soon = make_request(deadline=self.today + timedelta(days=3))
+        self.late = make_request(email="atrasado@example.com", deadline=self.today - timedelta(days=1))
+        make_request(email="pronto@example.com", status=LattesRequest.Status.DONE, deadline=self.today)
+        make_document(self.soon)
+        make_document(self.soon, name="curso.pdf", doc_type=LattesDocument.DocType.COURSES)
+
+    def counts(self, section: str) -> dict:
+        return {row["value"]: row["count"] for row in dashboard(self.today)[section]}
+
+    def test_counters_follow_saves_and_deletes(self):
+        self.assertEqual(self.counts("statuses")["NEW"], 2)
+        self.assertEqual(self.counts("statuses")["DONE"], 1)
+        # Pedido concluído não entra nos prazos
+        self.assertEqual(
+            self.counts("deadlines"), {"overdue": 1, "this_week": 1, "next_week": 0, "later": 0, "none": 0}
+        )
+        self.assertEqual(self.counts("doc_types")["GRAD_DIPLOMA"], 1)
+
+        self.late.deadline = self.today + timedelta(days=10)
+        self.late.status = LattesRequest.Status.IN_PROGRESS
+        self.late.save()
+        self.assertTrue(LattesRequest.mark_finalized(self.soon.pk))
+        doc = LattesDocument.objects.get(doc_type="COURSES")
+        doc.doc_type = LattesDocument.DocType.EVENTS
+        doc.save()
+        self.assertEqual(self.counts("statuses"), {"NEW": 0, "FINALIZED": 1, "IN_PROGRESS": 1, "DONE": 1})
+        self.assertEqual(self.counts("deadlines")["next_week"], 1)
+        self.assertEqual(self.counts("doc_types")["EVENTS"], 1)
+        self.assertEqual(self.counts("doc_types")["COURSES"], 0)
+
+        # Delete em cascata desconta o pedido e os documentos
+        LattesRequest.objects.filter(pk=self.soon.pk).delete()
+        self.assertEqual(dashboard(self.today)["total_documents"], 0)
+        self.assertEqual(self.counts("deadlines")["this_week"], 0)
+        self.assertEqual(rebuild_dashboard(), {})
+
+    def test_rebuild_fixes_drift(self):
+        # update() em massa não passa pelos hooks
+        LattesRequest.objects.update(status=LattesRequest.Status.DONE)
+        out = StringIO()
+        call_command("rebuild_dashboard", stdout=out)
+        self.assertIn("status:NEW 2 -> 0", out.getvalue())
+        self.assertEqual(self.counts("statuses")["DONE"], 3)
+        self.assertEqual(sum(self.counts("deadlines").values()), 0)
+        self.assertFalse(DashboardCounter.objects.filter(value=0).exists())
+
+    def test_admin_page_uses_constant_queries(self):
+        self.client.force_login(
+            get_user_model().objects.create_superuser("admin", "admin@example.com", "senha-forte-123")
+        )
+        url = reverse("admin:siteapp_lattesrequest_dashboard")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as few:
+            resp = self.client.get(url)
+        for i in range(20):
+            make_document(make_request(email=f"p{i}@example.com", deadline=self.today), name=f"d{i}.pdf")
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(few), len(many))
+        self.assertContains(resp, "Vence em até 7 dias")
+        self.assertFalse([q for q in many.captured_queries if "siteapp_lattesdocument" in q["sql"]])
@@ -0,0 +1,110 @@
+"""Upload handler dos documentos: recusa o arquivo enquanto ele ainda está chegando.
+
+Os handlers padrão do Django só entregam o arquivo depois de receber o corpo inteiro
+(e gravá-lo em /tmp); aí o ``LattesDocumentForm`` descobre que tinha 800 MB ou que era
+um .exe renomeado. Este handler vem antes deles na lista, conta os bytes e confere os
+magic bytes do começo de cada arquivo; ao recusar, interrompe a leitura do corpo
+(``StopUpload(connection_reset=True)``) e o Django fecha, e apaga, o temporário em curso.
+"""
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django import forms as django_forms
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+from . import forms
+
+# Folga para os campos de texto do formulário além do(s) arquivo(s)
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+class DocumentUploadHandler(FileUploadHandler):
+    """Mensagens das recusas ficam em ``request.upload_rejections`` ("nome: motivo")."""
+
+    def __init__(self, request=None, max_files: int = 1):
+        super().__init__(request)
+        self.max_request_bytes = max_files * forms.max_file_bytes() + FORM_OVERHEAD_BYTES
+        self.too_large = False
+        request.upload_rejections = []
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Content-Length já denuncia: recusa no primeiro arquivo, antes de ler o conteúdo
+        self.too_large = content_length > self.max_request_bytes
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.head = b""
+        self.checked = False
+        if self.too_large:
+            self._reject(f"Arquivo muito grande. Máximo: {forms.MAX_FILE_MB}MB.")
+        self._validate(size=0)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > forms.max_file_bytes():
+            self._validate(size=self.received)
+        if not self.checked:
+            self.head += raw_data[: forms.SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= forms.SNIFF_BYTES:
+                self._validate(size=self.received, head=self.head)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not self.checked:
+            # Arquivo menor que SNIFF_BYTES
+            self._validate(size=file_size, head=self.head)
+        # Quem monta o arquivo são os handlers seguintes (memória ou temporário)
+        return None
+
+    def _validate(self, size: int, head: bytes | None = None):
+        try:
+            forms.validate_document_file(self.file_name, size, head)
+        except django_forms.ValidationError as e:
+            self._reject(" ".join(e.messages))
+        if head is not None:
+            self.checked = True
+
+    def _reject(self, message: str):
+        self.request.upload_rejections.append(f"{self.file_name}: {message}")
+        raise StopUpload(connection_reset=True)
+
+
+def document_upload(max_files: int = 1):
+    """Decora views que recebem documentos por multipart.
+
+    O CsrfViewMiddleware lê ``request.POST`` antes da view (com os handlers padrão),
+    então a view fica csrf_exempt e a checagem de CSRF roda depois de instalar o handler,
+    como recomenda a documentação do Django.
+    """
+
+    def decorator(view):
+        protected = csrf_protect(view)
+
+        def install(request):
+            if request.method == "POST":
+                request.upload_handlers.insert(0, DocumentUploadHandler(request, max_files=max_files))
+
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                install(request)
+                if request.method == "POST":
+                    # Lê o multipart numa thread, não no event loop
+                    await sync_to_async(lambda: request.POST)()
+                return await protected(request, *args, **kwargs)
+
+        else:
+
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                install(request)
+                return protected(request, *args, **kwargs)
+
+        return csrf_exempt(wrapper)
+
+    return decorator
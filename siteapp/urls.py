@@ -5,7 +5,19 @@ urlpatterns = [
     path("", views.home, name="home"),
     path("request/", views.request_lattes, name="request_lattes"),
     path("request/<str:public_id>/upload/", views.upload_docs, name="upload_docs"),
+    path("request/<str:public_id>/upload/batch/", views.upload_docs_batch, name="upload_docs_batch"),
+    path("request/<str:public_id>/upload/chunked/", views.chunked_upload_init, name="chunked_upload_init"),
+    path("request/<str:public_id>/upload/chunked/<uuid:upload_id>/", views.chunked_upload_chunk, name="chunked_upload_chunk"),
+    path(
+        "request/<str:public_id>/upload/chunked/<uuid:upload_id>/complete/",
+        views.chunked_upload_complete,
+        name="chunked_upload_complete",
+    ),
+    path("request/<str:public_id>/status/stream/", views.status_stream, name="status_stream"),
     path("request/<str:public_id>/finalize/", views.finalize_request, name="finalize_request"),
+    path("request/<str:public_id>/docs/<int:doc_id>/", views.document_download, name="document_download"),
+    path("docs/<str:token>/", views.document_link_download, name="document_link"),
     path("sobre/", views.about, name="about"),
     path("ty/", views.thank_you, name="thank_you"),
+    path("metrics", views.metrics, name="metrics"),
 ]
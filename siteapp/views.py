@@ -1,20 +1,44 @@
 import os
+import secrets
+from collections import Counter
 
+from asgiref.sync import sync_to_async
+from django import forms
 from django.conf import settings
 from django.contrib import messages
-from django.shortcuts import render, redirect, get_object_or_404
-from django.template.loader import render_to_string
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.views.decorators.http import require_http_methods, require_POST
 
-from .forms import LattesRequestForm, LattesDocumentForm, LattesRequestLookupForm
-from .models import LattesRequest
-from .services.sendgrid_email import send_email, file_to_sendgrid_attachment
+from .forms import (
+    LattesRequestForm,
+    LattesDocumentForm,
+    LattesRequestLookupForm,
+    ChunkedUploadInitForm,
+    LattesDocumentBatchForm,
+)
+from .models import LattesRequest, LattesDocument, UploadSession, DocumentBlob, DashboardCounter
+from .services.email_templates import render_email
+from .services.attachment_policy import plan_internal_email, document_link, document_id_from_token
+from .services import chunked_upload
+from .services.archive import restore_document
+from .services.document_download import serve_document
+from .services.lookup import afind_request, alookup_allowed, invalidate_lookup
+from .services import metrics as request_metrics
+from .services.outbox import enqueue_email
+from .services.status_events import event_stream, first_event, status_changed, status_stream_url, valid_token
+from .upload_handlers import document_upload
 from django.urls import reverse
 
 
-def home(request):
+async def home(request):
     lookup_form = LattesRequestLookupForm()
     lookup_result = None
     lookup_error = None
+    status = 200
 
     if request.method == "POST" and request.POST.get("form_name") == "lookup":
         lookup_form = LattesRequestLookupForm(request.POST)
@@ -22,15 +46,22 @@ def home(request):
             public_id = lookup_form.cleaned_data["public_id"]
             email = (lookup_form.cleaned_data["email"] or "").strip()
 
-            try:
-                lookup_result = LattesRequest.objects.get(public_id=public_id, email__iexact=email)
-            except LattesRequest.DoesNotExist:
-                lookup_error = "Pedido não encontrado. Confira o código e o e-mail."
+            if not await alookup_allowed(request, public_id):
+                lookup_error = "Muitas consultas seguidas. Aguarde alguns minutos e tente novamente."
+                status = 429
+            else:
+                lookup_result = await afind_request(public_id, email)
+                if lookup_result is None:
+                    lookup_error = "Pedido não encontrado. Confira o código e o e-mail."
+                else:
+                    # Fora do cache: o link assinado é da página, não do resultado da consulta
+                    lookup_result = {**lookup_result, "stream_url": status_stream_url(public_id)}
 
     return render(
         request,
         "home.html",
         {"lookup_form": lookup_form, "lookup_result": lookup_result, "lookup_error": lookup_error},
+        status=status,
     )
 
 
@@ -47,73 +78,299 @@ def create_request(request):
     return render(request, "request.html", {"form": form})
 
 
-def upload_docs(request, public_id: str):
-    lattes_request = get_object_or_404(LattesRequest, public_id=public_id)
+CLOSED_MESSAGE = "Este pedido já foi finalizado; não é possível enviar novos documentos."
 
-    if request.method == "POST":
-        form = LattesDocumentForm(request.POST, request.FILES)
-        if form.is_valid():
-            doc = form.save(commit=False)
-            doc.request = lattes_request
+
+def _finalized_redirect(lattes_request):
+    return redirect(f"{reverse('thank_you')}?code={lattes_request.public_id}")
+
+
+def _closed_json() -> JsonResponse:
+    return JsonResponse({"error": CLOSED_MESSAGE}, status=409)
+
+
+def _save_uploaded_document(request, lattes_request) -> tuple[LattesDocumentForm, bool | None]:
+    # Síncrono: lê o multipart e grava o arquivo (roda fora do event loop).
+    # Devolve saved=None se o pedido foi finalizado enquanto o arquivo subia.
+    form = LattesDocumentForm(request.POST, request.FILES)
+    rejections = getattr(request, "upload_rejections", None)
+    if not form.is_valid() or rejections:
+        if rejections:
+            # Recusado pelo DocumentUploadHandler no meio do envio: o arquivo nem chegou
+            form.errors["file"] = form.error_class(rejections)
+        return form, False
+    doc = form.save(commit=False)
+    doc.request = lattes_request
+    doc.store_file()
+    with transaction.atomic():
+        saved = LattesRequest.lock_open(lattes_request.pk)
+        if saved:
             doc.save()
+    if not saved:
+        # O arquivo foi gravado antes da trava e ficou sem documento
+        DocumentBlob.discard_unreferenced([doc.file.name])
+        return form, None
+    return form, True
+
+
+@document_upload()
+async def upload_docs(request, public_id: str):
+    lattes_request = await aget_object_or_404(LattesRequest, public_id=public_id)
+
+    if not lattes_request.accepts_uploads:
+        if request.method == "POST":
+            messages.info(request, CLOSED_MESSAGE)
+        return _finalized_redirect(lattes_request)
+
+    if request.method == "POST":
+        form, saved = await sync_to_async(_save_uploaded_document)(request, lattes_request)
+        if saved is None:
+            messages.info(request, CLOSED_MESSAGE)
+            return _finalized_redirect(lattes_request)
+        if saved:
             return redirect("upload_docs", public_id=lattes_request.public_id)
     else:
         form = LattesDocumentForm()
 
-    documents = lattes_request.documents.order_by("-uploaded_at")
+    documents = [d async for d in lattes_request.documents.order_by("-uploaded_at")]
     return render(
         request,
         "upload.html",
         {"req": lattes_request, "form": form, "documents": documents},
     )
 
-def finalize_request(request, public_id: str):
+def _document_json(doc: LattesDocument, public_id: str) -> dict:
+    return {
+        "id": doc.pk,
+        "doc_type": doc.doc_type,
+        "doc_type_display": doc.get_doc_type_display(),
+        "description": doc.description,
+        "url": reverse("document_download", args=[public_id, doc.pk]),
+    }
+
+
+@require_POST
+@document_upload(max_files=LattesDocumentBatchForm.MAX_FILES)
+def upload_docs_batch(request, public_id: str):
     lattes_request = get_object_or_404(LattesRequest, public_id=public_id)
+    if not lattes_request.accepts_uploads:
+        return _closed_json()
 
-    if request.method != "POST":
-        return redirect("upload_docs", public_id=public_id)
+    form = LattesDocumentBatchForm(request.POST, request.FILES)
+    if request.upload_rejections:
+        # Recusado no meio do envio (request.POST acima é que lê o corpo)
+        return JsonResponse({"errors": request.upload_rejections}, status=400)
+    if not form.is_valid():
+        # Tudo ou nada: nenhum arquivo é salvo se algum for inválido
+        return JsonResponse({"errors": form.non_field_errors()}, status=400)
+
+    docs = []
+    for f, doc_type, description in form.cleaned_data["items"]:
+        doc = LattesDocument(request=lattes_request, doc_type=doc_type, description=description, file=f)
+        # bulk_create não chama save(): grava o arquivo e o hash aqui
+        doc.store_file()
+        docs.append(doc)
+
+    with transaction.atomic():
+        accepted = LattesRequest.lock_open(lattes_request.pk)
+        if accepted:
+            docs = LattesDocument.objects.bulk_create(docs)
+            DocumentBlob.add_references(docs)
+            DashboardCounter.apply(Counter((DashboardCounter.Kind.DOC_TYPE, d.doc_type) for d in docs))
+    if not accepted:
+        DocumentBlob.discard_unreferenced(d.file.name for d in docs)
+        return _closed_json()
+    # bulk_create não dispara post_save
+    invalidate_lookup(lattes_request.public_id)
+
+    return JsonResponse(
+        {
+            "created": [_document_json(d, lattes_request.public_id) for d in docs],
+            "total": lattes_request.documents.count(),
+        },
+        status=201,
+    )
+
+
+def _upload_error(e: chunked_upload.ChunkedUploadError) -> JsonResponse:
+    return JsonResponse({"error": str(e), "offset": e.offset}, status=e.status)
 
-    internal_to_email = os.getenv("CLIENT_EMAIL") or settings.DEFAULT_FROM_EMAIL
-    customer_email = lattes_request.email
-    customer_reply_to = os.getenv("DEFAULT_REPLY_TO") or internal_to_email
 
-    docs = lattes_request.documents.order_by("uploaded_at")
+@require_POST
+def chunked_upload_init(request, public_id: str):
+    lattes_request = get_object_or_404(LattesRequest, public_id=public_id)
+    if not lattes_request.accepts_uploads:
+        return _closed_json()
+
+    form = ChunkedUploadInitForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors}, status=400)
+
+    session = chunked_upload.start_session(
+        lattes_request,
+        doc_type=form.cleaned_data["doc_type"],
+        description=form.cleaned_data["description"],
+        filename=form.cleaned_data["filename"],
+        size=form.cleaned_data["size"],
+    )
+    return JsonResponse(
+        {"upload_id": str(session.pk), "offset": 0, "max_chunk": chunked_upload.max_chunk_bytes()},
+        status=201,
+    )
+
+
+@require_http_methods(["GET", "PUT"])
+def chunked_upload_chunk(request, public_id: str, upload_id):
+    # GET devolve o offset para retomar; PUT grava a parte (cabeçalho Upload-Offset)
+    session = get_object_or_404(
+        UploadSession.objects.select_related("request"), pk=upload_id, request__public_id=public_id
+    )
+    if not session.request.accepts_uploads:
+        return _closed_json()
 
-    attachments = []
-    for d in docs:
+    if request.method == "GET":
+        # Expirada ou já concluída: o cliente esquece a sessão guardada e começa outra
         try:
-            attachments.append(file_to_sendgrid_attachment(file_path=d.file.path, filename=os.path.basename(d.file.path)))
-        except Exception:
-            pass
+            offset = chunked_upload.resume_offset(session)
+        except chunked_upload.ChunkedUploadError as e:
+            return _upload_error(e)
+        return JsonResponse({"offset": offset, "size": session.total_size})
 
-    ctx = {"pedido": lattes_request, "documentos": docs, "total_docs": len(attachments)}
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+        length = int(request.headers.get("Content-Length", ""))
+    except ValueError:
+        return JsonResponse({"error": "Upload-Offset e Content-Length são obrigatórios."}, status=400)
+
+    try:
+        new_offset = chunked_upload.write_chunk(session, offset, request, length)
+    except chunked_upload.ChunkedUploadError as e:
+        return _upload_error(e)
+    return JsonResponse({"offset": new_offset, "size": session.total_size})
 
+
+@require_POST
+def chunked_upload_complete(request, public_id: str, upload_id):
+    session = get_object_or_404(
+        UploadSession.objects.select_related("request"), pk=upload_id, request__public_id=public_id
+    )
     try:
-        send_email(
-            to_email=internal_to_email,
-            subject=f"Novo pedido finalizado — {lattes_request.public_id}",
-            text=f"Pedido {lattes_request.public_id} finalizado por {lattes_request.full_name}.",
-            html=render_to_string("emails/notificacao_interna.html", ctx),
-            reply_to=customer_email,
-            attachments=attachments or None,
-        )
+        doc = chunked_upload.complete_session(session)
+    except chunked_upload.ChunkedUploadError as e:
+        return _upload_error(e)
+    except forms.ValidationError as e:
+        return JsonResponse({"error": " ".join(e.messages)}, status=400)
+    return JsonResponse({"document_id": doc.pk, "doc_type": doc.doc_type}, status=201)
+
+
+def _enqueue_finalize_emails(lattes_request, docs: list):
+    # Síncrono: olha o tamanho dos arquivos, renderiza os e-mails e grava na fila numa transação
+    internal_to_email = os.getenv("CLIENT_EMAIL") or settings.DEFAULT_FROM_EMAIL
+    customer_email = lattes_request.email
+    customer_reply_to = os.getenv("DEFAULT_REPLY_TO") or internal_to_email
+
+    ctx = {"pedido": lattes_request, "documentos": docs, "total_docs": len(docs)}
+
+    # Anexo direto, .zip, várias mensagens ou links, conforme o tamanho total
+    strategy, parts = plan_internal_email(docs)
+    for part in parts:
+        for d in part.linked:
+            d.download_url = document_link(d)
+
+    # Só grava na fila; o envio acontece no worker (manage.py send_outbox)
+    with transaction.atomic():
+        for part in parts:
+            suffix = f" (parte {part.number}/{part.total})" if part.total > 1 else ""
+            part_ctx = {
+                **ctx,
+                "documentos": part.documents + part.linked,
+                "parte": part,
+                "estrategia": strategy,
+            }
+            enqueue_email(
+                dedupe_key=f"{lattes_request.public_id}:interno" + (f":{part.number}" if part.total > 1 else ""),
+                to_email=internal_to_email,
+                subject=f"Novo pedido finalizado — {lattes_request.public_id}{suffix}",
+                text=f"Pedido {lattes_request.public_id} finalizado por {lattes_request.full_name}.",
+                html=render_email("emails/notificacao_interna.html", part_ctx),
+                reply_to=customer_email,
+                request=lattes_request,
+                attach_documents=bool(part.documents),
+                document_ids=[d.pk for d in part.documents] if part.total > 1 else None,
+                zip_attachments=part.zip,
+                part=(part.number, part.total),
+            )
 
         if customer_email:
-            send_email(
+            enqueue_email(
+                dedupe_key=f"{lattes_request.public_id}:cliente",
                 to_email=customer_email,
                 subject=f"Pedido confirmado — {lattes_request.public_id}",
                 text=f"Seu pedido {lattes_request.public_id} foi recebido! Em breve entraremos em contato.",
-                html=render_to_string("emails/confirmacao_cliente.html", ctx),
+                html=render_email("emails/confirmacao_cliente.html", ctx),
                 reply_to=customer_reply_to,
+                request=lattes_request,
             )
 
-        messages.success(request, "Pedido finalizado! E-mails enviados.")
+
+def _finalize(lattes_request) -> bool:
+    # Síncrono: transição NEW -> FINALIZED e e-mails na fila na mesma transação; se a fila
+    # falhar, o pedido continua aberto. False quando outro POST já finalizou.
+    with transaction.atomic():
+        if not LattesRequest.mark_finalized(lattes_request.pk):
+            return False
+        lattes_request.status = LattesRequest.Status.FINALIZED
+        docs = list(lattes_request.documents.order_by("uploaded_at"))
+        _enqueue_finalize_emails(lattes_request, docs)
+        # update() não dispara post_save
+        status_changed(lattes_request.public_id, lattes_request.status)
+    invalidate_lookup(lattes_request.public_id)
+    return True
+
+
+async def finalize_request(request, public_id: str):
+    lattes_request = await aget_object_or_404(LattesRequest, public_id=public_id)
+
+    if request.method != "POST":
+        return redirect("upload_docs", public_id=public_id)
+
+    # Clique duplo / reenvio do navegador: sem reler anexos nem tocar na fila
+    if not lattes_request.accepts_uploads:
+        return _finalized_redirect(lattes_request)
+
+    try:
+        if await sync_to_async(_finalize)(lattes_request):
+            messages.success(request, "Pedido finalizado! Você receberá a confirmação por e-mail em instantes.")
 
     except Exception as e:
-        messages.error(request, f"Não foi possível enviar o e-mail agora. Erro: {e}")
+        messages.error(request, f"Não foi possível finalizar o pedido agora. Erro: {e}")
         return redirect("upload_docs", public_id=public_id)
 
-    return redirect(f"{reverse('thank_you')}?code={lattes_request.public_id}")
+    return _finalized_redirect(lattes_request)
+
+def document_link_download(request, token: str):
+    # Link assinado e com validade enviado no e-mail interno quando os anexos são grandes demais
+    try:
+        doc_id = document_id_from_token(token)
+    except signing.BadSignature:
+        raise Http404("Link inválido ou expirado.")
+
+    doc = get_object_or_404(LattesDocument, pk=doc_id)
+    return _serve_document(request, doc, as_attachment=True)
+
+@require_http_methods(["GET", "HEAD"])
+def document_download(request, public_id: str, doc_id: int):
+    # Só o dono do código do pedido (o mesmo que já permite enviar documentos) abre o arquivo
+    doc = get_object_or_404(LattesDocument, pk=doc_id, request__public_id=public_id)
+    return _serve_document(request, doc, as_attachment=request.GET.get("download") == "1")
+
+def _serve_document(request, doc, as_attachment: bool):
+    try:
+        # Arquivado (manage.py archive_requests): volta do .zip para o storage antes
+        restore_document(doc)
+        return serve_document(request, doc, as_attachment=as_attachment)
+    except FileNotFoundError:
+        raise Http404("Arquivo não encontrado.")
 
 def thank_you(request):
     public_id = request.GET.get("code")
@@ -121,11 +378,42 @@ def thank_you(request):
     lattes_request = get_object_or_404(LattesRequest, public_id=public_id)
 
     return render(request, "ty.html", {
-        "request_obj": lattes_request
+        "request_obj": lattes_request,
+        "status_stream_url": status_stream_url(lattes_request.public_id),
     })
 
+@require_http_methods(["GET"])
+async def status_stream(request, public_id: str):
+    # Link assinado: sem o token, o código sozinho não abre o canal
+    if not valid_token(public_id, request.GET.get("token", "")):
+        raise Http404("Link inválido.")
+    status = await LattesRequest.objects.filter(public_id=public_id).values_list("status", flat=True).afirst()
+    if status is None:
+        raise Http404("Pedido não encontrado.")
+
+    if isinstance(request, ASGIRequest):
+        content = event_stream(public_id, status)
+    else:
+        # Sob WSGI o Django juntaria o gerador inteiro antes de responder: manda o status
+        # atual e fecha, e o EventSource reconecta depois do "retry"
+        content = [first_event(status)]
+    response = StreamingHttpResponse(content, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx não segura os eventos no buffer
+    return response
+
 def request_lattes(request):
     return create_request(request)
 
+def metrics(request):
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if not token:
+        # Sem token só em desenvolvimento: tráfego e tempos de SQL por view não são públicos
+        if not settings.DEBUG:
+            raise Http404
+    elif not secrets.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    return HttpResponse(request_metrics.registry.render(), content_type=request_metrics.CONTENT_TYPE)
+
 def about(request):
     return render(request, "about.html")
\ No newline at end of file